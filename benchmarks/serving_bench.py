@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+import asynchat
+import asyncore
+import httplib
+import json
+import optparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+USAGE = """%prog [options]
+Drives concurrent keep-alive redirect requests against a shortening service and reports throughput
+and latency.
+
+By default the standalone server (python -m service.standalone) is started and measured.  To measure
+the WSGI apps of service.app under the same load, serve app.yaml (e.g. dev_appserver.py app.yaml) and
+pass its address with --target."""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def shorten(host, port, count):
+    """
+    Creates short urls to redirect to.
+
+    Returns:
+        list: short ids
+    """
+    connection = httplib.HTTPConnection(host, port)
+    sids = []
+    for n in xrange(count):
+        connection.request('POST', '/shorturl', json.dumps({'url': 'http://www.example.com/page/%d' % n}),
+                           {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        content = response.read()
+        if response.status != httplib.CREATED:
+            raise RuntimeError('shorten failed (%d): %s' % (response.status, content))
+        sids.append(json.loads(content)['short_id'].encode('utf-8'))
+    connection.close()
+    return sids
+
+
+class RedirectClient(asynchat.async_chat):
+    """
+    Issues redirect requests one after another over a single keep-alive connection.
+    """
+
+    def __init__(self, address, sids, offset, stats):
+        asynchat.async_chat.__init__(self)
+        self._host = '%s:%d' % address
+        self._sids = sids
+        self._next = offset
+        self._stats = stats
+        self._incoming = []
+        self._in_body = False
+        self._sent = None
+        self.running = True
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(address)
+
+    def handle_connect(self):
+        self._send()
+
+    def _send(self):
+        sid = self._sids[self._next % len(self._sids)]
+        self._next += 1
+        self._sent = time.time()
+        self.push('GET /%s HTTP/1.1\r\nHost: %s\r\n\r\n' % (sid, self._host))
+        self.set_terminator('\r\n\r\n')
+        self._in_body = False
+
+    def collect_incoming_data(self, data):
+        self._incoming.append(data)
+
+    def found_terminator(self):
+        head = ''.join(self._incoming)
+        self._incoming = []
+        if not self._in_body:
+            status = int(head.split(' ', 2)[1])
+            length = 0
+            for line in head.split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            self._stats.record(status, time.time() - self._sent)
+            if length:
+                self._in_body = True
+                self.set_terminator(length)
+                return
+        if self.running:
+            self._send()
+
+    def handle_error(self):
+        self._stats.errors += 1
+        self.close()
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def record(self, status, latency):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def report(self, seconds):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        if not count:
+            print 'no responses (%d connection errors)' % self.errors
+            return
+
+        def percentile(p):
+            return 1000.0 * latencies[min(count - 1, int(p * count))]
+
+        print 'responses %d in %.1fs: %.0f/s  statuses %s  errors %d' % (
+            count, seconds, count / seconds, self.statuses, self.errors)
+        print 'latency ms: p50 %.2f  p90 %.2f  p99 %.2f  max %.2f' % (
+            percentile(0.5), percentile(0.9), percentile(0.99), 1000.0 * latencies[-1])
+
+
+def run(address, sids, connections, seconds):
+    stats = Stats()
+    clients = [RedirectClient(address, sids, n, stats) for n in xrange(connections)]
+    start = time.time()
+    while time.time() - start < seconds:
+        asyncore.loop(timeout=0.1, use_poll=True, count=1)
+    elapsed = time.time() - start
+    for client in clients:
+        client.running = False
+        client.close()
+    stats.report(elapsed)
+
+
+def main(target, connections, seconds, links):
+    server = None
+    if target:
+        host, port = target.split(':')
+        port = int(port)
+    else:
+        host, port = '127.0.0.1', 18080
+        server = subprocess.Popen([sys.executable, '-m', 'service.standalone', '--port', str(port)], cwd=ROOT)
+        time.sleep(1.0)
+
+    try:
+        sids = shorten(host, port, links)
+        run((host, port), sids, connections, seconds)
+    finally:
+        if server:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option('--target', help='HOST:PORT of a running service')
+    parser.add_option('--connections', type='int', default=1000, help='concurrent keep-alive connections')
+    parser.add_option('--seconds', type='float', default=10.0, help='duration of the load')
+    parser.add_option('--links', type='int', default=100, help='number of short urls redirected to')
+    options, args = parser.parse_args()
+    main(options.target, options.connections, options.seconds, options.links)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import optparse
+import os
+import random
+import sys
+import timeit
+
+# the codec does not depend upon the appengine sdk; import it without the model package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'service', 'model'))
+
+import url_codec
+
+USAGE = """%prog [options]
+Reports bytes saved by, and decode cost of, the compact url encoding (service/model/url_codec.py).
+
+Without --corpus, a synthetic corpus of tracking urls is generated."""
+
+HOSTS = ['www.example.com', 'shop.example.com', 'www.amazon.com', 'news.example.org', 'www.youtube.com',
+         'blog.example.net', 'm.facebook.com', 'www.nytimes.com']
+PATHS = ['/', '/landing', '/products/item', '/dp/B00X4WHP5E', '/watch', '/2016/05/article-title-with-words.html']
+SOURCES = ['newsletter', 'google', 'facebook', 'twitter', 'partner']
+MEDIUMS = ['email', 'social', 'cpc', 'referral']
+
+
+def synthetic_corpus(count, seed=2016):
+    rnd = random.Random(seed)
+    urls = []
+    for n in xrange(count):
+        url = '%s://%s%s?utm_source=%s&utm_medium=%s&utm_campaign=campaign_%d' % (
+            rnd.choice(['http', 'https']), rnd.choice(HOSTS), rnd.choice(PATHS),
+            rnd.choice(SOURCES), rnd.choice(MEDIUMS), rnd.randint(1, 500))
+        if rnd.random() < 0.5:
+            url += '&gclid=%x' % rnd.getrandbits(96)
+        urls.append(url)
+    return urls
+
+
+def report(name, urls, dictionary_id, repeat):
+    encoded = [url_codec.encode(u, dictionary_id) for u in urls]
+    assert [url_codec.decode(e) for e in encoded] == urls
+
+    raw = sum(len(u) for u in urls)
+    stored = sum(len(e) for e in encoded)
+    seconds = min(timeit.repeat(lambda: [url_codec.decode(e) for e in encoded], number=1, repeat=repeat))
+
+    print '%-12s raw %9d  stored %9d  saved %5.1f%%  decode %6.2f us/url' % (
+        name, raw, stored, 100.0 * (raw - stored) / raw, 1e6 * seconds / len(urls))
+
+
+def main(corpus, count, repeat):
+    if corpus:
+        with open(corpus) as f:
+            urls = [line.strip() for line in f if line.strip()]
+    else:
+        urls = synthetic_corpus(count)
+
+    # train upon half of the corpus; measure upon the other half
+    trained_id = 255
+    url_codec.register_dictionary(trained_id, url_codec.train_dictionary(urls[::2]))
+    sample = urls[1::2]
+
+    report('deflate', sample, None, repeat)
+    report('default', sample, url_codec.DEFAULT_DICTIONARY_ID, repeat)
+    report('trained', sample, trained_id, repeat)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option('--corpus', help='file of urls, one per line')
+    parser.add_option('--count', type='int', default=20000, help='size of synthetic corpus')
+    parser.add_option('--repeat', type='int', default=5, help='timing repetitions (best is reported)')
+    options, args = parser.parse_args()
+    main(options.corpus, options.count, options.repeat)
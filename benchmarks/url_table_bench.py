@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import optparse
+import os
+import random
+import sys
+import time
+import timeit
+
+# the table and the url cache do not depend upon the appengine sdk
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'gapplib', 'lib'))
+sys.path.insert(0, os.path.join(ROOT, 'service'))
+
+from gapplib import arena
+import url_cache
+from url_codec_bench import synthetic_corpus
+
+USAGE = """%prog [options]
+Reports entries per MB of memory, and lookup cost, of the compact kid to url table
+(gapplib/lib/gapplib/arena.py) against a dict of str holding the same urls, and the lookup cost
+of the url cache (service/url_cache.py) built upon the table, as a redirect pays it.  Then reports
+the latency of puts to a url cache of the default bounds, once it is full and evicting."""
+
+MB = 1024.0 * 1024.0
+
+
+def dict_nbytes(table):
+    """
+    Returns:
+        int: memory held by a dict and the int and str objects which it refers to
+    """
+    return sys.getsizeof(table) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in table.iteritems())
+
+
+def report(name, lookup, kids, nbytes, repeat):
+    seconds = min(timeit.repeat(lambda: [lookup(kid) for kid in kids], number=1, repeat=repeat))
+    print '%-10s entries %8d  memory %7.1f MB  entries/MB %8.0f  lookup %6.0f ns' % (
+        name, len(kids), nbytes / MB, len(kids) / (nbytes / MB), 1e9 * seconds / len(kids))
+
+
+def main(count, repeat):
+    rnd = random.Random(34)
+    urls = synthetic_corpus(count)
+    kids = [rnd.getrandbits(64) for _ in urls]
+
+    table = arena.CompactTable(count, sum(len(u) + arena.RECORD_OVERHEAD for u in urls))
+    cache = url_cache.UrlCache(count, sum(len(u) + url_cache.ENTRY_OVERHEAD for u in urls))
+    plain = {}
+    for kid, url in zip(kids, urls):
+        table.put(kid, url)
+        cache.put_url(kid, url, 2000000000)
+        plain[kid] = url
+    assert len(table) == count
+    assert all(table.get(kid) == plain[kid] for kid in kids)
+
+    rnd.shuffle(kids)
+    report('dict', plain.get, kids, dict_nbytes(plain), repeat)
+    report('compact', table.get, kids, table.nbytes, repeat)
+    report('url_cache', cache.lookup, kids, cache._table.nbytes, repeat)
+    report_put_latency(kids, urls)
+
+
+def report_put_latency(kids, urls, slow=0.02):
+    cache = url_cache.UrlCache()
+    latencies = []
+    for kid, url in zip(kids, urls):
+        start = time.time()
+        cache.put_url(kid, url, 2000000000)
+        latencies.append(time.time() - start)
+    latencies.sort()
+    print 'put        entries %8d  bounds %d / %.1f MB  p99 %6.0f us  worst %6.1f ms  over %.0f ms %d' % (
+        len(cache), cache.max_entries, cache.arena_bytes / MB, 1e6 * latencies[len(latencies) * 99 / 100],
+        1e3 * latencies[-1], 1e3 * slow, sum(1 for latency in latencies if latency > slow))
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option('--count', type='int', default=200000, help='number of entries')
+    parser.add_option('--repeat', type='int', default=5, help='timing repetitions (best is reported)')
+    options, args = parser.parse_args()
+    main(options.count, options.repeat)
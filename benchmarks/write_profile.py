@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import json
+import optparse
+import os
+import re
+import sys
+
+USAGE = """%prog [options] SDK_PATH
+Profiles the datastore writes of the shorten route under a sample workload, and reports which
+indexed properties of the url models are used by queries of the service.
+
+SDK_PATH    Path to Google Cloud or Google App Engine SDK installation, usually
+            ~/google_cloud_sdk"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+BASELINE_INDEXED = {
+    'ShortUrl': ['short_id', 'date'],
+    'DestinationUrl': ['query', 'short_key'],
+}
+"""dict: properties which were indexed before unused indexes were dropped, keyed by kind"""
+
+QUERY_LINE_RE = re.compile(r'\.query\(|\.order\(|\.filter\(|ndb\.Query\(')
+PROPERTY_REF_RE = re.compile(r'\b(\w+)\.(\w+)\b')
+
+
+def setup_sdk(sdk_path):
+    if os.path.exists(os.path.join(sdk_path, 'platform/google_appengine')):
+        sys.path.insert(0, os.path.join(sdk_path, 'platform/google_appengine'))
+    else:
+        sys.path.insert(0, sdk_path)
+
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import appengine_config
+    (appengine_config)
+
+
+class PutProfile(object):
+    """
+    Counts datastore rpcs, and the index rows and bytes of each entity put, by kind.
+    """
+
+    def __init__(self):
+        self.rpcs = {}
+        self.entities = {}
+        self.index_rows = {}
+        self.bytes = {}
+
+    def hook(self, service, call, request, response):
+        self.rpcs[call] = self.rpcs.get(call, 0) + 1
+        if call == 'Put':
+            for entity in request.entity_list():
+                kind = entity.key().path().element_list()[-1].type()
+                self.entities[kind] = self.entities.get(kind, 0) + 1
+                # the kind index, plus ascending and descending rows per indexed value
+                rows = 1 + 2 * len(entity.property_list())
+                self.index_rows[kind] = self.index_rows.get(kind, 0) + rows
+                self.bytes[kind] = self.bytes.get(kind, 0) + entity.ByteSize()
+
+    def report(self, requests):
+        print 'rpcs per shorten request: %s' % ', '.join(
+            '%s %.2f' % (call, float(count) / requests) for call, count in sorted(self.rpcs.iteritems()))
+        for kind in sorted(self.entities):
+            puts = self.entities[kind]
+            print '%-15s puts %6d  index rows/put %5.2f  bytes/put %7.1f' % (
+                kind, puts, float(self.index_rows[kind]) / puts, float(self.bytes[kind]) / puts)
+
+
+def report_index_usage(models):
+    """
+    Scans the service for queries, and reports, per property, whether it is indexed and whether
+    any query refers to it.
+    """
+    referenced = set()
+    for directory, _, files in os.walk(os.path.join(ROOT, 'service')):
+        if os.sep + 'test' in directory:
+            continue
+        for name in (f for f in files if f.endswith('.py')):
+            with open(os.path.join(directory, name)) as f:
+                for line in f:
+                    if QUERY_LINE_RE.search(line):
+                        referenced.update(PROPERTY_REF_RE.findall(line))
+
+    print '%-15s %-12s %-8s %s' % ('kind', 'property', 'indexed', 'queried')
+    for model in models:
+        kind = model._get_kind()
+        for prop in sorted(model._properties.itervalues(), key=lambda p: p._code_name):
+            queried = (kind, prop._code_name) in referenced
+            flag = '' if prop._indexed == queried else '  <- %s' % ('unused index' if prop._indexed else 'unindexed')
+            print '%-15s %-12s %-8s %s%s' % (kind, prop._code_name, prop._indexed, queried, flag)
+
+
+def main(sdk_path, count, duplicates, baseline):
+    setup_sdk(sdk_path)
+
+    import webapp2
+    from google.appengine.api import apiproxy_stub_map
+    from google.appengine.ext import testbed
+
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_datastore_v3_stub()
+    bed.init_memcache_stub()
+    bed.init_app_identity_stub()
+    bed.init_taskqueue_stub()
+
+    import service.app
+    from service.model.url import DestinationUrl, ShortUrl
+
+    models = (ShortUrl, DestinationUrl)
+    if baseline:
+        for model in models:
+            for name in BASELINE_INDEXED[model._get_kind()]:
+                model._properties[name]._indexed = True
+
+    profile = PutProfile()
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('write_profile', profile.hook, 'datastore_v3')
+
+    requests = 0
+    for n in xrange(count):
+        for _ in xrange(1 + (duplicates if n % 10 == 0 else 0)):
+            url = 'https://www.example.com/products/%d?utm_source=newsletter&utm_medium=email' % n
+            request = webapp2.Request.blank('/shorturl', POST=json.dumps({'url': url}))
+            request.method = 'POST'
+            request.get_response(service.app.create_or_update)
+            requests += 1
+
+    print '%s definitions, %d shorten requests' % ('baseline' if baseline else 'current', requests)
+    profile.report(requests)
+    print
+    report_index_usage(models)
+    bed.deactivate()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option('--count', type='int', default=1000, help='distinct urls shortened')
+    parser.add_option('--duplicates', type='int', default=1,
+                      help='repeat shortens of every tenth url (exercises deduplication)')
+    parser.add_option('--baseline', action='store_true',
+                      help='index the properties which were indexed before unused indexes were dropped')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        print 'Error: Exactly 1 argument required.'
+        parser.print_help()
+        sys.exit(1)
+    main(args[0], options.count, options.duplicates, options.baseline)
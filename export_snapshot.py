@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import optparse
+import os
+import sys
+
+USAGE = """%prog [options] SDK_PATH HOST OUTPUT
+Exports the short urls of a deployed application, through remote_api, to a snapshot file (see
+service/snapshot.py).  Deploy the file with the application, and name it by SNAPSHOT_PATH in
+app.yaml, so that redirects may be served from it while the datastore is unavailable.
+
+SDK_PATH    Path to Google Cloud or Google App Engine SDK installation, usually
+            ~/google_cloud_sdk
+HOST        Host of the application, e.g. yytakehome.appspot.com
+OUTPUT      Path of the snapshot file, e.g. snapshot.tsv"""
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def setup_sdk(sdk_path):
+    if os.path.exists(os.path.join(sdk_path, 'platform/google_appengine')):
+        sys.path.insert(0, os.path.join(sdk_path, 'platform/google_appengine'))
+    else:
+        sys.path.insert(0, sdk_path)
+
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'service'))
+    import appengine_config
+    (appengine_config)
+
+
+def main(sdk_path, host, output, batch_size):
+    setup_sdk(sdk_path)
+    from google.appengine.ext.remote_api import remote_api_stub
+    remote_api_stub.ConfigureRemoteApiForOAuth(host, '/_ah/remote_api')
+
+    import snapshot
+    from model import export
+
+    # written aside, so that an interrupted export does not replace the previous snapshot
+    partial = output + '.partial'
+    with open(partial, 'w') as f:
+        snapshot.write(export.snapshot_items(batch_size=batch_size), f)
+    os.rename(partial, output)
+    print 'exported %s' % output
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option('--batch-size', type='int', default=500, help='short urls fetched per page')
+    options, args = parser.parse_args()
+    if len(args) != 3:
+        print 'Error: Exactly 3 arguments required.'
+        parser.print_help()
+        sys.exit(1)
+    main(args[0], args[1], args[2], options.batch_size)
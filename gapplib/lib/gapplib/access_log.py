@@ -0,0 +1,256 @@
+"""
+A structured access log which replaces per-request logging calls.  Handlers emit fixed-schema
+records into a per-instance ring buffer; the buffer is drained in batches, each of which is written
+to the sink with a single call.  Records are sampled by status class before they are buffered, so
+an unsampled request costs neither formatting nor buffer space.
+"""
+
+import base64
+import json
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+AccessRecord = namedtuple('AccessRecord', ['time', 'route', 'sid', 'kid', 'status', 'latency'])
+"""
+time (float): seconds since the epoch at which the request completed
+route (str): name of the route (handler) which served the request
+sid (str): short id named by the request, if any
+kid (int): key id corresponding to the short id, if any
+status (int): http status of the response
+latency (float): milliseconds spent in the handler
+"""
+
+DEFAULT_SAMPLE_RATES = {2: 0.01, 3: 0.01, 4: 0.1, 5: 1.0}
+"""dict: fraction of requests recorded, keyed by status class (status // 100)"""
+
+DEFAULT_CAPACITY = 4096
+DEFAULT_FLUSH_SIZE = 512
+DEFAULT_FLUSH_INTERVAL = 10.0
+
+# binary record: time, latency, status, kid high/low 64 bits, kid present, route length, sid length
+_BINARY_HEADER = struct.Struct('!dfHQQ?BH')
+_LENGTH_PREFIX = struct.Struct('!I')
+_UINT64_MASK = 2 ** 64 - 1
+
+
+def _encoded(s, limit):
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    return (s or '')[:limit]
+
+
+def parse_sample_rates(spec):
+    """
+    Parses sample rates of the form '2xx=0.01,4xx=0.1,5xx=1'.  Status classes which are not
+    mentioned keep their default rates.
+
+    Returns:
+        dict: fraction of requests recorded keyed by status class
+    """
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for term in (t.strip() for t in spec.split(',')):
+        if term:
+            status_class, rate = term.split('=')
+            rates[int(status_class.strip()[0])] = float(rate)
+    return rates
+
+
+def encode_json_lines(records):
+    return ''.join(json.dumps(r._asdict(), separators=(',', ':')) + '\n' for r in records)
+
+
+def encode_binary(records):
+    """
+    Encodes records, each preceded by its length as a 4-byte unsigned (network order) integer.
+    """
+    chunks = []
+    for r in records:
+        route = _encoded(r.route, 0xFF)
+        sid = _encoded(r.sid, 0xFFFF)
+        kid = r.kid if r.kid is not None else 0
+        body = _BINARY_HEADER.pack(
+            r.time, r.latency, r.status, kid >> 64, kid & _UINT64_MASK, r.kid is not None, len(route), len(sid)) \
+            + route + sid
+        chunks.append(_LENGTH_PREFIX.pack(len(body)))
+        chunks.append(body)
+    return ''.join(chunks)
+
+
+def decode_binary(data):
+    """
+    Inverse of encode_binary.
+
+    Returns:
+        list: AccessRecord
+    """
+    records = []
+    offset = 0
+    while offset < len(data):
+        length, = _LENGTH_PREFIX.unpack_from(data, offset)
+        offset += _LENGTH_PREFIX.size
+        t, latency, status, kid_high, kid_low, has_kid, route_len, sid_len = _BINARY_HEADER.unpack_from(data, offset)
+        strings = offset + _BINARY_HEADER.size
+        route = data[strings:strings + route_len]
+        sid = data[strings + route_len:strings + route_len + sid_len]
+        kid = (kid_high << 64) | kid_low if has_kid else None
+        records.append(AccessRecord(t, route, sid or None, kid, status, latency))
+        offset += length
+    return records
+
+
+def log_sink(data):
+    """
+    Writes a batch to the application log with a single logging call.
+    """
+    logging.info('access log batch:\n%s', data)
+
+
+def base64_log_sink(data):
+    """
+    Writes a binary batch to the application log with a single logging call.
+    """
+    logging.info('access log batch (base64):\n%s', base64.b64encode(data))
+
+
+FORMATS = {
+    'json': (encode_json_lines, log_sink),
+    'binary': (encode_binary, base64_log_sink),
+}
+"""dict: (encoder, default sink) keyed by name of format"""
+
+
+class AccessLog(object):
+    """
+    A bounded buffer of sampled access records.  When the buffer is full the oldest records are
+    overwritten and counted as dropped.
+
+    The buffer is flushed by whichever request finds it due (full enough, or old enough), or by
+    a background flusher thread where the runtime permits threads to outlive requests.
+    """
+
+    def __init__(self, sample_rates=None, encoder=encode_json_lines, sink=log_sink, capacity=DEFAULT_CAPACITY,
+                 flush_size=DEFAULT_FLUSH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.sample_rates = sample_rates if sample_rates is not None else dict(DEFAULT_SAMPLE_RATES)
+        self.encoder = encoder
+        self.sink = sink
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self._flusher = None
+
+    def record(self, route, sid, kid, status, latency):
+        """
+        Samples, then buffers, a record of a completed request.
+
+        Returns:
+            bool: True if the request was sampled
+        """
+        if random.random() >= self.sample_rates.get(status // 100, 1.0):
+            return False
+
+        now = time.time()
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(AccessRecord(now, route, sid, kid, status, latency))
+            due = len(self._buffer) >= self.flush_size or now - self._last_flush >= self.flush_interval
+
+        if due and self._flusher is None:
+            self.flush()
+        return True
+
+    def drain(self):
+        """
+        Returns:
+            list: the buffered records, which are removed from the buffer
+        """
+        with self._lock:
+            records = list(self._buffer)
+            self._buffer.clear()
+            self._last_flush = time.time()
+        return records
+
+    def flush(self):
+        records = self.drain()
+        if records:
+            self.sink(self.encoder(records))
+        return len(records)
+
+    def start_flusher(self, start_thread=None):
+        """
+        Starts a thread which flushes the buffer every flush_interval seconds.  Requests then no
+        longer flush the buffer themselves.
+
+        Args:
+            start_thread (callable): start_thread(target, args, kwargs=None) starts a thread which
+                calls target(*args), where plain threads may not outlive a request (i.e.
+                background_thread.start_new_background_thread on App Engine). None for a daemon
+                threading.Thread.
+        """
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except StandardError:
+                    logging.exception('access log flush failed')
+
+        if self._flusher is not None:
+            return
+        if start_thread is None:
+            thread = threading.Thread(target=run, name='access-log-flusher')
+            thread.daemon = True
+            thread.start()
+        else:
+            start_thread(run, ())
+        self._flusher = run
+
+
+def _format(name):
+    if name not in FORMATS:
+        logging.warning('unknown access log format %r; using json', name)
+        name = 'json'
+    return FORMATS[name]
+
+
+ACCESS_LOG_FLUSHER = os.getenv('ACCESS_LOG_FLUSHER', 'request')
+"""str: 'request' if requests flush the buffer when due, 'background' if a background thread does"""
+
+_encoder, _sink = _format(os.getenv('ACCESS_LOG_FORMAT', 'json'))
+
+ACCESS_LOG = AccessLog(
+    sample_rates=parse_sample_rates(os.getenv('ACCESS_LOG_SAMPLE_RATES', '')),
+    encoder=_encoder,
+    sink=_sink)
+"""AccessLog: the access log of the current instance"""
+
+
+class AccessLogged(object):
+    """
+    Mixin for a webapp2.RequestHandler which records each request in the access log.  A handler
+    identifies the resource of a request by assigning access_sid and access_kid.
+    """
+
+    access_log = ACCESS_LOG
+    access_sid = None
+    access_kid = None
+
+    def dispatch(self):
+        start = time.time()
+        try:
+            return super(AccessLogged, self).dispatch()
+        finally:
+            self.access_log.record(
+                self.__class__.__name__,
+                self.access_sid,
+                self.access_kid,
+                self.response.status_int,
+                (time.time() - start) * 1000.0)
@@ -0,0 +1,242 @@
+"""
+A compact table of byte strings keyed by integer.  Values are packed end to end in one preallocated
+bytearray (the arena); the index is an open-addressing hash table held in flat arrays.  An entry
+costs a few dozen bytes of index plus its value, instead of the hundreds of bytes of object overhead
+of a dict of str.
+"""
+
+import array
+import struct
+
+_EMPTY = 0
+_USED = 1
+
+_MASK64 = 2 ** 64 - 1
+_KEY_TYPECODE = 'L' if array.array('L').itemsize == 8 else 'Q'
+"""str: array typecode of unsigned 64-bit integers. python 2 has no 'Q', but its 'L' is 64 bits on LP64 platforms."""
+_GOLDEN64 = 0x9E3779B97F4A7C15
+
+MAX_VALUE_LENGTH = 0xFFFF
+
+_RECORD = struct.Struct('!IH')
+"""struct: head of a value in the arena: the index slot of its entry, and the capacity of the value"""
+
+RECORD_OVERHEAD = _RECORD.size
+"""int: bytes of the arena taken by an entry beyond those of its value"""
+
+MAX_SPARED = 8
+"""int: referenced entries which one put may spare from eviction, so that its cost is bounded"""
+
+
+class CompactTable(object):
+    """
+    Maps non-negative integers (up to 128 bits) to byte strings, within fixed bounds on the number of
+    entries and on the bytes of values.
+
+    The arena is a circular log: values are written at its head, and when either bound would be
+    exceeded, room is made by reclaiming values from its tail, oldest first.  A reclaimed value
+    whose entry has been read since the value was written (or last moved) is moved to the head
+    rather than evicted, up to MAX_SPARED per put; the rest are evicted.  So a put moves or evicts
+    only as many values as it needs room for, and never rearranges the whole arena.  Deletion shifts
+    the entries of the probe sequence back, leaving no tombstones.
+
+    Not thread safe.
+    """
+
+    def __init__(self, max_entries, arena_bytes):
+        """
+        Args:
+            max_entries (int): maximum number of entries
+            arena_bytes (int): bytes of the arena, which holds each value with RECORD_OVERHEAD
+        """
+        self.max_entries = max_entries
+        self.arena_bytes = arena_bytes
+        self._arena = bytearray(arena_bytes)
+        self._slots = 1
+        while self._slots < 2 * max_entries:
+            self._slots <<= 1
+        slots = self._slots
+        self._mask = slots - 1
+        # multiplicative hashing: the high bits of the product are the best mixed
+        self._shift = 64 - (slots.bit_length() - 1)
+        self._key_high = array.array(_KEY_TYPECODE, [0]) * slots
+        self._key_low = array.array(_KEY_TYPECODE, [0]) * slots
+        self._offset = array.array('I', [0]) * slots
+        self._length = array.array('H', [0]) * slots
+        self._state = bytearray(slots)
+        self._referenced = bytearray(slots)
+        self._count = 0
+        # the log occupies [tail, head), or [tail, wrap) and [0, head) once the head has wrapped
+        self._head = 0
+        self._tail = 0
+        self._wrap = arena_bytes
+        self._logged = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        """
+        int: memory held by the table's arrays and arena
+        """
+        index = sum(a.itemsize * len(a) for a in (self._key_high, self._key_low, self._offset, self._length))
+        return index + len(self._state) + len(self._referenced) + len(self._arena)
+
+    def _home(self, high, low):
+        return (((low ^ high) * _GOLDEN64) & _MASK64) >> self._shift & self._mask
+
+    def _find(self, key):
+        """
+        Returns:
+            (int, int): slot holding key (or -1), and the free slot ending its probe sequence (or -1)
+        """
+        high, low = key >> 64, key & _MASK64
+        slot = self._home(high, low)
+        state = self._state
+        while True:
+            if state[slot] == _EMPTY:
+                return -1, slot
+            if self._key_low[slot] == low and self._key_high[slot] == high:
+                return slot, -1
+            slot = (slot + 1) & self._mask
+
+    def get(self, key, default=None):
+        slot, _ = self._find(key)
+        if slot < 0:
+            return default
+        self._referenced[slot] = 1
+        offset = self._offset[slot] + RECORD_OVERHEAD
+        return str(self._arena[offset:offset + self._length[slot]])
+
+    def __contains__(self, key):
+        return self._find(key)[0] >= 0
+
+    def _move(self, source, target):
+        self._key_high[target] = self._key_high[source]
+        self._key_low[target] = self._key_low[source]
+        self._offset[target] = self._offset[source]
+        self._length[target] = self._length[source]
+        self._referenced[target] = self._referenced[source]
+        self._state[target] = _USED
+        offset = self._offset[target]
+        _RECORD.pack_into(self._arena, offset, target, _RECORD.unpack_from(self._arena, offset)[1])
+
+    def _remove(self, slot):
+        """
+        Empties slot, and shifts back the entries after it which it separated from their home slot.
+        Its value is left in the arena, to be reclaimed when the tail reaches it.
+        """
+        state = self._state
+        mask = self._mask
+        follower = slot
+        while True:
+            follower = (follower + 1) & mask
+            if state[follower] == _EMPTY:
+                break
+            home = self._home(self._key_high[follower], self._key_low[follower])
+            if (follower - home) & mask >= (follower - slot) & mask:
+                self._move(follower, slot)
+                slot = follower
+        state[slot] = _EMPTY
+        self._referenced[slot] = 0
+        self._count -= 1
+
+    def discard(self, key):
+        slot, _ = self._find(key)
+        if slot >= 0:
+            self._remove(slot)
+
+    def _reclaim(self, spare):
+        """
+        Reclaims the value at the tail of the log: a dead value is dropped, and a live one is evicted
+        or, if spare and its entry has been read, moved to the head (where it fits).
+
+        Returns:
+            bool: True if the value was moved
+        """
+        arena = self._arena
+        tail = self._tail
+        slot, capacity = _RECORD.unpack_from(arena, tail)
+        size = RECORD_OVERHEAD + capacity
+        self._tail = tail + size
+        if self._state[slot] != _USED or self._offset[slot] != tail:
+            self._logged -= size
+            return False
+        # where the head precedes the tail, the record fits before its former place
+        fits = self._head <= tail or self._head + size <= self.arena_bytes
+        if not (spare and fits and self._referenced[slot]):
+            self._remove(slot)
+            self._logged -= size
+            return False
+
+        self._referenced[slot] = 0
+        self._offset[slot] = self._head
+        arena[self._head:self._head + size] = arena[tail:tail + size]
+        self._head += size
+        return True
+
+    def _allocate(self, size):
+        """
+        Returns:
+            int: offset of size bytes at the head of the log, made free, with room for an entry, by
+                reclaiming from its tail
+        """
+        spared = 0
+        while True:
+            if not self._logged:
+                self._head = self._tail = 0
+                self._wrap = self.arena_bytes
+            if self._count < self.max_entries:
+                if self._head > self._tail or not self._logged:
+                    if self._head + size <= self.arena_bytes:
+                        break
+                    self._wrap = self._head
+                    self._head = 0
+                    continue
+                elif self._head + size <= self._tail:
+                    break
+            if self._tail >= self._wrap:
+                self._tail = 0
+                self._wrap = self.arena_bytes
+            elif self._reclaim(spared < MAX_SPARED):
+                spared += 1
+
+        offset = self._head
+        self._head += size
+        self._logged += size
+        return offset
+
+    def put(self, key, value):
+        """
+        Adds or replaces the value of key, evicting other entries if necessary.  A value which could
+        never fit is not stored (and any former value of key is discarded).
+        """
+        length = len(value)
+        size = RECORD_OVERHEAD + length
+        if length > MAX_VALUE_LENGTH or size > self.arena_bytes:
+            self.discard(key)
+            return
+
+        slot, _ = self._find(key)
+        if slot >= 0:
+            offset = self._offset[slot]
+            if length <= _RECORD.unpack_from(self._arena, offset)[1]:
+                # overwrite in place, within the capacity of the former value
+                self._arena[offset + RECORD_OVERHEAD:offset + size] = value
+                self._length[slot] = length
+                return
+            self._remove(slot)
+
+        offset = self._allocate(size)
+
+        _, free = self._find(key)
+        self._key_high[free] = key >> 64
+        self._key_low[free] = key & _MASK64
+        self._offset[free] = offset
+        self._length[free] = length
+        self._state[free] = _USED
+        self._referenced[free] = 0
+        _RECORD.pack_into(self._arena, offset, free, length)
+        self._arena[offset + RECORD_OVERHEAD:offset + size] = value
+        self._count += 1
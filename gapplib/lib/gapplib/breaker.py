@@ -0,0 +1,113 @@
+"""
+A circuit breaker, which stops calls to a failing dependency so that requests fail over at once
+rather than each waiting out its own timeout.
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """
+    Closed, calls proceed, and consecutive failures are counted; at failure_threshold the breaker
+    opens.  Open, calls are refused until reset_timeout has elapsed; the breaker is then half open,
+    and a single call proceeds as a probe (others are still refused).  If the probe succeeds the
+    breaker closes; if it fails the breaker opens for another reset_timeout.
+
+    A caller asks allow() before each call, and reports its outcome with record_success or
+    record_failure.  A caller which serves a request by other means (e.g. from a stale copy)
+    reports it with record_fallback, so that stats can tell how much traffic was served so.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, clock=time.time):
+        """
+        Args:
+            failure_threshold (int): consecutive failures which open the breaker
+            reset_timeout (float): seconds for which the breaker stays open before a probe
+            clock (callable): returns the current time in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._probe_at = None
+        self.calls = 0
+        self.refused = 0
+        self.failed = 0
+        self.fallbacks = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """
+        Returns:
+            bool: True if the call may proceed
+        """
+        with self._lock:
+            self.calls += 1
+            if self._state == CLOSED:
+                return True
+            now = self._clock()
+            if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN:
+                # a probe which never reported its outcome is superseded after reset_timeout
+                if not self._probing or now - self._probe_at >= self.reset_timeout:
+                    self._probing = True
+                    self._probe_at = now
+                    return True
+            self.refused += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: state, and counts of calls asked, refused, failed, served by fallback, and of trips
+        """
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'calls': self.calls,
+                'refused': self.refused,
+                'failed': self.failed,
+                'fallbacks': self.fallbacks,
+                'fallback_share': float(self.fallbacks) / self.calls if self.calls else 0.0,
+                'trips': self.trips,
+            }
@@ -6,10 +6,12 @@ import logging
 import urlparse
 import httplib
 import os
+import time
 
-from google.appengine.api import modules
+from google.appengine.api import memcache, modules
 from google.appengine.api.app_identity import app_identity
 
+import profiler
 from status_templates import GENERIC_STATUS_TEMPLATE,NOT_FOUND_STATUS_TEMPLATE
 
 def host_url():
@@ -37,7 +39,7 @@ def write_error(response, code, message=None):
 
 def write_and_log_error(response, code, message=None):
     if message:
-        logging.error("status {code}: {msg}".format(code=code, msg=message))
+        logging.error("status %d: %s", code, message)
 
     write_error(response, code, message)
 
@@ -55,6 +57,54 @@ def render_error(response, code, message=None):
 
 def render_and_log_error(response, code, message=None):
     if message:
-        logging.error("status {code}: {msg}".format(code=code, msg=message))
-
-    render_error(response, code, message)
\ No newline at end of file
+        logging.error("status %d: %s", code, message)
+
+    render_error(response, code, message)
+
+
+class Profiled(object):
+    """
+    Mixin for a webapp2.RequestHandler whose requests may be profiled (see module, profiler): those
+    which carry a signed profile header, and a sample of the rest.  If the profiler is not enabled,
+    dispatch is not wrapped at all.
+
+    The profiler's ring belongs to the instance which served the request, whereas a later request
+    for the profile may reach any instance.  So each profile is also published to memcache under the
+    id of its request, which the response names in X-Profile-Id (see handlers.Profiles), and the
+    response names the instance in X-Profile-Instance.
+    """
+
+    profiler = profiler.PROFILER
+
+    PROFILE_KEY = 'profile:%s'
+    """str: memcache key of the folded stacks of a profiled request, by request id"""
+
+    PROFILE_TTL = 3600
+    """int: seconds for which a published profile is kept"""
+
+    def dispatch(self):
+        if not self.profiler.enabled:
+            return super(Profiled, self).dispatch()
+
+        sampler = self.profiler.begin(self.request.headers.get(profiler.HEADER))
+        if sampler is None:
+            return super(Profiled, self).dispatch()
+
+        start = time.time()
+        try:
+            return super(Profiled, self).dispatch()
+        finally:
+            self._publish(self.profiler.end(sampler, self.__class__.__name__, (time.time() - start) * 1000.0))
+
+    def _publish(self, profile):
+        self.response.headers['X-Profile-Instance'] = os.environ.get('INSTANCE_ID', '')
+        request_id = os.environ.get('REQUEST_LOG_ID')
+        if not request_id:
+            return
+        try:
+            memcache.set(self.PROFILE_KEY % request_id, profiler.aggregate([profile]), time=self.PROFILE_TTL)
+        except ValueError as e:
+            # too large for memcache; the profile remains in the ring of this instance
+            logging.warning("profile of request %s not published: %s", request_id, e)
+        else:
+            self.response.headers['X-Profile-Id'] = request_id
@@ -0,0 +1,204 @@
+"""
+A sampling profiler which is activated for single requests.  While a request is profiled, a thread
+samples the request thread's stack at a fixed interval; the request itself runs uninstrumented, so
+its cost is that of the sampler thread rather than a hook upon every call.  Profiles are kept in a
+per-instance ring (see gapplib.handler.Profiled, which also publishes each profile for retrieval
+from any instance) and aggregated into folded stacks, the input format of flame graph tools:
+
+    dispatch (webapp2.py:570);get (handlers.py:29);get_by_id (model.py:3410) 12
+
+A request is profiled if it carries a valid signed header, or if it is drawn at the sampling rate.
+With neither a secret nor a rate configured, deciding costs one attribute test per request.
+"""
+
+import hashlib
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+HEADER = 'X-Profile'
+"""str: request header which asks for a profile: '<expires>:<signature>' (see sign)"""
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_CAPACITY = 32
+DEFAULT_MAX_ACTIVE = 2
+
+Profile = namedtuple('Profile', ['time', 'route', 'duration', 'samples'])
+"""
+time (float): seconds since the epoch at which the request completed
+route (str): name of the route (handler) which served the request
+duration (float): milliseconds spent in the handler
+samples (dict): number of samples keyed by folded stack
+"""
+
+
+def sign(secret, expires):
+    """
+    Produces the value of the profile header, valid until expires.
+
+    Args:
+        secret (str): secret shared with the instance
+        expires (int): seconds since the epoch
+
+    Returns:
+        str: header value
+    """
+    expires = str(int(expires))
+    return '%s:%s' % (expires, hmac.new(secret, expires, hashlib.sha256).hexdigest())
+
+
+def verify(secret, value, now=None):
+    """
+    Returns:
+        bool: True if value is an unexpired header value produced by sign with secret
+    """
+    expires, _, signature = (value or '').partition(':')
+    if not expires.isdigit() or int(expires) <= (now or time.time()):
+        return False
+    return hmac.compare_digest(sign(secret, expires), value)
+
+
+def _frame_name(code):
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def fold(frame):
+    """
+    Returns:
+        str: the stack ending at frame, outermost first, as a folded stack
+    """
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class StackSampler(object):
+    """
+    Samples the stack of one thread from another thread until stopped.
+    """
+
+    def __init__(self, thread_id, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler')
+        self._thread.daemon = True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = fold(frame)
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Returns:
+            dict: number of samples keyed by folded stack
+        """
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+
+class Profiler(object):
+    """
+    Decides which requests are profiled, and keeps the most recent profiles.  At most max_active
+    requests are profiled at once, which bounds the cost of sampling however many requests ask.
+    """
+
+    def __init__(self, sample_rate=0.0, secret=None, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY,
+                 max_active=DEFAULT_MAX_ACTIVE):
+        """
+        Args:
+            sample_rate (float): fraction of requests profiled without being asked
+            secret (str): key with which profile headers are signed. None if headers are not honored.
+            interval (float): seconds between samples
+            capacity (int): number of profiles retained
+            max_active (int): maximum number of requests profiled at once
+        """
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.interval = interval
+        self.max_active = max_active
+        self.enabled = bool(sample_rate > 0 or secret)
+        self._profiles = deque(maxlen=capacity)
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def begin(self, header=None):
+        """
+        Starts to profile the current thread if the request is to be profiled.
+
+        Args:
+            header (str): value of the profile header of the request, if any
+
+        Returns:
+            StackSampler: to be passed to end. None if the request is not profiled.
+        """
+        asked = bool(self.secret and header and verify(self.secret, header))
+        if not asked and random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            if self._active >= self.max_active:
+                return None
+            self._active += 1
+        return StackSampler(threading.current_thread().ident, self.interval).start()
+
+    def end(self, sampler, route, duration):
+        """
+        Returns:
+            Profile: the profile of the request, which is also retained
+        """
+        profile = Profile(time.time(), route, duration, sampler.stop())
+        with self._lock:
+            self._active -= 1
+            self._profiles.append(profile)
+        return profile
+
+    def profiles(self, route=None):
+        with self._lock:
+            return [p for p in self._profiles if route is None or p.route == route]
+
+    def folded(self, route=None):
+        """
+        Aggregates the retained profiles.
+
+        Args:
+            route (str): aggregate only the profiles of route. None for all.
+
+        Returns:
+            str: one line per distinct stack, '<folded stack> <samples>'
+        """
+        return aggregate(self.profiles(route))
+
+
+def aggregate(profiles):
+    """
+    Returns:
+        str: the samples of profiles as folded stacks, one line per distinct stack
+    """
+    totals = {}
+    for profile in profiles:
+        for stack, count in profile.samples.iteritems():
+            totals[stack] = totals.get(stack, 0) + count
+    return ''.join('%s %d\n' % (stack, count) for stack, count in sorted(totals.iteritems()))
+
+
+PROFILER = Profiler(
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    secret=os.getenv('PROFILE_SECRET') or None)
+"""Profiler: the profiler of the current instance"""
@@ -0,0 +1,175 @@
+"""
+Streaming frequency estimation in a fixed amount of memory, regardless of the number of distinct
+items observed.
+"""
+
+import array
+import heapq
+import threading
+
+DEFAULT_WIDTH = 4096
+DEFAULT_DEPTH = 4
+
+DECAY_STEP = 64
+"""int: counters of the sketch scaled per observation while a decay of HeavyHitters is under way"""
+
+
+class CountMinSketch(object):
+    """
+    A count-min sketch: depth rows of width counters, each row indexed by a differently salted hash
+    of the item.  An estimate never undercounts; it overcounts by an amount which shrinks as the
+    width grows.
+    """
+
+    def __init__(self, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH):
+        self.width = width
+        self.depth = depth
+        self._rows = [array.array('L', [0]) * width for _ in xrange(depth)]
+        self._salts = [0x9E3779B1 * (n + 1) for n in xrange(depth)]
+        self._decay_factor = None
+        self._decay_next = 0
+
+    def _columns(self, item):
+        return [hash((salt, item)) % self.width for salt in self._salts]
+
+    def add(self, item, count=1):
+        """
+        Returns:
+            int: the estimated count of the item after the addition
+        """
+        estimate = None
+        for row, column in zip(self._rows, self._columns(item)):
+            row[column] += count
+            if estimate is None or row[column] < estimate:
+                estimate = row[column]
+        return estimate
+
+    def estimate(self, item):
+        return min(row[column] for row, column in zip(self._rows, self._columns(item)))
+
+    def decay(self, factor=0.5):
+        """
+        Scales all counters so that past observations lose weight relative to future ones.
+        """
+        self.begin_decay(factor)
+        self.continue_decay(self.width * self.depth)
+
+    def begin_decay(self, factor=0.5):
+        """
+        Begins to scale all counters, a portion at a time (see continue_decay), so that no single
+        caller pays for the whole.  Until the decay is complete, an estimate may be of counters of
+        which some have been scaled and others not.  A decay under way is first completed.
+        """
+        if self.decaying:
+            self.continue_decay(self.width * self.depth)
+        self._decay_factor = factor
+        self._decay_next = 0
+
+    def continue_decay(self, count):
+        """
+        Scales up to count further counters of the decay under way, if any.
+        """
+        if not self.decaying:
+            return
+        end = min(self._decay_next + count, self.width * self.depth)
+        factor = self._decay_factor
+        for n in xrange(self._decay_next, end):
+            row = self._rows[n // self.width]
+            column = n % self.width
+            row[column] = int(row[column] * factor)
+        self._decay_next = end
+        if end == self.width * self.depth:
+            self._decay_factor = None
+
+    @property
+    def decaying(self):
+        return self._decay_factor is not None
+
+
+class HeavyHitters(object):
+    """
+    Tracks the k most frequently observed items in a stream.  Frequencies are estimated by a
+    count-min sketch; the current top k are held in a min-heap so that the least of them can be
+    displaced cheaply.  Counts decay periodically so that formerly popular items age out; the
+    counters of the sketch are scaled a few at a time by the observations which follow, so that
+    no observation holds the lock for a whole pass over the sketch.
+
+    Heap entries may lag the counts of their items (the heap is not re-ordered upon each
+    observation).  Since counts only grow between decays, the lagging entry at the top of the heap
+    is brought up to date until the top is current, at which point it is the true minimum.
+    """
+
+    def __init__(self, k=32, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, decay_interval=100000, decay_factor=0.5):
+        """
+        Args:
+            k (int): number of items to track
+            width (int): counters per row of the sketch
+            depth (int): rows of the sketch
+            decay_interval (int): observations between decays
+            decay_factor (float): factor by which counts are scaled upon decay
+        """
+        self.k = k
+        self.decay_interval = decay_interval
+        self.decay_factor = decay_factor
+        self._sketch = CountMinSketch(width, depth)
+        self._counts = {}
+        self._heap = []
+        self._observed = 0
+        self._lock = threading.Lock()
+
+    def _current_min(self):
+        while True:
+            count, item = self._heap[0]
+            current = self._counts[item]
+            if count == current:
+                return count, item
+            heapq.heapreplace(self._heap, (current, item))
+
+    def _decay(self):
+        self._sketch.begin_decay(self.decay_factor)
+        for item in self._counts:
+            self._counts[item] = int(self._counts[item] * self.decay_factor)
+        self._heap = [(count, item) for item, count in self._counts.iteritems()]
+        heapq.heapify(self._heap)
+
+    def add(self, item):
+        """
+        Records an observation of an item.
+
+        Returns:
+            object: an item which was displaced from the top k by this observation, else None
+        """
+        displaced = None
+        with self._lock:
+            self._sketch.continue_decay(DECAY_STEP)
+            count = self._sketch.add(item)
+            if item in self._counts:
+                self._counts[item] = count
+            elif len(self._counts) < self.k:
+                self._counts[item] = count
+                heapq.heappush(self._heap, (count, item))
+            elif count > self._heap[0][0]:
+                least, displaced = self._current_min()
+                if count > least:
+                    del self._counts[displaced]
+                    self._counts[item] = count
+                    heapq.heapreplace(self._heap, (count, item))
+                else:
+                    displaced = None
+
+            self._observed += 1
+            if self._observed % self.decay_interval == 0:
+                self._decay()
+
+        return displaced
+
+    def __contains__(self, item):
+        return item in self._counts
+
+    def top(self):
+        """
+        Returns:
+            list: (item, estimated count) for the tracked items, most frequent first
+        """
+        with self._lock:
+            return sorted(self._counts.iteritems(), key=lambda ic: ic[1], reverse=True)
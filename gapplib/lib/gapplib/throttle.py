@@ -0,0 +1,95 @@
+"""
+Rate limiting, both of background work which must not compete with request-serving traffic and of
+logging provoked by junk traffic.
+"""
+
+import threading
+import time
+
+
+class WriteBudget(object):
+    """
+    A token bucket which meters datastore writes issued by background work.  Tokens accrue at
+    a fixed rate up to a burst limit; a caller which consumes more tokens than are available
+    is put to sleep until the deficit would have been replenished.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        """
+        Args:
+            rate (float): writes per second
+            burst (float): maximum number of tokens which may accrue. defaults to one second of writes.
+            clock (callable): returns the current time in seconds
+            sleep (callable): suspends the caller for a number of seconds
+        """
+        if rate <= 0:
+            raise ValueError("write budget rate must be positive (%r)" % rate)
+
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def consume(self, count):
+        """
+        Withdraws tokens for a number of writes, sleeping if the budget is exhausted.
+
+        Args:
+            count (int): the number of writes about to be issued
+
+        Returns:
+            float: seconds spent waiting for the budget to replenish
+        """
+        self._refill()
+        self._tokens -= count
+        if self._tokens >= 0:
+            return 0.0
+
+        wait = -self._tokens / self.rate
+        self._sleep(wait)
+        self._refill()
+        return wait
+
+
+class LogLimiter(object):
+    """
+    Admits at most a fixed number of log messages per interval, so that a flood of junk requests
+    cannot flood the log.  Messages which are not admitted are counted, and the count is reported
+    by the next message admitted.  A limiter may be shared by the threads of an instance.
+    """
+
+    def __init__(self, limit=10, interval=60.0, clock=time.time):
+        self.limit = limit
+        self.interval = interval
+        self._clock = clock
+        self._window_start = clock()
+        self._admitted = 0
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def admit(self):
+        """
+        Returns:
+            int: number of messages suppressed since the last admission, if this message is admitted
+            None: if this message is suppressed
+        """
+        with self._lock:
+            now = self._clock()
+            if now - self._window_start >= self.interval:
+                self._window_start = now
+                self._admitted = 0
+
+            if self._admitted >= self.limit:
+                self.suppressed += 1
+                return None
+
+            self._admitted += 1
+            suppressed, self.suppressed = self.suppressed, 0
+            return suppressed
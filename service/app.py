@@ -1,15 +1,45 @@
 import webapp2
 
-from handlers import ShortenUrl, QueryUrl, RedirectUrl
+from google.appengine.ext import ndb
+
+from front_door import FrontDoor
+from gapplib import access_log
+from handlers import ShortenUrl, QueryUrl, RedirectUrl, ResolveUrls
+from handlers import BreakerStats, FlushAccessLog, PersistPending, Profiles, RewriteEntities, SweepExpired, TopLinks, WriteBehindStats
+
+if access_log.ACCESS_LOG_FLUSHER == 'background':
+    # background threads (manual and basic scaling only) outlive requests, and the shutdown hook
+    # flushes what is left when the instance stops
+    from google.appengine.api import background_thread, runtime
+    access_log.ACCESS_LOG.start_flusher(background_thread.start_new_background_thread)
+    runtime.set_shutdown_hook(access_log.ACCESS_LOG.flush)
 
 create_or_update = webapp2.WSGIApplication([
     ('/shorturl', ShortenUrl),
 ], debug=True)
 
 query = webapp2.WSGIApplication([
+    ('/shorturl/', ResolveUrls),
     webapp2.Route('/shorturl/<sid:.+>', handler=QueryUrl, name='query'),
 ], debug=True)
 
-redirect = webapp2.WSGIApplication([
+# a redirect does not wait upon the write which refreshes an idle expiry.
+# toplevel ensures that the write completes before the request does.
+# the front door turns away paths which cannot be short ids before webapp2 sees them.
+redirect = FrontDoor(ndb.toplevel(webapp2.WSGIApplication([
     webapp2.Route('/<sid:.*>', handler=RedirectUrl, name='redirect'),
+], debug=True)))
+
+maintenance = webapp2.WSGIApplication([
+    ('/_gc/sweep', SweepExpired),
+    webapp2.Route('/_gc/rewrite/<kind:\w+>', handler=RewriteEntities, name='rewrite'),
+    ('/_tasks/persist', PersistPending),
+    ('/_tasks/access_log', FlushAccessLog),
+], debug=True)
+
+stats = webapp2.WSGIApplication([
+    ('/_stats/top', TopLinks),
+    ('/_stats/profile', Profiles),
+    ('/_stats/write_behind', WriteBehindStats),
+    ('/_stats/breaker', BreakerStats),
 ], debug=True)
@@ -0,0 +1,65 @@
+"""
+WSGI middleware which screens requests on the redirect route before they reach webapp2.  Requests
+for well-known paths which browsers and crawlers ask of any host are answered directly; paths
+which cannot be a short id are rejected without decoding them.  Responses to such requests are
+prepared once, are minimal, and may be cached by the edge.
+"""
+
+import httplib
+import logging
+import time
+
+from gapplib import access_log, throttle
+
+from model import short_id
+from model.model_error import DecodeError
+
+_CACHE_CONTROL = ('Cache-Control', 'public, max-age=86400')
+
+
+def _prepared(code, body='', content_type='text/plain'):
+    status = '%d %s' % (code, httplib.responses[code])
+    headers = [('Content-Type', content_type), ('Content-Length', str(len(body))), _CACHE_CONTROL]
+    return code, status, headers, [body]
+
+
+WELL_KNOWN = {
+    'favicon.ico': _prepared(httplib.NO_CONTENT),
+    'robots.txt': _prepared(httplib.OK, 'User-agent: *\nDisallow:\n'),
+}
+"""dict: prepared responses keyed by path (without leading /)"""
+
+REJECTED = _prepared(httplib.BAD_REQUEST, 'invalid short url\n')
+
+
+class FrontDoor(object):
+    """
+    Wraps the redirect application.  Only requests which name a plausible short id (or no short
+    id at all) are passed on to it.
+    """
+
+    def __init__(self, app, log_limiter=None):
+        self.app = app
+        self.log_limiter = log_limiter or throttle.LogLimiter()
+
+    def __call__(self, environ, start_response):
+        start = time.time()
+        sid = environ.get('PATH_INFO', '/')[1:]
+        prepared = WELL_KNOWN.get(sid)
+
+        if prepared is None and sid:
+            try:
+                short_id.validate_form(sid)
+            except DecodeError as e:
+                suppressed = self.log_limiter.admit()
+                if suppressed is not None:
+                    logging.warning("rejected sid (%s): %s (%d similar suppressed)", sid[:64], e.message, suppressed)
+                prepared = REJECTED
+
+        if prepared is None:
+            return self.app(environ, start_response)
+
+        code, status, headers, body = prepared
+        start_response(status, headers)
+        access_log.ACCESS_LOG.record(self.__class__.__name__, None, None, code, (time.time() - start) * 1000.0)
+        return body
@@ -1,20 +1,104 @@
+import calendar
 import httplib
 import json
 import logging
 import os
+import time
+from datetime import datetime
+
 import webapp2
 
+from google.appengine.api import datastore_errors, memcache, taskqueue
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+from google.appengine.runtime import apiproxy_errors
+
 import model
-from model.model_error import DecodeError, ModelError
+import write_behind
+from hot_links import HOT_LINKS
+from snapshot import SNAPSHOT
+from url_cache import URL_CACHE
+from model.model_error import DecodeError, ExpiryError, ModelError
+
+from gapplib import breaker, handler, strutil, throttle
+from gapplib.access_log import ACCESS_LOG, AccessLogged
+from gapplib.handler import Profiled
+
+REDIRECT_LOOKUP_DEADLINE = float(os.getenv('REDIRECT_LOOKUP_DEADLINE', '0.5'))
+"""float: seconds for which a redirect waits upon the datastore before it falls back to a stale copy"""
+
+LOOKUP_BREAKER = breaker.CircuitBreaker(
+    failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', '10')))
+"""breaker.CircuitBreaker: guards the datastore lookups of redirects"""
+
+LOOKUP_ERRORS = (datastore_errors.Error, apiproxy_errors.Error)
+"""tuple: errors of a datastore lookup which count against the breaker (e.g. timeouts)"""
+
+PERSIST_PENDING_PATH = '/_tasks/persist'
+
+
+def _schedule_persist(bucket):
+    """
+    Queues a task to persist pending short urls; one per bucket of time, however many instances ask.
+    """
+    try:
+        taskqueue.add(url=PERSIST_PENDING_PATH, name='persist-pending-%d' % bucket)
+    except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+        pass
+    except (taskqueue.Error, apiproxy_errors.Error) as e:
+        # the mapping has been queued durably: cron persists it if no task is scheduled
+        logging.warning("failed to schedule persistence of pending short urls: %r", e)
 
-from gapplib import handler, strutil
+
+def _pending_url(write_behind, kid):
+    """
+    Returns:
+        (str, datetime): the destination url and expiry (None if none) of a short url which was
+            created write-behind and has not yet been persisted. (None, None) if there is none, or
+            if it has expired.
+    """
+    pending = write_behind.lookup(kid) if write_behind else None
+    if pending is None or (pending.expires and pending.expires <= time.time()):
+        return None, None
+    return pending.url, datetime.utcfromtimestamp(pending.expires) if pending.expires else None
 
 
-class RedirectUrl(webapp2.RequestHandler):
+WRITE_BEHIND = write_behind.WriteBehind(
+    write_behind.PullQueue(write_behind.WRITE_BEHIND_QUEUE),
+    write_behind.MemcacheTier(),
+    write_behind.KidReserve(model.pending.reserve_kids),
+    model.pending.persist,
+    schedule=_schedule_persist,
+    batch_size=write_behind.WRITE_BEHIND_BATCH_SIZE,
+    max_retries=write_behind.WRITE_BEHIND_MAX_RETRIES) if write_behind.WRITE_BEHIND else None
+"""write_behind.WriteBehind: creates short urls write-behind. None if short urls are written at once."""
+
+
+class _Unavailable(Exception):
     """
-    Issues redirect to destination url
+    Raised if a short url can be resolved neither from the datastore nor from a stale copy.
     """
 
+
+class RedirectUrl(AccessLogged, Profiled, webapp2.RequestHandler):
+    """
+    Issues redirect to destination url.  Short urls which are heavy hitters on this instance
+    are served from the pinned table of hot links; others which have been resolved recently,
+    from the cache of destination urls.
+
+    The datastore lookup is guarded by a circuit breaker, and bounded by a deadline.  While the
+    datastore is failing, redirects are served from stale copies: ndb's memcache copy of the entity,
+    a pending write-behind mapping, or the latest exported snapshot.
+    """
+
+    hot_links = HOT_LINKS
+    url_cache = URL_CACHE
+    write_behind = WRITE_BEHIND
+    breaker = LOOKUP_BREAKER
+    snapshot = SNAPSHOT
+    lookup_log = throttle.LogLimiter()
+
     def get(self, **kwargs):
         sid = kwargs.get('sid', None)
         # if no short id is specified, redirect to main page of the ui
@@ -22,27 +106,93 @@ class RedirectUrl(webapp2.RequestHandler):
             ui_url = handler.module_url('ui')
             self.redirect(ui_url)
         else:
+            self.access_sid = sid
             try:
                 # convert the short_id into an ndb integer id
                 # and retrieve the short url
-                kid = model.short_id.decode(sid)
-                short_url = model.ShortUrl().get_by_id(kid)
-                if short_url:
+                kid = self.access_kid = model.short_id.decode_key_id(sid)
+                short_url = self.hot_links.get(kid)
+                if short_url is None:
+                    url = self.url_cache.get(kid)
+                    if url is None:
+                        short_url, url = self._lookup(kid)
+                    if url is not None:
+                        self.redirect(url)
+                        return
+
+                if short_url and not short_url.is_expired():
+                    short_url.touch()
                     self.redirect(short_url.url)
                 else:
-                    logging.error("sid %s: kid %d: not found" % (sid, kid))
                     handler.render_error(self.response, httplib.NOT_FOUND, handler.host_path(sid))
+            except _Unavailable:
+                self.response.headers.add_header('Retry-After', str(int(self.breaker.reset_timeout)))
+                handler.render_error(self.response, httplib.SERVICE_UNAVAILABLE, handler.host_path(sid))
             except DecodeError as e:
-                handler.render_and_log_error(self.response, httplib.BAD_REQUEST, e.message)
+                handler.render_error(self.response, httplib.BAD_REQUEST, e.message)
             except StandardError as e:
                 handler.render_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
 
+    def _lookup(self, kid):
+        """
+        Resolves a short url which this instance does not hold.
+
+        Returns:
+            (model.ShortUrl, str): the short url, if it was read from the datastore; otherwise the
+                destination url of a pending or stale copy of it, if any
+
+        Raises:
+            _Unavailable: if the datastore is failing and there is no stale copy
+        """
+        if self.breaker.allow():
+            try:
+                short_url = model.ShortUrl.get_by_id(kid, deadline=REDIRECT_LOOKUP_DEADLINE)
+            except LOOKUP_ERRORS as e:
+                self.breaker.record_failure()
+                suppressed = self.lookup_log.admit()
+                if suppressed is not None:
+                    logging.warning("datastore lookup failed (breaker %s): %r (%d similar suppressed)",
+                                    self.breaker.state, e, suppressed)
+            else:
+                self.breaker.record_success()
+                if short_url:
+                    self.hot_links.offer(kid, short_url)
+                    self.url_cache.put(kid, short_url)
+                    return short_url, None
+                # the short url may have been created, but not yet persisted
+                return None, _pending_url(self.write_behind, kid)[0]
+
+        url = self._stale(kid)
+        if url is None:
+            raise _Unavailable()
+        self.breaker.record_fallback()
+        return None, url
 
-class QueryUrl(webapp2.RequestHandler):
+    def _stale(self, kid):
+        """
+        Returns:
+            str: the destination url of a copy of the short url held outside the datastore, if any
+        """
+        try:
+            cached = model.ShortUrl.get_by_id(kid, use_datastore=False, deadline=REDIRECT_LOOKUP_DEADLINE)
+            if cached and not cached.is_expired():
+                return cached.url
+        except LOOKUP_ERRORS:
+            pass
+
+        url, _ = _pending_url(self.write_behind, kid)
+        if url is not None:
+            return url
+        return self.snapshot.get(kid)
+
+
+class QueryUrl(AccessLogged, Profiled, webapp2.RequestHandler):
     """
     Handles requests to get destination url without redirection
     """
 
+    write_behind = WRITE_BEHIND
+
     def get(self, **kwargs):
         sid = kwargs.get('sid', None)
         if not sid:
@@ -51,30 +201,165 @@ class QueryUrl(webapp2.RequestHandler):
             self._get_url(sid)
 
     def _get_url(self, sid):
+        self.access_sid = sid
         try:
-            kid = model.short_id.decode(sid)
+            kid = self.access_kid = model.short_id.decode_key_id(sid)
             short_url = model.ShortUrl().get_by_id(kid)
-            if short_url:
+            if short_url and not short_url.is_expired():
+                url, expires = short_url.url, short_url.expires
+            else:
+                # the short url may have been created, but not yet persisted
+                url, expires = _pending_url(self.write_behind, kid)
+            if url:
+                content = {'url': url, 'short_url': handler.host_path(sid) }
+                if expires:
+                    content['expires'] = expires.isoformat()
                 self.response.set_status(httplib.OK)
-                self.response.write(json.dumps( {'url': short_url.url, 'short_url': handler.host_path(sid) }))
+                self.response.write(json.dumps(content))
                 self.response.headers.add_header('Content-Type', 'application/json')
-                logging.info("query succeeded: sid==%s" % sid)
             else:
                 message="no corresponding short url: short id '%s'" % sid
-                handler.write_and_log_error(self.response, httplib.NOT_FOUND, message=message)
+                handler.write_error(self.response, httplib.NOT_FOUND, message=message)
 
         except DecodeError as e:
-            handler.write_and_log_error(self.response, httplib.BAD_REQUEST, message=e.message)
+            handler.write_error(self.response, httplib.BAD_REQUEST, message=e.message)
         except StandardError as e:
             handler.write_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
 
 
-class ShortenUrl(webapp2.RequestHandler):
+class ResolveUrls(AccessLogged, Profiled, webapp2.RequestHandler):
+    """
+    Resolves many short urls in one request: GET with repeated 'sid' parameters, or POST of a json
+    payload, {"sids": [...]}.  The response is a json object keyed by short id, with a status per
+    short id, as that of QueryUrl:
+
+        200     {"status": 200, "url": ..., "short_url": ..., "expires": ...}
+        400     {"status": 400, "message": ...}    the short id is malformed
+        404     {"status": 404}                    no such short url, or it has expired
+        500     {"status": 500}                    the short url could not be fetched
+
+    Short urls which are not in the cache of destination urls are fetched with one get_multi.
+    Entries are in the order of the request; the response is buffered, so that it is sent once every
+    short id has been resolved.
+    """
+
+    url_cache = URL_CACHE
+    write_behind = WRITE_BEHIND
+    max_sids = 1000
+
+    def get(self):
+        self._resolve(self.request.GET.getall('sid'))
+
+    def post(self):
+        try:
+            sids = json.loads(self.request.body).get('sids')
+            if not isinstance(sids, list) or not all(isinstance(sid, basestring) for sid in sids):
+                raise ValueError("'sids' must be a list of short ids")
+        except (AttributeError, ValueError) as e:
+            handler.write_error(self.response, httplib.BAD_REQUEST, e.message)
+        else:
+            self._resolve(sids)
+
+    def _resolve(self, sids):
+        if not sids:
+            handler.write_error(self.response, httplib.BAD_REQUEST, 'empty or missing reference to short url')
+            return
+        if len(sids) > self.max_sids:
+            message = 'too many short ids (%d); at most %d may be resolved per request' % (len(sids), self.max_sids)
+            handler.write_error(self.response, httplib.REQUEST_ENTITY_TOO_LARGE, message)
+            return
+
+        # a short id repeated in the request is resolved once
+        seen = set()
+        unique = []
+        for sid in sids:
+            sid = sid.encode('utf-8')
+            if sid not in seen:
+                seen.add(sid)
+                unique.append(sid)
+        sids = unique
+
+        try:
+            entries = self._decode(sids)
+            pending = [sid for sid in sids if isinstance(entries[sid], (int, long))]
+            futures = ndb.get_multi_async([ndb.Key(model.ShortUrl, entries[sid]) for sid in pending])
+            for sid, future in zip(pending, futures):
+                entries[sid] = (entries[sid], future)
+        except StandardError as e:
+            handler.write_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
+            return
+
+        self.response.set_status(httplib.OK)
+        self.response.headers.add_header('Content-Type', 'application/json')
+        out = self.response.out
+        separator = '{'
+        for sid in sids:
+            out.write('%s%s: %s' % (separator, json.dumps(sid), json.dumps(self._entry(sid, entries[sid]))))
+            separator = ', '
+        out.write('}')
+
+    def _decode(self, sids):
+        """
+        Decodes every short id, and looks each up in the cache of destination urls.  A short id which
+        is malformed, or which names no possible key (e.g. kid 0), is answered alone with a 400.
+
+        Returns:
+            dict: per short id, its cached (url, expires), its kid if it must be fetched, or the
+                DecodeError which it raised
+        """
+        entries = {}
+        for sid in sids:
+            try:
+                kid = model.short_id.decode_key_id(sid)
+            except DecodeError as e:
+                entries[sid] = e
+                continue
+            cached = self.url_cache.lookup(kid)
+            entries[sid] = cached if cached else kid
+        return entries
+
+    def _entry(self, sid, entry):
+        if isinstance(entry, DecodeError):
+            return {'status': httplib.BAD_REQUEST, 'message': entry.message}
+
+        if isinstance(entry[1], ndb.Future):
+            kid, future = entry
+            try:
+                short_url = future.get_result()
+            except StandardError as e:
+                logging.error("status %d: %s", httplib.INTERNAL_SERVER_ERROR, e.message)
+                return {'status': httplib.INTERNAL_SERVER_ERROR}
+            if short_url and not short_url.is_expired():
+                self.url_cache.put(kid, short_url)
+                url, expires = short_url.url, short_url.expires
+            else:
+                url, expires = _pending_url(self.write_behind, kid)
+                if url is None:
+                    return {'status': httplib.NOT_FOUND}
+        else:
+            url, expires = entry
+
+        content = {'status': httplib.OK, 'url': url, 'short_url': handler.host_path(sid)}
+        if expires:
+            content['expires'] = expires.isoformat()
+        return content
+
+
+class ShortenUrl(AccessLogged, Profiled, webapp2.RequestHandler):
     """
     Creates a short url which corresponsds to a destination url.  If destination url has already
     been assigned a short url, a reference to the existing is returned.
+
+    The payload may optionally specify an expiry for a newly created short url, either as an absolute
+    time, 'expires' (seconds since the epoch), or as an idle time, 'idle_ttl' (seconds without access).
+    The expiry of an existing short url is not altered.
+
+    If write-behind is configured, a new short url is returned before it is persisted (see module,
+    write_behind).
     """
 
+    write_behind = WRITE_BEHIND
+
     def post(self):
         url = self._extract_post_url()
         if url:
@@ -82,22 +367,24 @@ class ShortenUrl(webapp2.RequestHandler):
 
     def _extract_post_url(self):
         """
-        Extracts/Validates url from json payload
+        Extracts/Validates url from json payload.  Any expiry is retained in self.expiry.
         Returns:
 
         """
         valid_url = None
+        self.expiry = {}
 
         try:
             payload = json.loads(self.request.body)
             url = payload.get('url')
             if not url:
-                handler.write_and_log_error(self.response, httplib.BAD_REQUEST, 'empty url')
+                handler.write_error(self.response, httplib.BAD_REQUEST, 'empty url')
             elif len(url) > model.MAX_URL_LENGTH:
                 message='url exceeds maximum allowed length (%d)' % model.MAX_URL_LENGTH
-                handler.write_and_log_error(self.response, httplib.REQUEST_ENTITY_TOO_LARGE, message)
+                handler.write_error(self.response, httplib.REQUEST_ENTITY_TOO_LARGE, message)
             else:
                 valid_url = url.encode('utf-8')
+                self.expiry = self._extract_expiry(payload)
         except ValueError as e:
             handler.write_error(self.response, httplib.BAD_REQUEST, e.message)
         except TypeError as e:
@@ -107,34 +394,84 @@ class ShortenUrl(webapp2.RequestHandler):
 
         return valid_url
 
+    @staticmethod
+    def _extract_expiry(payload):
+        """
+        Raises:
+            ExpiryError: if an expiry is not a representable number of seconds (e.g. 1e400).
+                ShortUrl.set_expiry validates the range of an expiry which is.
+        """
+        expiry = {}
+        try:
+            if payload.get('expires') is not None:
+                expiry['expires'] = datetime.utcfromtimestamp(float(payload['expires']))
+            if payload.get('idle_ttl') is not None:
+                expiry['idle_ttl'] = int(payload['idle_ttl'])
+        except (OverflowError, ValueError) as e:
+            raise ExpiryError(ExpiryError.INVALID_EXPIRY, str(e))
+        return expiry
+
+    @staticmethod
+    def _shorten(dest_url, short_url):
+        """
+        Returns:
+            ndb.Key: key of the short url, which has been written with its destination url
+        """
+        short_url_key = None
+        dk = dest_url.put()
+        if dk:
+            # associate the short url with destination
+            short_url_key = short_url.put()
+            if short_url_key:
+                dest_url.short_key = short_url_key
+
+                # i contemplated making this an async operation, however ...
+                # ... the first simple test did not work properly ...
+                # as if the entity was stuck waiting for the write to complete
+                dest_url.put()
+        return short_url_key
+
+    def _shorten_write_behind(self, dest_url, short_url):
+        """
+        Returns:
+            int: kid of the short url, whose mapping is queued to be persisted
+        """
+        expires = calendar.timegm(short_url.expires.utctimetuple()) if short_url.expires else None
+        return self.write_behind.shorten(dest_url.key.urlsafe(), short_url.url, expires, short_url.idle_ttl)
+
+    @staticmethod
+    def _has_expired(short_url_key):
+        short_url = short_url_key.get()
+        return not short_url or short_url.is_expired()
+
     def _post_url(self, url):
         try:
             short_url_key = None
             dest_url = model.url.DestinationUrl.get_by_url(url)
+            if dest_url and dest_url.short_key and self._has_expired(dest_url.short_key):
+                # the short url expired, but has not yet been collected. issue a new one.
+                dest_url = None
+
             if dest_url:
                 short_url_key = dest_url.short_key
                 if not short_url_key:
                     handler.write_and_log_error(self.response, httplib.CONFLICT)
             else:
                 # a short url has not been created for this destination url - create it
+                # (expiry is validated before anything is written)
+                short_url = model.url.ShortUrl()
+                short_url.url = url
+                short_url.set_expiry(**self.expiry)
+
                 dest_url = model.url.DestinationUrl.construct(url)
-                dk = dest_url.put()
-                if dk:
-                    # create a short url and associate it with destination
-                    short_url = model.url.ShortUrl()
-                    short_url.url = url
-                    short_url_key = short_url.put()
-                    if short_url_key:
-                        dest_url.short_key = short_url_key
-
-                        # i contemplated making this an async operation, however ...
-                        # ... the first simple test did not work properly ...
-                        # as if the entity was stuck waiting for the write to complete
-                        dest_url.put()
+                if self.write_behind:
+                    short_url_key = ndb.Key(model.ShortUrl, self._shorten_write_behind(dest_url, short_url))
+                else:
+                    short_url_key = self._shorten(dest_url, short_url)
 
             if short_url_key:
-                sid = model.short_id.encode(short_url_key.id())
-                logging.info('created short id (%s) for url (%s)' % (sid, strutil.truncate(url, 128)))
+                sid = self.access_sid = model.short_id.encode(short_url_key.id())
+                self.access_kid = short_url_key.id()
 
                 self.response.set_status(httplib.CREATED)
                 self.response.write(json.dumps( {'short_id': sid }))
@@ -144,6 +481,215 @@ class ShortenUrl(webapp2.RequestHandler):
                 message = 'Failed to create short url for url (%s)' % strutil.truncate(url, 128)
                 handler.write_and_log_error(self.response, httplib.INSUFFICIENT_STORAGE, message=message)
         except ModelError as e:
-            handler.write_and_log_error(self.response, httplib.BAD_REQUEST, e.message)
+            handler.write_error(self.response, httplib.BAD_REQUEST, e.message)
+        except StandardError as e:
+            handler.write_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
+
+
+class SweepExpired(webapp2.RequestHandler):
+    """
+    Deletes expired short urls and their destination urls.  Invoked periodically by cron.  A sweep
+    which does not complete within its time slice continues from its cursor in a queued task.
+    """
+
+    TIME_SLICE = 30
+    """int: seconds of sweeping per request, well within the request deadline"""
+
+    def get(self):
+        self._sweep()
+
+    def post(self):
+        self._sweep()
+
+    def _sweep(self):
+        try:
+            websafe_cursor = self.request.get('cursor')
+            cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+
+            result = model.expiry.sweep_expired(
+                cursor=cursor,
+                budget=throttle.WriteBudget(model.expiry.GC_WRITE_BUDGET),
+                deadline=time.time() + self.TIME_SLICE)
+
+            if result.cursor:
+                taskqueue.add(url=self.request.path, params={'cursor': result.cursor.urlsafe()})
+            logging.info("swept %d expired short urls (more: %s)" % (result.deleted, bool(result.cursor)))
+
+            self.response.set_status(httplib.OK)
+            self.response.write(json.dumps({'deleted': result.deleted, 'more': bool(result.cursor)}))
+            self.response.headers.add_header('Content-Type', 'application/json')
+        except StandardError as e:
+            handler.write_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
+
+
+class RewriteEntities(webapp2.RequestHandler):
+    """
+    Rewrites all entities of a kind, e.g. to drop the index entries of properties which are no
+    longer indexed.  Continues itself through the task queue, as does SweepExpired.
+    """
+
+    TIME_SLICE = 30
+    """int: seconds of rewriting per request, well within the request deadline"""
+
+    def get(self, kind):
+        self._rewrite(kind)
+
+    def post(self, kind):
+        self._rewrite(kind)
+
+    def _rewrite(self, kind):
+        model_class = model.migration.KINDS.get(kind)
+        if not model_class:
+            handler.write_error(self.response, httplib.NOT_FOUND, "no such kind (%s)" % kind)
+            return
+
+        try:
+            websafe_cursor = self.request.get('cursor')
+            cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+
+            result = model.migration.rewrite_entities(
+                model_class,
+                cursor=cursor,
+                budget=throttle.WriteBudget(model.expiry.GC_WRITE_BUDGET),
+                deadline=time.time() + self.TIME_SLICE)
+
+            if result.cursor:
+                taskqueue.add(url=self.request.path, params={'cursor': result.cursor.urlsafe()})
+            logging.info("rewrote %d %s entities (more: %s)" % (result.rewritten, kind, bool(result.cursor)))
+
+            self.response.set_status(httplib.OK)
+            self.response.write(json.dumps({'rewritten': result.rewritten, 'more': bool(result.cursor)}))
+            self.response.headers.add_header('Content-Type', 'application/json')
         except StandardError as e:
             handler.write_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
+
+
+class TopLinks(webapp2.RequestHandler):
+    """
+    Reports the short urls which receive the most redirect requests on this instance.
+    Counts are estimates which decay over time; they are not totals.
+    """
+
+    def get(self):
+        hot_links = RedirectUrl.hot_links
+        top = [{'short_id': model.short_id.encode(kid),
+                'count': count,
+                'pinned': hot_links.is_pinned(kid)} for kid, count in hot_links.tracker.top()]
+
+        self.response.set_status(httplib.OK)
+        self.response.write(json.dumps({'top': top}))
+        self.response.headers.add_header('Content-Type', 'application/json')
+
+
+class Profiles(webapp2.RequestHandler):
+    """
+    Reports request profiles as folded stacks, one line per distinct stack with its number of
+    samples, e.g. for flamegraph.pl.
+
+    ?id=<request id> reports the profile of one request, as named by the X-Profile-Id header of its
+    response, from memcache, whichever instance served it.  Otherwise, the profiles retained by the
+    instance which serves this request are aggregated, and ?route=RedirectUrl restricts them to those
+    of one route; that instance is named by X-Profile-Instance.
+    """
+
+    def get(self):
+        request_id = self.request.get('id')
+        if request_id:
+            folded = memcache.get(Profiled.PROFILE_KEY % request_id)
+            if folded is None:
+                handler.write_error(self.response, httplib.NOT_FOUND, 'no profile of request %s' % request_id)
+                return
+            self.response.set_status(httplib.OK)
+            self.response.headers.add_header('Content-Type', 'text/plain')
+            self.response.write(folded)
+            return
+
+        profiler = Profiled.profiler
+        route = self.request.get('route') or None
+        self.response.set_status(httplib.OK)
+        self.response.headers.add_header('Content-Type', 'text/plain')
+        self.response.headers.add_header('X-Profile-Count', str(len(profiler.profiles(route))))
+        self.response.headers.add_header('X-Profile-Instance', os.environ.get('INSTANCE_ID', ''))
+        self.response.write(profiler.folded(route))
+
+
+class PersistPending(webapp2.RequestHandler):
+    """
+    Persists short urls created write-behind, in batches.  Invoked by tasks queued as short urls
+    are created, and by cron, which retries any that failed.  Continues itself through the task
+    queue, as does SweepExpired.
+    """
+
+    TIME_SLICE = 30
+    """int: seconds of persisting per request, well within the request deadline"""
+
+    def get(self):
+        self._persist()
+
+    def post(self):
+        self._persist()
+
+    def _persist(self):
+        try:
+            result = write_behind.FlushResult(0, 0, 0, False)
+            if WRITE_BEHIND:
+                result = WRITE_BEHIND.flush(deadline=time.time() + self.TIME_SLICE)
+            if result.more:
+                taskqueue.add(url=self.request.path)
+            logging.info("persisted %d pending short urls (failed %d, abandoned %d, more: %s)",
+                         result.persisted, result.failed, result.abandoned, result.more)
+
+            self.response.set_status(httplib.OK)
+            self.response.write(json.dumps(result._asdict()))
+            self.response.headers.add_header('Content-Type', 'application/json')
+        except StandardError as e:
+            handler.write_and_log_error(self.response, httplib.INTERNAL_SERVER_ERROR, e.message)
+
+
+class FlushAccessLog(webapp2.RequestHandler):
+    """
+    Flushes the access log buffer of the instance which serves the request.  Invoked by cron, so
+    that records buffered by an instance which has stopped receiving traffic are still written;
+    requests flush a buffer which is due themselves, unless a background flusher runs.
+    """
+
+    def get(self):
+        flushed = ACCESS_LOG.flush()
+        logging.info("flushed %d access records (dropped %d)", flushed, ACCESS_LOG.dropped)
+        self.response.set_status(httplib.OK)
+        self.response.write(json.dumps({'flushed': flushed, 'dropped': ACCESS_LOG.dropped}))
+        self.response.headers.add_header('Content-Type', 'application/json')
+
+
+class WriteBehindStats(webapp2.RequestHandler):
+    """
+    Reports the depth of the queue of short urls created write-behind, the age of the oldest, and
+    the persistence lag observed by this instance.
+    """
+
+    def get(self):
+        stats = WRITE_BEHIND.stats() if WRITE_BEHIND else {}
+        stats['enabled'] = bool(WRITE_BEHIND)
+        self.response.set_status(httplib.OK)
+        self.response.write(json.dumps(stats))
+        self.response.headers.add_header('Content-Type', 'application/json')
+
+
+class BreakerStats(webapp2.RequestHandler):
+    """
+    Reports the state of the circuit breaker which guards the datastore lookups of redirects on this
+    instance, and the share of those lookups which were served from stale copies.
+
+    Each instance has a breaker of its own, and this reports only that of the instance which serves
+    the request, which may be any; the counts are not aggregated across instances.  During an
+    outage, expect instances to disagree, and sample several (or read the breaker's warnings in the
+    logs) rather than trust one report.
+    """
+
+    def get(self):
+        stats = RedirectUrl.breaker.stats()
+        snapshot = RedirectUrl.snapshot
+        stats['snapshot'] = {'path': snapshot.path, 'bytes': snapshot.size, 'exported': snapshot.exported}
+        self.response.set_status(httplib.OK)
+        self.response.write(json.dumps(stats))
+        self.response.headers.add_header('Content-Type', 'application/json')
@@ -0,0 +1,53 @@
+"""
+Per-instance table of the short urls which currently receive the most redirect traffic.  Entries
+are pinned for as long as their short url remains a heavy hitter, so a burst of one-off requests
+(e.g. a crawler sweep) cannot displace them, as it would in a cache evicted by recency.
+"""
+
+import threading
+
+from gapplib import sketch
+
+HOT_LINK_COUNT = 64
+"""int: maximum number of short urls pinned per instance"""
+
+
+class HotLinks(object):
+    """
+    Pins resolved short urls whose kids the heavy hitter tracker currently ranks among its top k.
+    Memory is fixed: the tracker is a sketch of constant size and the table holds at most k entities.
+    """
+
+    def __init__(self, k=HOT_LINK_COUNT, **tracker_args):
+        self.tracker = sketch.HeavyHitters(k, **tracker_args)
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    def get(self, kid):
+        """
+        Records a redirect request for a kid.
+
+        Returns:
+            model.ShortUrl: the pinned short url, if any
+        """
+        displaced = self.tracker.add(kid)
+        if displaced is not None:
+            with self._lock:
+                self._pinned.pop(displaced, None)
+        return self._pinned.get(kid)
+
+    def offer(self, kid, short_url):
+        """
+        Pins a short url which was resolved from the datastore if its kid is a heavy hitter.
+        """
+        if kid in self.tracker:
+            with self._lock:
+                if kid in self.tracker:
+                    self._pinned[kid] = short_url
+
+    def is_pinned(self, kid):
+        return kid in self._pinned
+
+
+HOT_LINKS = HotLinks()
+"""HotLinks: the table of the current instance"""
@@ -1,5 +1,7 @@
-
 import short_id
+import expiry
+import export
+import migration
+import pending
 
 from url import ShortUrl, MAX_URL_LENGTH
-
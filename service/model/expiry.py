@@ -0,0 +1,95 @@
+"""
+Garbage collection of short urls whose expiry has elapsed.  Expired short urls are discovered with
+keys-only queries, one bounded page at a time, so that a sweep may be suspended at any page
+boundary and resumed later from a cursor.
+"""
+
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from google.appengine.ext import ndb
+
+from model_error import DestinationUrlError
+from url import ShortUrl
+
+GC_BATCH_SIZE = int(os.getenv('GC_BATCH_SIZE', '100'))
+"""int: number of expired short urls examined per page of the sweep"""
+
+GC_WRITE_BUDGET = float(os.getenv('GC_WRITE_BUDGET', '50'))
+"""float: datastore deletes per second which a sweep may issue"""
+
+SweepResult = namedtuple('SweepResult', ['deleted', 'cursor'])
+"""
+deleted (int): number of short urls deleted
+cursor (datastore_query.Cursor): position from which to resume the sweep. None if the sweep completed.
+"""
+
+
+def _doomed_keys(short_urls, now):
+    """
+    Determines the keys which must be deleted for a page of short urls.  A destination url is
+    deleted only if it still refers to the short url being deleted: the destination may have
+    been re-assigned to a new short url after the old one expired.
+
+    Returns:
+        (int, list): the number of short urls to be deleted and the keys of all entities to be deleted
+    """
+    # an idle short url may have been accessed after the index scan which produced its key
+    expired = [s for s in short_urls if s and s.is_expired(now)]
+
+    dest_keys = []
+    for s in expired:
+        try:
+            dest_keys.append(s.destination_key())
+        except DestinationUrlError as e:
+            logging.warning("kid %d: destination of expired short url not derivable: %s" % (s.key.id(), e.message))
+            dest_keys.append(None)
+
+    dests = ndb.get_multi([k for k in dest_keys if k])
+    dest_by_key = dict((d.key, d) for d in dests if d)
+
+    doomed = []
+    for s, dk in zip(expired, dest_keys):
+        doomed.append(s.key)
+        dest = dest_by_key.get(dk)
+        if dest and dest.short_key == s.key:
+            doomed.append(dk)
+
+    return len(expired), doomed
+
+
+def sweep_expired(now=None, batch_size=GC_BATCH_SIZE, cursor=None, budget=None, deadline=None):
+    """
+    Deletes expired short urls along with the destination urls which map to them.
+
+    Args:
+        now (datetime): the (utc) time against which expiry is evaluated
+        batch_size (int): number of keys fetched per page
+        cursor (datastore_query.Cursor): position from which to resume a previous sweep
+        budget (gapplib.throttle.WriteBudget): meters the deletes. unmetered if None.
+        deadline (float): time (per time.time) after which no further page is started
+
+    Returns:
+        SweepResult:
+    """
+    now = now or datetime.utcnow()
+    query = ShortUrl.query(ShortUrl.expires < now)
+
+    deleted = 0
+    while True:
+        keys, cursor, more = query.fetch_page(batch_size, start_cursor=cursor, keys_only=True)
+        if keys:
+            count, doomed = _doomed_keys(ndb.get_multi(keys), now)
+            if doomed:
+                if budget:
+                    budget.consume(len(doomed))
+                ndb.delete_multi(doomed)
+            deleted += count
+
+        if not (more and cursor):
+            return SweepResult(deleted, None)
+        if deadline is not None and time.time() >= deadline:
+            return SweepResult(deleted, cursor)
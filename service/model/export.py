@@ -0,0 +1,41 @@
+"""
+Export of the short urls of the datastore, in the form of a snapshot (see service/snapshot.py).
+"""
+
+import calendar
+from datetime import datetime
+
+from google.appengine.ext import ndb
+
+from url import ShortUrl
+
+EXPORT_BATCH_SIZE = 500
+"""int: short urls fetched per page"""
+
+
+def snapshot_items(now=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Pages through every short url, in ascending order of kid, as a snapshot is written.  Short urls
+    which have expired are skipped; one with an idle expiry is exported with the expiry last
+    recorded, so that a snapshot never outlives it.
+
+    Args:
+        now (datetime): the (utc) time against which expiry is evaluated
+        batch_size (int): number of short urls fetched per page
+
+    Yields:
+        (int, int, str): kid, expires (seconds since the epoch, or 0 for never) and destination url,
+            as written by snapshot.write
+    """
+    now = now or datetime.utcnow()
+    query = ShortUrl.query().order(ShortUrl.key)
+    cursor = None
+    more = True
+    while more:
+        short_urls, cursor, more = query.fetch_page(batch_size, start_cursor=cursor)
+        for short_url in short_urls:
+            if short_url.is_expired(now):
+                continue
+            expires = calendar.timegm(short_url.expires.utctimetuple()) if short_url.expires else 0
+            yield short_url.key.id(), expires, short_url.url
+        more = more and cursor
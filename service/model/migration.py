@@ -0,0 +1,83 @@
+"""
+Rewrites every entity of a kind, so that stored entities conform to the current model definition.
+Among other things, this drops the index entries of properties which have been made unindexed (the
+datastore removes an index entry only when the entity is next written), and re-stores urls in the
+current encoding of url_codec.
+
+The entities of a page are read and written in one transaction per entity group, so that a rewrite
+cannot undo a write made since its page was read (e.g. the refreshed expiry of ShortUrl.touch, or
+the reassignment of a destination url).  Each ShortUrl is a group of its own, whereas
+DestinationUrls share the group of their UrlScheme root; concurrent transactions on one group would
+collide and retry, so the entities of a group are rewritten together.
+"""
+
+import time
+from collections import namedtuple
+
+from google.appengine.ext import ndb
+
+from url import DestinationUrl, ShortUrl
+
+MIGRATION_BATCH_SIZE = 100
+"""int: entities rewritten per page"""
+
+KINDS = dict((model._get_kind(), model) for model in (ShortUrl, DestinationUrl))
+"""dict: models whose entities may be rewritten, keyed by kind"""
+
+RewriteResult = namedtuple('RewriteResult', ['rewritten', 'cursor'])
+"""
+rewritten (int): number of entities rewritten
+cursor (datastore_query.Cursor): position from which to resume. None if the rewrite completed.
+"""
+
+
+@ndb.tasklet
+def _rewrite_async(keys):
+    """
+    Args:
+        keys (list): keys of one entity group
+
+    Returns:
+        ndb.Future: number of entities rewritten; those which no longer exist are not
+    """
+    entities = [entity for entity in (yield ndb.get_multi_async(keys)) if entity is not None]
+    for entity in entities:
+        # ndb writes a property which has not been read in the form in which it was stored;
+        # reading every property converts it, so that the put writes it in the current form
+        entity._to_dict()
+    yield ndb.put_multi_async(entities)
+    raise ndb.Return(len(entities))
+
+
+def rewrite_entities(model, batch_size=MIGRATION_BATCH_SIZE, cursor=None, budget=None, deadline=None):
+    """
+    Args:
+        model (class): subclass of ndb.Model whose entities are rewritten
+        batch_size (int): number of entities fetched per page
+        cursor (datastore_query.Cursor): position from which to resume a previous rewrite
+        budget (gapplib.throttle.WriteBudget): meters the writes. unmetered if None.
+        deadline (float): time (per time.time) after which no further page is started
+
+    Returns:
+        RewriteResult:
+    """
+    # not model.query(): DestinationUrl has a property of that name
+    query = ndb.Query(kind=model._get_kind())
+
+    rewritten = 0
+    while True:
+        keys, cursor, more = query.fetch_page(batch_size, start_cursor=cursor, keys_only=True)
+        if keys:
+            if budget:
+                budget.consume(len(keys))
+            groups = {}
+            for key in keys:
+                groups.setdefault(key.root(), []).append(key)
+            futures = [ndb.transaction_async(lambda group=group: _rewrite_async(group))
+                       for group in groups.itervalues()]
+            rewritten += sum(future.get_result() for future in futures)
+
+        if not (more and cursor):
+            return RewriteResult(rewritten, None)
+        if deadline is not None and time.time() >= deadline:
+            return RewriteResult(rewritten, cursor)
@@ -52,6 +52,7 @@ class DecodeError(ModelError):
     INVALID_REPEAT_COUNT_NUMERAL = -5
     REPEAT_OVERFLOWS = -6
     OVERFLOW = -7
+    NOT_A_KEY_ID = -8
 
     ERROR_REASONS = {
         ID_TOO_LONG: "id length exceeds maximum",
@@ -60,7 +61,8 @@ class DecodeError(ModelError):
         INVALID_REPEATED_NUMERAL: 'the digit specified to be repeated is not a numeral',
         INVALID_REPEAT_COUNT_NUMERAL: 'the repeat count is not a numeral',
         REPEAT_OVERFLOWS: 'repeat sequence would result in number greater than MAX_ID',
-        OVERFLOW: 'decoded id is greater than MAX_ID (too many bits or value)'
+        OVERFLOW: 'decoded id is greater than MAX_ID (too many bits or value)',
+        NOT_A_KEY_ID: 'decoded id is not a datastore key id (1 to 2^63 - 1)'
     }
 
 class DestinationUrlError(ModelError):
@@ -83,3 +85,20 @@ class DestinationUrlError(ModelError):
         LOCALHOST_NOT_ALLOWED: "redirection to localhost is not allowed",
         RECURSIVE_REDIRECTION_ALLOWED: "recursive redirection to shorturl service is not allowed.",
     }
+
+class ExpiryError(ModelError):
+    """
+    Indicates that the expiry requested for a short url cannot be honored.
+    """
+
+    INVALID_EXPIRY = -1
+    EXPIRY_IN_PAST = -2
+    CONFLICTING_EXPIRY = -3
+    EXPIRY_TOO_DISTANT = -4
+
+    ERROR_REASONS = {
+        INVALID_EXPIRY: "expiry must be a positive number of seconds",
+        EXPIRY_IN_PAST: "absolute expiry precedes the current time",
+        CONFLICTING_EXPIRY: "specify either an absolute expiry or an idle expiry, not both",
+        EXPIRY_TOO_DISTANT: "expiry must be within 100 years",
+    }
@@ -0,0 +1,72 @@
+"""
+Validation and normalization of destination urls.  Independent of the datastore, so that the same
+rules apply wherever the service runs.
+"""
+
+from collections import namedtuple
+import urlparse
+
+from model_error import DestinationUrlError
+
+MAX_URL_LENGTH = 3000
+
+DEFAULT_URL_SCHEME = 'http'
+
+ALLOWED_SCHEMES = {'http', 'https', 'ftp', 'ftps', 'mailto', 'mms', 'rtmp', 'rtmpt', 'ed2k', 'pop', 'imap', 'nntp',
+                   'news', 'ldap', 'gopher', 'dict', 'dns'}
+
+LOCALHOSTS = {'localhost', '127.0.0.1'}
+
+NormalizedUrl = namedtuple('NormalizedUrl', ['scheme', 'netloc', 'path', 'query'])
+
+def normalize_dest_url(val, service_hostname):
+    """
+    Coerces url to standard allowable form, stripping fragment and rejecting certain conditions
+    which are not allowed due to such things as ambiguous destinations or security considerations.
+
+    Validates/Coerces a proposed url based upon the constraints of model which are:
+
+       Scheme:
+          If url has not scheme, it is assigned 'http'. Certain scehes are not allowed. In particular, data:
+          and javascript:.
+
+       Host:
+          references to local machine are not allowed in production mode. Thus the model will
+          disallow 'localhost', '127.0.0.1'. Relative urls (i.e. empty host) are also not allowed.
+
+    Args:
+        val (str): the url
+        service_hostname (str): host of the shortening service itself, to which redirection is disallowed
+
+    Returns:
+        NormalizedUrl
+
+    Raises:
+        ModelConstraintError if and constraints regarding destination urls are violated
+    """
+
+    if len(val) > MAX_URL_LENGTH:
+        raise DestinationUrlError(DestinationUrlError.URL_TOO_LONG)
+
+    original = urlparse.urlsplit(val)
+    if not original.netloc:
+        if val.startswith(original.scheme):
+            raise DestinationUrlError(DestinationUrlError.RELATIVE_URL_NOT_ALLOWED)
+        else:
+            raise DestinationUrlError(DestinationUrlError.HOST_OMITTED)
+
+    if not original.hostname or original.hostname in LOCALHOSTS:
+        raise DestinationUrlError(DestinationUrlError.LOCALHOST_NOT_ALLOWED)
+    elif service_hostname and -1 != original.hostname.find(service_hostname):
+        raise DestinationUrlError(DestinationUrlError.RECURSIVE_REDIRECTION_ALLOWED)
+
+    if original.scheme:
+        if original.scheme not in ALLOWED_SCHEMES:
+            raise DestinationUrlError(DestinationUrlError.SCHEME_NOT_ALLOWED, original.scheme)
+    coerced_scheme = original.scheme if original.scheme else DEFAULT_URL_SCHEME
+
+    return NormalizedUrl(
+        scheme=coerced_scheme,
+        netloc=original.netloc,
+        path=original.path,
+        query=original.query)
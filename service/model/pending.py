@@ -0,0 +1,59 @@
+"""
+Persistence of short urls created write-behind (see service/write_behind.py): kids are reserved in
+ranges ahead of use, and queued mappings are written in batches.
+"""
+
+from datetime import datetime
+
+from google.appengine.ext import ndb
+
+from url import DestinationUrl, ShortUrl
+
+
+def reserve_kids(size):
+    """
+    Reserves kids which the datastore will never assign automatically.
+
+    Returns:
+        (int, int): first and last kid of the range
+    """
+    return ShortUrl.allocate_ids(size=size)
+
+
+def _from_timestamp(t):
+    return datetime.utcfromtimestamp(t) if t is not None else None
+
+
+def persist(pendings):
+    """
+    Writes the short urls of a batch of pending mappings, with one put_multi.  A destination url
+    is (re)assigned to a pending short url unless it refers to another short url which is still
+    live; the pending short url is written regardless, since its short id has been issued.
+    Writing a batch again is harmless.
+
+    Args:
+        pendings (list): write_behind.PendingUrl
+    """
+    short_urls = [ShortUrl(id=p.kid,
+                           url=p.url,
+                           date=_from_timestamp(p.created),
+                           expires=_from_timestamp(p.expires),
+                           idle_ttl=p.idle_ttl) for p in pendings]
+
+    dest_keys = [DestinationUrl.construct(p.url).key for p in pendings]
+    dests = dict((dest.key, dest) for dest in ndb.get_multi(dest_keys) if dest)
+    assigned_keys = list(set(dest.short_key for dest in dests.itervalues() if dest.short_key))
+    live = set(short_url.key for short_url in ndb.get_multi(assigned_keys)
+               if short_url and not short_url.is_expired())
+
+    writes = list(short_urls)
+    for short_url, dest_key in zip(short_urls, dest_keys):
+        dest = dests.get(dest_key)
+        if dest and dest.short_key and (dest.short_key == short_url.key or dest.short_key in live):
+            continue
+        dest = dests[dest_key] = DestinationUrl(key=dest_key, short_key=short_url.key)
+        # a later mapping of the batch to the same destination defers to this one
+        live.add(short_url.key)
+        writes.append(dest)
+
+    ndb.put_multi(writes)
@@ -115,6 +115,32 @@ MAX_ID_BITS = DATASTORE_BITS - 1
 # value with all bits == 1
 MAX_ID = 2 ** MAX_ID_BITS - 1
 
+# compression of repeats only ever shortens an encoding
+MAX_ENCODED_LENGTH = (MAX_ID_BITS + BITS_PER_NUMERAL - 1) / BITS_PER_NUMERAL
+"""int: number of numerals in the longest encoded id"""
+
+MAX_KEY_ID = 2 ** 63 - 1
+"""int: the largest integer id of a datastore key"""
+
+ENCODED_RE = re.compile(r'[0-9A-Za-z_%s-]*\Z' % REPEAT_ESCAPE)
+"""regex which matches a string composed only of numerals and repeat escapes"""
+
+def validate_form(s):
+    """
+    Inexpensively rejects a string which cannot be an encoded id, without decoding it.  A string
+    which passes may still fail to decode.
+
+    Args:
+        s (str): a purported encoded id
+
+    Raises:
+        model_error.DecodeError:
+    """
+    if len(s) > MAX_ENCODED_LENGTH:
+        raise DecodeError(DecodeError.ID_TOO_LONG, "max %d" % MAX_ENCODED_LENGTH)
+    if not ENCODED_RE.match(s):
+        raise DecodeError(DecodeError.INVALID_NUMERAL)
+
 def decode(s):
     """
     Produces the corresponding integer id from an encoded string.  .
@@ -176,3 +202,22 @@ def decode(s):
 
     return kid
 
+
+def decode_key_id(s):
+    """
+    Decodes a short id which is to name a datastore entity.
+
+    Args:
+        s (str): a purported encoded id
+
+    Returns:
+        int: the key id
+
+    Raises:
+        model_error.DecodeError: if s is malformed, or decodes to an id which no key may have
+    """
+    validate_form(s)
+    kid = decode(s)
+    if not 0 < kid <= MAX_KEY_ID:
+        raise DecodeError(DecodeError.NOT_A_KEY_ID, s)
+    return kid
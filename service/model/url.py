@@ -1,31 +1,33 @@
-from collections import namedtuple
+from datetime import datetime, timedelta
 from itertools import chain
 import urlparse
 
 from google.appengine.ext import ndb
 from google.appengine.api.app_identity import app_identity
 
-from model_error import DestinationUrlError
+import normalize
+import url_codec
+from model_error import ExpiryError
+from normalize import MAX_URL_LENGTH, NormalizedUrl
 
-MAX_URL_LENGTH = 3000
-
-DEFAULT_URL_SCHEME = 'http'
 DEFAULT_PATH = '/'
 DEFAULT_QUERY = '?'
 
-ALLOWED_SCHEMES = {'http', 'https', 'ftp', 'ftps', 'mailto', 'mms', 'rtmp', 'rtmpt', 'ed2k', 'pop', 'imap', 'nntp',
-                   'news', 'ldap', 'gopher', 'dict', 'dns'}
-
-LOCALHOSTS = {'localhost', '127.0.0.1'}
+MAX_EXPIRY = timedelta(days=100 * 365)
+"""timedelta: furthest an expiry may lie in the future"""
 
-NormalizedUrl = namedtuple('NormalizedUrl', ['scheme', 'netloc', 'path', 'query'])
+IDLE_REFRESH_FRACTION = 0.25
+"""float: portion of an idle expiry window which must elapse before an access pushes the expiry out again.
+refreshing upon every redirect would cost a datastore write per click."""
 
 class DestinationUrl(ndb.Model):
     """
     Model for reprensenting a destination url and its relationship to its short url
     """
-    query = ndb.StringProperty(indexed=True)
-    short_key = ndb.KeyProperty(kind='ShortUrl')
+    # destination urls are only ever retrieved by key; neither property is queried.
+    # (see benchmarks/write_profile.py, which reports the properties that queries use)
+    query = ndb.StringProperty(indexed=False)
+    short_key = ndb.KeyProperty(kind='ShortUrl', indexed=False)
 
     @classmethod
     def construct_parent_key(cls, url):
@@ -88,54 +90,19 @@ class DestinationUrl(ndb.Model):
     @classmethod
     def normalize_dest_url(cls, val):
         """
-        Coerces url to standard allowable form, stripping fragment and rejecting certain conditions
-        which are not allowed due to such things as ambiguous destinations or security considerations.
-
-        Validates/Coerces a proposed url based upon the constraints of model which are:
-
-           Scheme:
-              If url has not scheme, it is assigned 'http'. Certain scehes are not allowed. In particular, data:
-              and javascript:.
-
-           Host:
-              references to local machine are not allowed in production mode. Thus the model will
-              disallow 'localhost', '127.0.0.1'. Relative urls (i.e. empty host) are also not allowed.
+        Coerces url to standard allowable form.  See module, normalize.
+        The host of this application is the service host to which redirection is disallowed.
 
         Args:
             val:
 
         Returns:
-            urlparse.SplitResult
+            NormalizedUrl
 
         Raises:
             ModelConstraintError if and constraints regarding destination urls are violated
         """
-
-        if len(val) > MAX_URL_LENGTH:
-            raise DestinationUrlError(DestinationUrlError.URL_TOO_LONG)
-
-        original = urlparse.urlsplit(val)
-        if not original.netloc:
-            if val.startswith(original.scheme):
-                raise DestinationUrlError(DestinationUrlError.RELATIVE_URL_NOT_ALLOWED)
-            else:
-                raise DestinationUrlError(DestinationUrlError.HOST_OMITTED)
-
-        if not original.hostname or original.hostname in LOCALHOSTS:
-            raise DestinationUrlError(DestinationUrlError.LOCALHOST_NOT_ALLOWED)
-        elif -1 != original.hostname.find(app_identity.get_default_version_hostname()):
-            raise DestinationUrlError(DestinationUrlError.RECURSIVE_REDIRECTION_ALLOWED)
-
-        if original.scheme:
-            if original.scheme not in ALLOWED_SCHEMES:
-                raise DestinationUrlError(DestinationUrlError.SCHEME_NOT_ALLOWED, original.scheme)
-        coerced_scheme = original.scheme if original.scheme else DEFAULT_URL_SCHEME
-
-        return NormalizedUrl(
-            scheme=coerced_scheme,
-            netloc=original.netloc,
-            path=original.path,
-            query=original.query)
+        return normalize.normalize_dest_url(val, app_identity.get_default_version_hostname())
 
 
 def validate_dest_url(url_prop, val):
@@ -156,10 +123,96 @@ def validate_dest_url(url_prop, val):
     return urlparse.urlunsplit(chain(DestinationUrl.normalize_dest_url(val), (None,)))
 
 
+class CompressedUrlProperty(ndb.BlobProperty):
+    """
+    A url stored in the compact encoding of module, url_codec.  Values written before the encoding
+    was introduced are read unchanged.  ndb converts a stored value upon first access of the
+    property, so a url is decompressed only if it is actually read (e.g. when a redirect is issued).
+    """
+
+    def __init__(self, name=None, dictionary_id=url_codec.ENCODE_DICTIONARY_ID, **kwds):
+        super(CompressedUrlProperty, self).__init__(name, **kwds)
+        self._dictionary_id = dictionary_id
+
+    def _to_base_type(self, value):
+        return url_codec.encode(value, self._dictionary_id)
+
+    def _from_base_type(self, value):
+        return url_codec.decode(value)
+
+
 class ShortUrl(ndb.Model):
     """A main model for representing a url entry."""
-    short_id= ndb.StringProperty(indexed=True)
-    url = ndb.BlobProperty(indexed=False, validator=validate_dest_url)
-    date = ndb.DateTimeProperty(auto_now_add=True)
+    # only expires is queried (by the collection of expired short urls). every other index entry
+    # would cost two writes per put which nothing reads.
+    short_id= ndb.StringProperty(indexed=False)
+    url = CompressedUrlProperty(indexed=False, validator=validate_dest_url)
+    date = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+    # time after which the short url is no longer served and may be collected.
+    # for an idle expiry, this is the last (recorded) access plus idle_ttl.
+    expires = ndb.DateTimeProperty(indexed=True)
+    idle_ttl = ndb.IntegerProperty(indexed=False)
+
+    def set_expiry(self, expires=None, idle_ttl=None, now=None):
+        """
+        Assigns an optional expiry to the short url.  At most one of the two forms may be specified.
+
+        Args:
+            expires (datetime): absolute (utc) time after which the short url expires
+            idle_ttl (int): seconds without an access after which the short url expires
+            now (datetime): the current (utc) time. primarily for tests.
+
+        Raises:
+            ExpiryError: if the expiry is malformed, conflicting, already elapsed, or too distant
+        """
+        if expires is not None and idle_ttl is not None:
+            raise ExpiryError(ExpiryError.CONFLICTING_EXPIRY)
+
+        now = now or datetime.utcnow()
+        if expires is not None:
+            if expires <= now:
+                raise ExpiryError(ExpiryError.EXPIRY_IN_PAST, expires.isoformat())
+            if expires - now > MAX_EXPIRY:
+                raise ExpiryError(ExpiryError.EXPIRY_TOO_DISTANT, expires.isoformat())
+            self.expires = expires
+            self.idle_ttl = None
+        elif idle_ttl is not None:
+            if idle_ttl <= 0:
+                raise ExpiryError(ExpiryError.INVALID_EXPIRY, str(idle_ttl))
+            if idle_ttl > MAX_EXPIRY.days * 24 * 60 * 60:
+                raise ExpiryError(ExpiryError.EXPIRY_TOO_DISTANT, str(idle_ttl))
+            self.idle_ttl = int(idle_ttl)
+            self.expires = now + timedelta(seconds=self.idle_ttl)
+
+    def is_expired(self, now=None):
+        return self.expires is not None and self.expires <= (now or datetime.utcnow())
+
+    def touch(self, now=None):
+        """
+        Records an access of a short url which has an idle expiry.  The write is skipped unless
+        a significant portion of the idle window has elapsed since the last recorded access.
+
+        Returns:
+            ndb.Future: if the refreshed expiry is being written
+            None: if no write was necessary
+        """
+        if not self.idle_ttl or self.expires is None:
+            return None
+
+        now = now or datetime.utcnow()
+        refreshed = now + timedelta(seconds=self.idle_ttl)
+        if refreshed - self.expires < timedelta(seconds=self.idle_ttl * IDLE_REFRESH_FRACTION):
+            return None
+
+        self.expires = refreshed
+        return self.put_async()
+
+    def destination_key(self):
+        """
+        Returns:
+            ndb.Key: the key of the destination url which maps to this short url
+        """
+        return DestinationUrl.construct(self.url).key
 
 
@@ -0,0 +1,214 @@
+"""
+Compact storage encoding for destination urls.  An encoded url begins with a format version byte:
+
+    0x01  raw deflate of the url
+    0x02  raw deflate of the url, primed with a shared dictionary. the next byte identifies the dictionary.
+
+Any value whose first byte is not a control character is a url stored verbatim: either a row written
+before urls were compressed, or a url which compression would not have shortened.  (A normalized url
+always begins with its scheme.)
+
+A shared dictionary gives deflate something to refer back to on the very first occurrence of
+a common fragment (hosts, tracking parameters), which is where the savings lie for a string as
+short as a url.  The python 2 zlib module does not accept a preset dictionary, so the same effect is
+obtained by priming: the dictionary is compressed once, the compressor state is saved, and each url is
+compressed by a copy of that state.  Only the bytes which follow the dictionary are stored.
+
+Dictionaries are trained offline (see train_dictionary) from a sample of stored urls and appended
+to a dictionary file (see write_dictionary), which every instance loads at startup from the path
+in URL_CODEC_DICTIONARIES.  URL_CODEC_DICTIONARY_ID selects the dictionary with which urls are
+written; urls written with any dictionary in the file remain readable.
+"""
+
+import base64
+import logging
+import os
+import re
+import zlib
+from collections import Counter
+
+VERSION_DEFLATE = '\x01'
+VERSION_DEFLATE_DICTIONARY = '\x02'
+
+_WBITS = -zlib.MAX_WBITS
+_LEVEL = 9
+
+DEFAULT_DICTIONARY = (
+    'ftp://mailto:utm_term=utm_content=&gclid=&fbclid=&ref=&source=&id=&q=/index.html.php.aspx'
+    '.org/.net/.co.uk/.io/youtube.com/watch?v=amazon.com/dp/facebook.com/twitter.com/'
+    '&utm_campaign=&utm_medium=email&utm_medium=social&utm_medium=cpc'
+    '?utm_source=newsletter&utm_source=google&utm_source=facebook'
+    'http://www.https://www..com/'
+)
+"""str: fragments common to destination urls. the most common are placed last, nearest the data."""
+
+
+class _Dictionary(object):
+    """
+    Saved compressor and decompressor states, each primed with a dictionary.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._compressor = zlib.compressobj(_LEVEL, zlib.DEFLATED, _WBITS)
+        # a sync flush ends the primer on a byte boundary, so the bytes which follow stand alone
+        primer = self._compressor.compress(text) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        self._decompressor = zlib.decompressobj(_WBITS)
+        self._decompressor.decompress(primer)
+
+    def compress(self, data):
+        c = self._compressor.copy()
+        return c.compress(data) + c.flush()
+
+    def decompress(self, data):
+        d = self._decompressor.copy()
+        return d.decompress(data) + d.flush()
+
+
+_dictionaries = {}
+
+
+def register_dictionary(dictionary_id, text):
+    """
+    Makes a dictionary available for encoding and decoding.  A dictionary must never be altered
+    once urls have been encoded with it; a revised dictionary is registered under a new id.
+
+    Args:
+        dictionary_id (int): 1 - 255
+        text (str): the dictionary
+    """
+    if not 0 < dictionary_id < 256:
+        raise ValueError("dictionary id out of range (%d)" % dictionary_id)
+    _dictionaries[dictionary_id] = _Dictionary(text)
+
+
+def load_dictionaries(f):
+    """
+    Registers the dictionaries of a dictionary file: one per line, '<id> <base64 of text>'.  Blank
+    lines and lines beginning with # are skipped.  The file only ever grows, since a dictionary
+    is needed for as long as urls encoded with it are stored.
+
+    Args:
+        f (file): the dictionary file
+
+    Returns:
+        list: ids of the dictionaries registered
+
+    Raises:
+        ValueError: if a line is malformed, or would alter a registered dictionary
+    """
+    loaded = []
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        dictionary_id, _, encoded = line.partition(' ')
+        dictionary_id, text = int(dictionary_id), base64.b64decode(encoded)
+        if dictionary_id in _dictionaries and _dictionaries[dictionary_id].text != text:
+            raise ValueError("dictionary %d is already registered with other text" % dictionary_id)
+        register_dictionary(dictionary_id, text)
+        loaded.append(dictionary_id)
+    return loaded
+
+
+def write_dictionary(f, dictionary_id, text):
+    """
+    Appends a dictionary to a dictionary file, in the format read by load_dictionaries.
+    """
+    f.write('%d %s\n' % (dictionary_id, base64.b64encode(text)))
+
+
+DEFAULT_DICTIONARY_ID = 1
+register_dictionary(DEFAULT_DICTIONARY_ID, DEFAULT_DICTIONARY)
+
+URL_CODEC_DICTIONARIES = os.getenv('URL_CODEC_DICTIONARIES')
+"""str: path of the dictionary file. None if only the default dictionary is used."""
+
+if URL_CODEC_DICTIONARIES:
+    try:
+        with open(URL_CODEC_DICTIONARIES) as _f:
+            load_dictionaries(_f)
+    except (IOError, ValueError, TypeError):
+        # urls written with the missing dictionaries cannot be read; every other url still can
+        logging.exception('failed to load url dictionaries from %s', URL_CODEC_DICTIONARIES)
+
+ENCODE_DICTIONARY_ID = int(os.getenv('URL_CODEC_DICTIONARY_ID', str(DEFAULT_DICTIONARY_ID)))
+"""int: id of the dictionary with which urls are written"""
+
+if ENCODE_DICTIONARY_ID not in _dictionaries:
+    logging.warning('url dictionary %d is not registered; writing with %d', ENCODE_DICTIONARY_ID,
+                    DEFAULT_DICTIONARY_ID)
+    ENCODE_DICTIONARY_ID = DEFAULT_DICTIONARY_ID
+
+
+def encode(url, dictionary_id=DEFAULT_DICTIONARY_ID):
+    """
+    Args:
+        url (str): the url to be stored
+        dictionary_id (int): the shared dictionary with which to compress. None for none.
+
+    Returns:
+        str: the encoded url, or the url itself if encoding would not shorten it
+    """
+    if dictionary_id:
+        encoded = VERSION_DEFLATE_DICTIONARY + chr(dictionary_id) + _dictionaries[dictionary_id].compress(url)
+    else:
+        c = zlib.compressobj(_LEVEL, zlib.DEFLATED, _WBITS)
+        encoded = VERSION_DEFLATE + c.compress(url) + c.flush()
+
+    if len(encoded) < len(url) or (url and url[0] < ' '):
+        return encoded
+    return url
+
+
+def decode(value):
+    """
+    Inverse of encode.  Values stored before compression was introduced are returned unchanged.
+    """
+    if not value or value[0] >= ' ':
+        return value
+    elif value[0] == VERSION_DEFLATE_DICTIONARY:
+        dictionary = _dictionaries.get(ord(value[1]))
+        if dictionary is None:
+            raise ValueError("unknown url dictionary (%d)" % ord(value[1]))
+        return dictionary.decompress(value[2:])
+    elif value[0] == VERSION_DEFLATE:
+        return zlib.decompress(value[1:], _WBITS)
+    else:
+        raise ValueError("unknown url encoding version (%d)" % ord(value[0]))
+
+
+_FRAGMENT_RE = re.compile(r'[^/?&=.]+[/?&=.]?|[/?&=.]')
+
+
+def train_dictionary(urls, size=1024):
+    """
+    Builds a dictionary from a sample of urls: the fragments (delimited by / ? & = .) which would
+    save the most bytes, ordered so that the most valuable are last.
+
+    Args:
+        urls (iterable): sample of urls
+        size (int): maximum length of the dictionary
+
+    Returns:
+        str: dictionary suitable for register_dictionary
+    """
+    counts = Counter()
+    for url in urls:
+        counts.update(set(_FRAGMENT_RE.findall(url)))
+
+    ranked = sorted(
+        (f for f, n in counts.iteritems() if n > 1 and len(f) > 2),
+        key=lambda f: counts[f] * len(f),
+        reverse=True)
+
+    chosen = []
+    length = 0
+    for fragment in ranked:
+        if length + len(fragment) > size:
+            continue
+        chosen.append(fragment)
+        length += len(fragment)
+
+    return ''.join(reversed(chosen))
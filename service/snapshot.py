@@ -0,0 +1,139 @@
+"""
+A read-only snapshot of short urls, exported from the datastore and deployed with (or mounted beside)
+the application.  Redirects fall back to it while the datastore is unavailable: short urls are never
+re-pointed, so an older copy of a mapping is as good as the current one, unless it has since expired.
+
+A snapshot is a text file with one short url per line, in ascending order of kid:
+
+    <kid>\t<expires, seconds since the epoch, or 0>\t<destination url>
+
+export_snapshot.py writes one from the datastore of a deployed application (see model.export).
+A lookup is a binary search of the file, by seeking, so that the snapshot is neither loaded nor
+held in memory, however many short urls it has.
+"""
+
+import logging
+import os
+import threading
+import time
+
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH') or None
+"""str: path of the latest exported snapshot. None if there is none."""
+
+
+def write(items, f):
+    """
+    Args:
+        items (iterable): (kid, expires, url) of each short url, in ascending order of kid. expires
+            is 0 for never.
+        f (file): receives the snapshot
+
+    Raises:
+        ValueError: if the kids are not in ascending order
+    """
+    last = None
+    for kid, expires, url in items:
+        if last is not None and kid <= last:
+            raise ValueError("kid %d follows kid %d; a snapshot is in ascending order of kid" % (kid, last))
+        f.write('%d\t%d\t%s\n' % (kid, expires, url))
+        last = kid
+
+
+def _parse(line):
+    kid, expires, url = line.rstrip('\n').split('\t', 2)
+    return int(kid), int(expires), url
+
+
+def read(f):
+    """
+    Yields:
+        (int, int, str): kid, expires and url of each short url of the snapshot
+    """
+    for line in f:
+        yield _parse(line)
+
+
+def search(f, size, kid):
+    """
+    Finds the line of a kid in a snapshot file by binary search.
+
+    Args:
+        f (file): the snapshot, opened for reading
+        size (int): length of the file
+        kid (int):
+
+    Returns:
+        (int, str): expires and url of the short url. None if the snapshot has none.
+    """
+    # the line of kid, if any, starts within [low, high)
+    low, high = 0, size
+    while low < high:
+        middle = (low + high) // 2
+        # the first line which starts at or after middle
+        if middle > low:
+            f.seek(middle - 1)
+            f.readline()
+            start = f.tell()
+        else:
+            f.seek(low)
+            start = low
+        if start >= high:
+            high = middle
+            continue
+        line = f.readline()
+        found, expires, url = _parse(line)
+        if found == kid:
+            return expires, url
+        elif found < kid:
+            low = start + len(line)
+        else:
+            high = middle
+    return None
+
+
+class Snapshot(object):
+    """
+    Serves a snapshot file.  The file is opened upon the first lookup, and each lookup reads only
+    the lines of its binary search, so the snapshot costs an instance an open file rather than
+    memory, and its first fallback costs no more than the rest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.exported = None
+        self.size = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self._file = open(self.path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.exported = os.path.getmtime(self.path)
+        logging.info("opened snapshot %s: %d bytes", self.path, self.size)
+
+    def get(self, kid, now=None):
+        """
+        Returns:
+            str: the destination url of the short url, unless it is not in the snapshot or has expired
+        """
+        if self.path is None:
+            return None
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                found = search(self._file, self.size, kid)
+            except (IOError, ValueError):
+                logging.exception("snapshot %s could not be read", self.path)
+                self.path = None
+                return None
+        if found is None:
+            return None
+        expires, url = found
+        if expires and expires <= (now or time.time()):
+            return None
+        return url
+
+
+SNAPSHOT = Snapshot(SNAPSHOT_PATH)
+"""Snapshot: the latest exported snapshot"""
@@ -0,0 +1,15 @@
+"""
+Serves the shortening service outside of App Engine, from a single-threaded event loop.
+
+The model package requires the appengine sdk; the modules of the model which do not (the short id
+codec, url normalization, and the url codec) are imported directly, as is gapplib.
+"""
+
+import os
+import sys
+
+_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for _path in (os.path.join(_SERVICE_DIR, 'lib'), os.path.join(_SERVICE_DIR, 'model')):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
@@ -0,0 +1,35 @@
+"""
+Usage: python -m service.standalone [options]
+"""
+
+import optparse
+
+from service.standalone.server import IDLE_TIMEOUT, HttpServer, Loop, ShortUrlService
+from service.standalone.shards import ShardedBackend
+from service.standalone.storage import MemoryBackend
+
+
+def main(port, host_url, ui_url, shards, kids_per_shard, idle_timeout):
+    loop = Loop(idle_timeout=idle_timeout)
+    if shards > 1:
+        backend = ShardedBackend.create(loop, shards, kids_per_shard)
+    else:
+        backend = MemoryBackend(loop)
+    service = ShortUrlService(backend, host_url or 'http://localhost:%d' % port, ui_url=ui_url)
+    server = HttpServer(service, port=port)
+    print 'serving on port %d' % server.port
+    loop.run()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser('%prog [options]\nServes the shortening service from an event loop.')
+    parser.add_option('--port', type='int', default=8080)
+    parser.add_option('--host-url', help='scheme and host by which clients reach the service')
+    parser.add_option('--ui-url', help='destination of a request which names no short id')
+    parser.add_option('--shards', type='int', default=1, help='number of memory stores across which to partition')
+    parser.add_option('--kids-per-shard', type='int', default=2 ** 32, help='size of the kid range of each shard')
+    parser.add_option('--idle-timeout', type='float', default=IDLE_TIMEOUT,
+                      help='seconds after which an idle connection is closed')
+    options, args = parser.parse_args()
+    main(options.port, options.host_url, options.ui_url, options.shards, options.kids_per_shard,
+         options.idle_timeout)
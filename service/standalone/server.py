@@ -0,0 +1,418 @@
+"""
+An HTTP/1.1 server for the shortening service, built upon asyncore.  A single thread multiplexes
+every connection, so an idle keep-alive connection costs a socket and a small buffer rather than
+a thread; a request is parked while its storage operation is outstanding, and the thread moves on
+to other connections.
+
+Routes mirror app.yaml:
+
+    POST /shorturl          create (or find) the short url of a destination url
+    GET  /shorturl/<sid>    query the destination url of a short url
+    GET  /shorturl/?sid=..  query the destination urls of many short urls (or POST {"sids": [...]})
+    GET  /<sid>             redirect to the destination url of a short url
+"""
+
+import asynchat
+import asyncore
+import httplib
+import json
+import logging
+import socket
+import time
+import urllib
+import urlparse
+from collections import deque, namedtuple
+from itertools import chain
+
+import normalize
+import short_id
+from model_error import DecodeError, DestinationUrlError
+
+MAX_HEAD_LENGTH = 16 * 1024
+MAX_BODY_LENGTH = 64 * 1024
+MAX_RESOLVE_SIDS = 1000
+IDLE_TIMEOUT = 30.0
+"""float: seconds a connection may go without completing a request or sending a response"""
+
+Request = namedtuple('Request', ['method', 'path', 'headers', 'body'])
+
+WELL_KNOWN = {
+    'favicon.ico': (httplib.NO_CONTENT, ''),
+    'robots.txt': (httplib.OK, 'User-agent: *\nDisallow:\n'),
+}
+"""dict: (status, body) of paths which browsers and crawlers ask of any host"""
+
+
+class Loop(object):
+    """
+    Drives asyncore, runs callbacks scheduled by storage between polls, and closes idle connections.
+    """
+
+    def __init__(self, timeout=1.0, idle_timeout=IDLE_TIMEOUT):
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._ready = deque()
+        self._next_reap = time.time() + timeout
+
+    def call_soon(self, callback, *args):
+        self._ready.append((callback, args))
+
+    def run_once(self):
+        asyncore.loop(timeout=0 if self._ready else self.timeout, use_poll=True, count=1)
+        for _ in xrange(len(self._ready)):
+            callback, args = self._ready.popleft()
+            try:
+                callback(*args)
+            except Exception:
+                # one failed request must not stop the loop which serves every other
+                logging.exception('callback failed')
+
+        now = time.time()
+        if now >= self._next_reap:
+            self.reap_idle(now)
+            self._next_reap = now + self.timeout
+
+    def reap_idle(self, now):
+        """
+        Closes each connection which has been idle for longer than idle_timeout, so that clients
+        which open connections and then send nothing, or trickle a request a byte at a time, do not
+        hold sockets indefinitely.
+
+        Returns:
+            int: number of connections closed
+        """
+        idle = [connection for connection in asyncore.socket_map.values()
+                if isinstance(connection, HttpConnection) and connection.idle_for(now) > self.idle_timeout]
+        for connection in idle:
+            connection.close()
+        return len(idle)
+
+    def run(self):
+        while True:
+            self.run_once()
+
+
+class ShortUrlService(object):
+    """
+    Routes requests, and produces responses with the same content as the handlers of service.app.
+    """
+
+    def __init__(self, storage, host_url, service_hostname=None, ui_url=None):
+        """
+        Args:
+            storage: a non-blocking storage adapter (e.g. storage.MemoryBackend)
+            host_url (str): scheme and host by which clients reach the service, e.g. http://sho.rt
+            service_hostname (str): host to which redirection is disallowed. defaults to that of host_url.
+            ui_url (str): destination of a request which names no short id
+        """
+        self.storage = storage
+        self.host_url = host_url.rstrip('/')
+        self.service_hostname = service_hostname or urlparse.urlsplit(host_url).hostname
+        self.ui_url = ui_url
+
+    def handle(self, request, respond):
+        """
+        Args:
+            request (Request):
+            respond (callable): receives status, list of headers, and body. may be called later.
+        """
+        split = urlparse.urlsplit(request.path)
+        path = urllib.unquote(split.path)
+        if path == '/shorturl':
+            if request.method == 'POST':
+                self._shorten(request.body, respond)
+            else:
+                _text(respond, httplib.METHOD_NOT_ALLOWED, 'use POST to create a short url')
+        elif path == '/shorturl/' and request.method == 'POST':
+            try:
+                sids = json.loads(request.body).get('sids')
+                if not isinstance(sids, list) or not all(isinstance(sid, basestring) for sid in sids):
+                    raise ValueError("'sids' must be a list of short ids")
+            except (AttributeError, ValueError) as e:
+                _text(respond, httplib.BAD_REQUEST, e.message)
+            else:
+                self._resolve(sids, respond)
+        elif request.method not in ('GET', 'HEAD'):
+            _text(respond, httplib.METHOD_NOT_ALLOWED, '')
+        elif path == '/shorturl/':
+            self._resolve(urlparse.parse_qs(split.query).get('sid', []), respond)
+        elif path.startswith('/shorturl/'):
+            self._query(path[len('/shorturl/'):], respond)
+        else:
+            self._redirect(path[1:], respond)
+
+    def _decode(self, sid, respond):
+        try:
+            short_id.validate_form(sid)
+            return short_id.decode(sid)
+        except DecodeError as e:
+            _text(respond, httplib.BAD_REQUEST, e.message)
+            return None
+
+    def _redirect(self, sid, respond):
+        if not sid:
+            if self.ui_url:
+                respond(httplib.FOUND, [('Location', self.ui_url)], '')
+            else:
+                _text(respond, httplib.NOT_FOUND, 'no short url specified')
+        elif sid in WELL_KNOWN:
+            _text(respond, *WELL_KNOWN[sid])
+        else:
+            kid = self._decode(sid, respond)
+            if kid is not None:
+                def found(url):
+                    if url:
+                        respond(httplib.FOUND, [('Location', url)], '')
+                    else:
+                        _text(respond, httplib.NOT_FOUND, self._short_url(sid))
+                self.storage.get_url(kid, found)
+
+    def _query(self, sid, respond):
+        if not sid:
+            _text(respond, httplib.BAD_REQUEST, 'empty or missing reference to short url')
+            return
+
+        kid = self._decode(sid, respond)
+        if kid is not None:
+            def found(url):
+                if url:
+                    _json(respond, httplib.OK, {'url': url, 'short_url': self._short_url(sid)})
+                else:
+                    _text(respond, httplib.NOT_FOUND, "no corresponding short url: short id '%s'" % sid)
+            self.storage.get_url(kid, found)
+
+    def _resolve(self, sids, respond):
+        if not sids:
+            _text(respond, httplib.BAD_REQUEST, 'empty or missing reference to short url')
+            return
+        if len(sids) > MAX_RESOLVE_SIDS:
+            message = 'too many short ids (%d); at most %d may be resolved per request' % (len(sids), MAX_RESOLVE_SIDS)
+            _text(respond, httplib.REQUEST_ENTITY_TOO_LARGE, message)
+            return
+
+        sids = [sid.encode('utf-8') if isinstance(sid, unicode) else sid for sid in sids]
+        entries = {}
+        kids = {}
+        for sid in sids:
+            try:
+                short_id.validate_form(sid)
+                kids[sid] = short_id.decode(sid)
+            except DecodeError as e:
+                entries[sid] = {'status': httplib.BAD_REQUEST, 'message': e.message}
+
+        def found(urls):
+            for sid, kid in kids.iteritems():
+                url = urls.get(kid)
+                if url:
+                    entries[sid] = {'status': httplib.OK, 'url': url, 'short_url': self._short_url(sid)}
+                else:
+                    entries[sid] = {'status': httplib.NOT_FOUND}
+            # written in the order of the request
+            body = ', '.join('%s: %s' % (json.dumps(sid), json.dumps(entries[sid])) for sid in _unique(sids))
+            respond(httplib.OK, [('Content-Type', 'application/json')], '{%s}' % body)
+
+        self.storage.get_urls(set(kids.itervalues()), found)
+
+    def _shorten(self, body, respond):
+        try:
+            url = json.loads(body).get('url')
+            if not url:
+                _text(respond, httplib.BAD_REQUEST, 'empty url')
+                return
+            elif len(url) > normalize.MAX_URL_LENGTH:
+                message = 'url exceeds maximum allowed length (%d)' % normalize.MAX_URL_LENGTH
+                _text(respond, httplib.REQUEST_ENTITY_TOO_LARGE, message)
+                return
+
+            normal = normalize.normalize_dest_url(url.encode('utf-8'), self.service_hostname)
+        except (DestinationUrlError, ValueError, TypeError, AttributeError) as e:
+            _text(respond, httplib.BAD_REQUEST, e.message)
+            return
+
+        def created(kid):
+            if kid is None:
+                _text(respond, httplib.INSUFFICIENT_STORAGE, 'Failed to create short url')
+            else:
+                sid = short_id.encode(kid)
+                _json(respond, httplib.CREATED, {'short_id': sid}, [('Location', self._short_url(sid))])
+
+        self.storage.shorten(normal, urlparse.urlunsplit(chain(normal, (None,))), created)
+
+    def _short_url(self, sid):
+        return '%s/%s' % (self.host_url, sid)
+
+
+def _unique(items):
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+def _text(respond, code, message):
+    respond(code, [('Content-Type', 'text/plain')], message)
+
+
+def _json(respond, code, content, headers=()):
+    respond(code, [('Content-Type', 'application/json')] + list(headers), json.dumps(content))
+
+
+class HttpConnection(asynchat.async_chat):
+    """
+    One client connection.  Requests may be pipelined: each is dispatched as soon as it has been
+    read, and responses are written in the order of the requests, whichever completes first.
+
+    A connection is active when it completes reading a request or writes a response; bytes which
+    trickle in without completing a request do not count, and neither does time spent waiting for
+    storage to answer.
+    """
+
+    def __init__(self, sock, service, sock_map=None):
+        asynchat.async_chat.__init__(self, sock, sock_map)
+        self._service = service
+        self._incoming = []
+        self._incoming_length = 0
+        self._head = None
+        self._responses = deque()
+        self._closing = False
+        self._active = time.time()
+        self.set_terminator('\r\n\r\n')
+
+    def idle_for(self, now):
+        """
+        Returns:
+            float: seconds since the connection was last active; 0 while a response is outstanding.
+        """
+        if self._responses:
+            return 0.0
+        return now - self._active
+
+    def handle_write(self):
+        self._active = time.time()
+        asynchat.async_chat.handle_write(self)
+
+    def collect_incoming_data(self, data):
+        if self._closing:
+            return
+
+        self._incoming_length += len(data)
+        if self._head is None and self._incoming_length > MAX_HEAD_LENGTH:
+            self._reject(httplib.REQUEST_ENTITY_TOO_LARGE)
+        else:
+            self._incoming.append(data)
+
+    def found_terminator(self):
+        data = ''.join(self._incoming)
+        self._incoming = []
+        self._incoming_length = 0
+        if self._closing:
+            return
+
+        if self._head is None:
+            head = self._parse_head(data)
+            if head is None:
+                return
+            length = head[3]
+            if length:
+                self._head = head
+                self.set_terminator(length)
+                return
+            body = ''
+        else:
+            head, body = self._head, data
+            self._head = None
+            self.set_terminator('\r\n\r\n')
+
+        method, path, headers, _, keep_alive = head
+        self._active = time.time()
+        slot = [None]
+        self._responses.append(slot)
+        try:
+            self._service.handle(
+                Request(method, path, headers, body),
+                lambda code, response_headers, content: self._complete(
+                    slot, method, keep_alive, code, response_headers, content))
+        except Exception:
+            # answered in turn, so that the requests pipelined behind it are still served
+            logging.exception('request failed: %s %s', method, path)
+            if slot[0] is None:
+                self._complete(slot, method, keep_alive, httplib.INTERNAL_SERVER_ERROR,
+                               [('Content-Type', 'text/plain')], '')
+
+    def _parse_head(self, data):
+        """
+        Returns:
+            tuple: method, path, headers, content length, keep alive. None if the head is malformed.
+        """
+        try:
+            lines = data.lstrip('\r\n').split('\r\n')
+            method, path, version = lines[0].split(' ', 2)
+            headers = {}
+            for line in lines[1:]:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length < 0:
+                raise ValueError("negative content length")
+        except ValueError:
+            self._reject(httplib.BAD_REQUEST)
+            return None
+
+        if length > MAX_BODY_LENGTH:
+            self._reject(httplib.REQUEST_ENTITY_TOO_LARGE)
+            return None
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        return method, path, headers, length, keep_alive
+
+    def _reject(self, code):
+        self._closing = True
+        self._incoming = []
+        self.push(_render(code, [('Content-Type', 'text/plain')], '', False))
+        self.close_when_done()
+
+    def _complete(self, slot, method, keep_alive, code, headers, content):
+        self._active = time.time()
+        slot[0] = (_render(code, headers, '' if method == 'HEAD' else content, keep_alive, len(content)), keep_alive)
+        while self._responses and self._responses[0][0] is not None and self.connected:
+            data, keep_alive = self._responses.popleft()[0]
+            self.push(data)
+            if not keep_alive:
+                self._closing = True
+                self.close_when_done()
+                break
+
+
+def _render(code, headers, content, keep_alive, length=None):
+    lines = ['HTTP/1.1 %d %s' % (code, httplib.responses[code])]
+    lines.extend('%s: %s' % header for header in headers)
+    lines.append('Content-Length: %d' % (len(content) if length is None else length))
+    lines.append('Connection: %s' % ('keep-alive' if keep_alive else 'close'))
+    return '\r\n'.join(lines) + '\r\n\r\n' + content
+
+
+class HttpServer(asyncore.dispatcher):
+    """
+    Accepts connections, each of which is served by an HttpConnection.
+    """
+
+    def __init__(self, service, host='', port=8080, backlog=1024):
+        asyncore.dispatcher.__init__(self)
+        self._service = service
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(backlog)
+
+    @property
+    def port(self):
+        return self.socket.getsockname()[1]
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            sock, _ = pair
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            HttpConnection(sock, self._service)
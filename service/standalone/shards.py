@@ -0,0 +1,256 @@
+"""
+Partitioning of storage across several stores (shards).
+
+Destination urls are placed by kid.  Kids are assigned to shards by range: a shard allocates the kids
+of its own range without coordinating with other shards, and since the kid is recovered from the sid
+by short_id.decode, a redirect finds its shard without a lookup.  A range may be split online,
+moving the upper part of it to a new shard.
+
+Deduplication entries (normalized destination url to kid) are placed by consistent hashing of the
+destination url, so that each destination has a single shard which arbitrates its kid.
+"""
+
+import bisect
+import hashlib
+import itertools
+
+import storage
+
+COPY_BATCH = 500
+"""int: destination urls copied per turn of the loop while a range is split"""
+
+
+class RangeShardMap(object):
+    """
+    Assigns kids to shards by contiguous ranges.  Every kid from the first boundary upward belongs
+    to some shard.
+    """
+
+    def __init__(self, ranges):
+        """
+        Args:
+            ranges (list): (first kid, shard name), in any order
+        """
+        ranges = sorted(ranges)
+        self._firsts = [first for first, _ in ranges]
+        self._names = [name for _, name in ranges]
+
+    def shard_for(self, kid):
+        n = bisect.bisect_right(self._firsts, kid) - 1
+        if n < 0:
+            raise KeyError(kid)
+        return self._names[n]
+
+    def split(self, first_kid, name):
+        """
+        Assigns kids from first_kid, up to the first kid of the next range, to shard, name.
+        """
+        n = bisect.bisect_right(self._firsts, first_kid)
+        self._firsts.insert(n, first_kid)
+        self._names.insert(n, name)
+
+    def ranges(self):
+        """
+        Returns:
+            list: (first kid, last kid, shard name). the last kid of the last range is None.
+        """
+        lasts = [first - 1 for first in self._firsts[1:]] + [None]
+        return zip(self._firsts, lasts, self._names)
+
+
+def _hash(key):
+    return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys to shards.  Each shard is placed at several points (replicas) of
+    the ring, and a key belongs to the shard at the first point at or after the hash of the key.
+    Adding a shard moves only the keys which then fall to the new shard's points.
+    """
+
+    def __init__(self, names, replicas=64):
+        self.replicas = replicas
+        self._points = []
+        self._names = []
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        for replica in xrange(self.replicas):
+            point = _hash('%s#%d' % (name, replica))
+            n = bisect.bisect_left(self._points, point)
+            self._points.insert(n, point)
+            self._names.insert(n, name)
+
+    def shard_for(self, key):
+        n = bisect.bisect_left(self._points, _hash(key))
+        return self._names[n % len(self._names)]
+
+
+class ShardedBackend(object):
+    """
+    A storage backend (see module, storage) whose data is partitioned across several stores.
+    """
+
+    def __init__(self, loop, shards, kid_map, dedupe_ring):
+        """
+        Args:
+            loop: schedules callbacks (e.g. server.Loop)
+            shards (dict): stores (e.g. storage.MemoryStore) keyed by shard name
+            kid_map (RangeShardMap): placement of destination urls
+            dedupe_ring (HashRing): placement of deduplication entries
+        """
+        self._loop = loop
+        self.shards = shards
+        self.kid_map = kid_map
+        self.dedupe_ring = dedupe_ring
+        self._allocation_order = itertools.cycle(sorted(shards))
+        self._splits = {}
+
+    @classmethod
+    def create(cls, loop, count, kids_per_shard):
+        """
+        Creates a backend of count memory stores, each of which allocates kids_per_shard kids.
+        """
+        shards = {}
+        for n in xrange(count):
+            first = 1 + n * kids_per_shard
+            shards['shard%d' % n] = storage.MemoryStore(loop, first, first + kids_per_shard - 1)
+        kid_map = RangeShardMap([(shards[name].first_kid, name) for name in shards])
+        return cls(loop, shards, kid_map, HashRing(sorted(shards)))
+
+    def _store_for_kid(self, kid):
+        return self.shards[self.kid_map.shard_for(kid)]
+
+    def _fallback_for_kid(self, kid):
+        """
+        Returns:
+            MemoryStore: the shard from which the range of kid is being moved, if any
+        """
+        for (first, last), source in self._splits.iteritems():
+            if first <= kid and (last is None or kid <= last):
+                return source
+        return None
+
+    def get_url(self, kid, callback):
+        self.get_urls([kid], lambda found: callback(found.get(kid)))
+
+    def get_urls(self, kids, callback):
+        """
+        Fans out one request per shard, and delivers the combined result once every shard has
+        answered.  Kids which belong to no shard are not found.  Kids which are not found in a range
+        being split are sought again in the shard from which the range is being moved.
+        """
+        by_store = {}
+        for kid in kids:
+            try:
+                store = self._store_for_kid(kid)
+            except KeyError:
+                # below every range: never allocated, so not found
+                continue
+            by_store.setdefault(store, []).append(kid)
+
+        result = {}
+        outstanding = [len(by_store)]
+
+        def answered(found):
+            result.update(found)
+            outstanding[0] -= 1
+            if not outstanding[0]:
+                self._get_missing([kid for kid in kids if kid not in result], result, callback)
+
+        if not by_store:
+            self._loop.call_soon(callback, result)
+        for store, store_kids in by_store.iteritems():
+            store.get_urls(store_kids, answered)
+
+    def _get_missing(self, missing, result, callback):
+        by_source = {}
+        for kid in missing:
+            source = self._fallback_for_kid(kid)
+            if source:
+                by_source.setdefault(source, []).append(kid)
+
+        if not by_source:
+            callback(result)
+            return
+
+        outstanding = [len(by_source)]
+
+        def answered(found):
+            result.update(found)
+            outstanding[0] -= 1
+            if not outstanding[0]:
+                callback(result)
+
+        for source, source_kids in by_source.iteritems():
+            source.get_urls(source_kids, answered)
+
+    def _allocate_kid(self, callback, attempts=None):
+        """
+        Allocates from the shards in turn, passing over those whose ranges are exhausted.
+        """
+        if attempts is None:
+            attempts = len(self.shards)
+        if not attempts:
+            callback(None)
+            return
+
+        def allocated(kid):
+            if kid is None:
+                self._allocate_kid(callback, attempts - 1)
+            else:
+                callback(kid)
+        self.shards[next(self._allocation_order)].allocate_kid(allocated)
+
+    def shorten(self, normal, url, callback):
+        dedupe_store = self.shards[self.dedupe_ring.shard_for(url)]
+        storage.shorten(dedupe_store, self._allocate_kid, self._store_for_kid, normal, url, callback)
+
+    def split(self, name, first_kid, new_name, new_store, callback=None):
+        """
+        Moves the kids of shard, name, from first_kid upward to a new shard, while requests continue
+        to be served.  The range is assigned to the new shard at once, and the new shard takes over
+        its allocation; destination urls are then copied to it in batches, during which reads of
+        the range which the new shard cannot answer fall back to the original shard.  Once the copy
+        is complete the fallback ends, and the copied urls are deleted from the original.
+
+        Args:
+            name (str): shard whose range contains first_kid
+            first_kid (int): first kid of the range to be moved
+            new_name (str): name of the new shard
+            new_store (MemoryStore): the new shard. its allocation range is assigned here.
+            callback (callable): invoked once the split is complete
+        """
+        if self.kid_map.shard_for(first_kid) != name:
+            raise ValueError("kid %d does not belong to shard %s" % (first_kid, name))
+        source = self.shards[name]
+        last_kid = [last for first, last, _ in self.kid_map.ranges() if first <= first_kid][-1]
+        scan_last = last_kid if last_kid is not None else float('inf')
+
+        # the kids which the new shard allocates are beyond any which the original allocated
+        new_store.first_kid = first_kid
+        new_store.last_kid = source.last_kid
+        new_store.next_kid = max(first_kid, source.next_kid)
+        source.last_kid = first_kid - 1
+
+        self.shards[new_name] = new_store
+        self._allocation_order = itertools.cycle(sorted(self.shards))
+        self._splits[(first_kid, last_kid)] = source
+        self.kid_map.split(first_kid, new_name)
+
+        def copy(start):
+            source.scan_urls(start, scan_last, COPY_BATCH, copied)
+
+        def copied(items):
+            if items:
+                new_store.put_urls(dict(items), lambda _: copy(items[-1][0] + 1))
+            else:
+                del self._splits[(first_kid, last_kid)]
+                source.scan_urls(first_kid, scan_last, None, delete)
+
+        def delete(items):
+            source.delete_urls([kid for kid, _ in items], lambda _: callback and callback())
+
+        copy(first_kid)
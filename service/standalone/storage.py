@@ -0,0 +1,139 @@
+"""
+Non-blocking storage for the standalone server.  Operations return immediately; their results are
+delivered to a callback from the event loop.  A backend for a real store issues its requests
+asynchronously and invokes the callback once the response arrives; the memory backend here stands
+in for one locally (and in tests).
+
+A backend provides:
+
+    get_url(kid, callback)          callback receives the destination url, or None
+    get_urls(kids, callback)        callback receives a dict of kid to destination url, for those found
+    shorten(normal, url, callback)  callback receives the kid assigned to the destination url
+"""
+
+import url_codec
+
+
+class MemoryStore(object):
+    """
+    One embedded store: destination urls keyed by kid, and kids keyed by normalized destination url.
+    Kids are allocated from a range, so that several stores may allocate kids without coordination.
+
+    Each result is delivered on a later turn of the loop, as it would be from a remote store, so
+    that callers cannot come to depend upon synchronous completion.
+    """
+
+    def __init__(self, loop, first_kid=1, last_kid=None):
+        """
+        Args:
+            loop: schedules callbacks (e.g. server.Loop)
+            first_kid (int): first kid which the store may allocate
+            last_kid (int): last kid which the store may allocate. None if unbounded.
+        """
+        self._loop = loop
+        self._urls = {}
+        self._kids = {}
+        self.first_kid = first_kid
+        self.last_kid = last_kid
+        self.next_kid = first_kid
+
+    @property
+    def exhausted(self):
+        return self.last_kid is not None and self.next_kid > self.last_kid
+
+    def get_url(self, kid, callback):
+        encoded = self._urls.get(kid)
+        self._loop.call_soon(callback, url_codec.decode(encoded) if encoded is not None else None)
+
+    def get_urls(self, kids, callback):
+        found = dict((kid, url_codec.decode(self._urls[kid])) for kid in kids if kid in self._urls)
+        self._loop.call_soon(callback, found)
+
+    def put_urls(self, urls, callback=None):
+        """
+        Args:
+            urls (dict): destination url keyed by kid
+        """
+        for kid, url in urls.iteritems():
+            self._urls[kid] = url_codec.encode(url)
+        if callback:
+            self._loop.call_soon(callback, None)
+
+    def delete_urls(self, kids, callback=None):
+        for kid in kids:
+            self._urls.pop(kid, None)
+        if callback:
+            self._loop.call_soon(callback, None)
+
+    def scan_urls(self, first_kid, last_kid, limit, callback):
+        """
+        callback receives a list of (kid, destination url), in order of kid, of at most limit urls
+        whose kids lie within [first_kid, last_kid].
+        """
+        kids = sorted(kid for kid in self._urls if first_kid <= kid <= last_kid)[:limit]
+        self._loop.call_soon(callback, [(kid, url_codec.decode(self._urls[kid])) for kid in kids])
+
+    def allocate_kid(self, callback):
+        """
+        callback receives an unused kid, or None if the range of the store is exhausted.
+        """
+        kid = None
+        if not self.exhausted:
+            kid = self.next_kid
+            self.next_kid += 1
+        self._loop.call_soon(callback, kid)
+
+    def find_kid(self, normal, callback):
+        self._loop.call_soon(callback, self._kids.get(normal))
+
+    def claim_kid(self, normal, kid, callback):
+        """
+        Assigns a kid to a normalized destination url, unless one has been assigned already.
+        callback receives the kid which is assigned after the claim.
+        """
+        self._loop.call_soon(callback, self._kids.setdefault(normal, kid))
+
+
+def shorten(dedupe_store, allocate_kid, kid_store, normal, url, callback):
+    """
+    Assigns a kid to a destination url, unless one has been assigned already.  The destination url
+    is written before the kid is claimed for it, so a claimed kid can always be resolved.  If a
+    concurrent request claims the destination url first, its kid prevails and ours is discarded.
+
+    Args:
+        dedupe_store (MemoryStore): the store which keys kids by normalized destination url
+        allocate_kid (callable): allocates a kid, as MemoryStore.allocate_kid
+        kid_store (callable): returns the store in which the destination url of a kid is kept
+        normal (NormalizedUrl): the normalized destination, which identifies it for deduplication
+        url (str): the destination url, as it is to be redirected to
+        callback (callable): receives the kid of the short url, or None if no kid could be allocated
+    """
+    def found(kid):
+        if kid is not None:
+            callback(kid)
+        else:
+            allocate_kid(allocated)
+
+    def allocated(kid):
+        if kid is None:
+            callback(None)
+        else:
+            kid_store(kid).put_urls({kid: url}, lambda _: dedupe_store.claim_kid(normal, kid, claimed(kid)))
+
+    def claimed(kid):
+        def assigned(assigned_kid):
+            if assigned_kid != kid:
+                kid_store(kid).delete_urls([kid])
+            callback(assigned_kid)
+        return assigned
+
+    dedupe_store.find_kid(normal, found)
+
+
+class MemoryBackend(MemoryStore):
+    """
+    A backend consisting of a single memory store.
+    """
+
+    def shorten(self, normal, url, callback):
+        shorten(self, self.allocate_kid, lambda kid: self, normal, url, callback)
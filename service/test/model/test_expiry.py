@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from google.appengine.ext import ndb, testbed
+
+from service.model import expiry
+from service.model.model_error import ExpiryError
+from service.model.url import DestinationUrl, ShortUrl
+
+
+class ModelTestCase(TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_app_identity_stub()
+        ndb.get_context().clear_cache()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+
+class TestSetExpiry(ModelTestCase):
+
+    def setUp(self):
+        super(TestSetExpiry, self).setUp()
+        self.now = datetime(2016, 1, 1)
+        self.short_url = ShortUrl(url='http://www.example.com/')
+
+    def test_absolute(self):
+        self.short_url.set_expiry(expires=self.now + timedelta(days=1), now=self.now)
+        self.assertEquals(self.short_url.expires, self.now + timedelta(days=1))
+        self.assertIsNone(self.short_url.idle_ttl)
+
+    def test_idle(self):
+        self.short_url.set_expiry(idle_ttl=60, now=self.now)
+        self.assertEquals(self.short_url.expires, self.now + timedelta(seconds=60))
+        self.assertEquals(self.short_url.idle_ttl, 60)
+
+    def test_rejected(self):
+        for kwargs, code in [
+                ({'expires': self.now}, ExpiryError.EXPIRY_IN_PAST),
+                ({'expires': self.now + timedelta(days=1), 'idle_ttl': 60}, ExpiryError.CONFLICTING_EXPIRY),
+                ({'idle_ttl': 0}, ExpiryError.INVALID_EXPIRY),
+                ({'expires': datetime(2200, 1, 1)}, ExpiryError.EXPIRY_TOO_DISTANT),
+                ({'idle_ttl': 10 ** 30}, ExpiryError.EXPIRY_TOO_DISTANT)]:
+            with self.assertRaises(ExpiryError) as raised:
+                self.short_url.set_expiry(now=self.now, **kwargs)
+            self.assertEquals(raised.exception.code, code)
+
+    def test_is_expired(self):
+        self.assertFalse(self.short_url.is_expired(now=self.now))
+        self.short_url.set_expiry(expires=self.now + timedelta(seconds=1), now=self.now)
+        self.assertFalse(self.short_url.is_expired(now=self.now))
+        self.assertTrue(self.short_url.is_expired(now=self.now + timedelta(seconds=1)))
+
+
+class TestTouch(ModelTestCase):
+
+    def setUp(self):
+        super(TestTouch, self).setUp()
+        self.now = datetime(2016, 1, 1)
+        self.short_url = ShortUrl(url='http://www.example.com/')
+        self.short_url.set_expiry(idle_ttl=100, now=self.now)
+        self.short_url.put()
+
+    def test_refresh_skipped_within_fraction(self):
+        self.assertIsNone(self.short_url.touch(now=self.now + timedelta(seconds=24)))
+        self.assertEquals(self.short_url.expires, self.now + timedelta(seconds=100))
+
+    def test_refresh_written_beyond_fraction(self):
+        future = self.short_url.touch(now=self.now + timedelta(seconds=25))
+        self.assertIsNotNone(future)
+        future.get_result()
+        expected = self.now + timedelta(seconds=125)
+        self.assertEquals(self.short_url.key.get(use_cache=False, use_memcache=False).expires, expected)
+
+    def test_no_refresh_without_idle_ttl(self):
+        short_url = ShortUrl(url='http://www.example.com/')
+        short_url.set_expiry(expires=self.now + timedelta(days=1), now=self.now)
+        self.assertIsNone(short_url.touch(now=self.now))
+
+
+class TestDoomedKeys(ModelTestCase):
+
+    def _create(self, url, expires):
+        short_url = ShortUrl(url=url, expires=expires)
+        short_url.put()
+        DestinationUrl(key=DestinationUrl.construct(url).key, short_key=short_url.key).put()
+        return short_url
+
+    def test_expired_with_destination(self):
+        now = datetime(2016, 1, 1)
+        expired = self._create('http://www.example.com/a', now - timedelta(seconds=1))
+        live = self._create('http://www.example.com/b', now + timedelta(seconds=1))
+
+        count, doomed = expiry._doomed_keys([expired, live, None], now)
+        self.assertEquals(count, 1)
+        self.assertEquals(doomed, [expired.key, expired.destination_key()])
+
+    def test_destination_reassigned(self):
+        now = datetime(2016, 1, 1)
+        expired = self._create('http://www.example.com/a', now - timedelta(seconds=1))
+        # the destination was given a new short url after the old one expired
+        self._create('http://www.example.com/a', None)
+
+        count, doomed = expiry._doomed_keys([expired], now)
+        self.assertEquals(count, 1)
+        self.assertEquals(doomed, [expired.key])
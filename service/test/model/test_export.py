@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from service.model import export
+from service.model.url import ShortUrl
+from service.test.model.test_expiry import ModelTestCase
+
+
+class TestSnapshotItems(ModelTestCase):
+
+    def test_skips_expired(self):
+        now = datetime(2016, 1, 1)
+        ShortUrl(id=1, url='http://a.com/').put()
+        ShortUrl(id=2, url='http://b.com/', expires=datetime(2017, 1, 1)).put()
+        ShortUrl(id=3, url='http://c.com/', expires=datetime(2015, 1, 1)).put()
+        self.assertEquals(list(export.snapshot_items(now=now, batch_size=1)), [
+            (1, 0, 'http://a.com/'),
+            (2, 1483228800, 'http://b.com/'),
+        ])
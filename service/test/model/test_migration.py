@@ -0,0 +1,58 @@
+from google.appengine.api import datastore, datastore_types
+from google.appengine.ext import ndb
+
+from service.model import migration, url_codec
+from service.model.url import DestinationUrl, ShortUrl
+from service.test.model.test_expiry import ModelTestCase
+
+URL = 'http://www.example.com/landing?utm_source=newsletter&utm_medium=email'
+
+
+class TestRewriteEntities(ModelTestCase):
+
+    def _put_legacy(self, kid):
+        """
+        Stores a short url as written before urls were compressed.
+        """
+        entity = datastore.Entity('ShortUrl', id=kid)
+        entity['url'] = datastore_types.Blob(URL)
+        return datastore.Put(entity)
+
+    def test_reencodes_url(self):
+        key = self._put_legacy(5)
+        result = migration.rewrite_entities(ShortUrl, batch_size=1)
+        self.assertEquals(result.rewritten, 1)
+        self.assertIsNone(result.cursor)
+        stored = datastore.Get(key)['url']
+        self.assertEquals(stored[0], url_codec.VERSION_DEFLATE_DICTIONARY)
+        self.assertEquals(ShortUrl.get_by_id(5).url, URL)
+
+    def test_resumes_from_cursor(self):
+        for kid in xrange(1, 4):
+            self._put_legacy(kid)
+        result = migration.rewrite_entities(ShortUrl, batch_size=2, deadline=0)
+        self.assertEquals(result.rewritten, 2)
+        result = migration.rewrite_entities(ShortUrl, batch_size=2, cursor=result.cursor)
+        self.assertEquals(result.rewritten, 1)
+        self.assertIsNone(result.cursor)
+
+    def test_rewrites_shared_entity_group(self):
+        # every destination url under one scheme belongs to the entity group of its UrlScheme root
+        for path in xrange(10):
+            entity = DestinationUrl.construct('http://www.example.com/%d' % path)
+            entity.short_key = ndb.Key(ShortUrl, path + 1)
+            entity.put()
+        transactions = []
+        transaction_async = ndb.transaction_async
+
+        def counting(callback, **kwargs):
+            transactions.append(callback)
+            return transaction_async(callback, **kwargs)
+        migration.ndb.transaction_async = counting
+        try:
+            result = migration.rewrite_entities(DestinationUrl, batch_size=10)
+        finally:
+            migration.ndb.transaction_async = transaction_async
+        self.assertEquals(result.rewritten, 10)
+        self.assertIsNone(result.cursor)
+        self.assertEquals(len(transactions), 1)
@@ -82,3 +82,41 @@ class TestDecode(TestCase):
             e = cm.exception
             self.assertEqual(e.code, DecodeError.OVERFLOW)
 
+
+class TestValidateForm(TestCase):
+
+    def test_accept_encoded_max_int(self):
+        short_id.validate_form(short_id.encode(short_id.MAX_ID))
+
+    def test_accept_uncompressed_max_length(self):
+        short_id.validate_form('1' * short_id.MAX_ENCODED_LENGTH)
+
+    def test_reject_too_long(self):
+        with self.assertRaises(DecodeError) as cm:
+            short_id.validate_form('1' * (short_id.MAX_ENCODED_LENGTH + 1))
+        self.assertEquals(cm.exception.code, DecodeError.ID_TOO_LONG)
+
+    def test_reject_non_numeral(self):
+        for s in ('login.php', 'a/b', 'a b', 'a^'):
+            with self.assertRaises(DecodeError) as cm:
+                short_id.validate_form(s)
+            self.assertEquals(cm.exception.code, DecodeError.INVALID_NUMERAL)
+
+
+class TestDecodeKeyId(TestCase):
+
+    def test_accept_key_ids(self):
+        self.assertEquals(short_id.decode_key_id(short_id.encode(1)), 1)
+        self.assertEquals(short_id.decode_key_id(short_id.encode(short_id.MAX_KEY_ID)), short_id.MAX_KEY_ID)
+
+    def test_reject_non_key_ids(self):
+        kids = [0] + ([short_id.MAX_KEY_ID + 1] if short_id.MAX_ID > short_id.MAX_KEY_ID else [])
+        for kid in kids:
+            with self.assertRaises(DecodeError) as cm:
+                short_id.decode_key_id(short_id.encode(kid))
+            self.assertEquals(cm.exception.code, DecodeError.NOT_A_KEY_ID)
+
+    def test_reject_malformed(self):
+        with self.assertRaises(DecodeError) as cm:
+            short_id.decode_key_id('login.php')
+        self.assertEquals(cm.exception.code, DecodeError.INVALID_NUMERAL)
@@ -0,0 +1,57 @@
+from StringIO import StringIO
+from unittest import TestCase
+
+import service.model.url_codec as url_codec
+
+URL = 'https://www.example.com/landing?utm_source=newsletter&utm_medium=email&utm_campaign=spring'
+
+
+class TestEncode(TestCase):
+
+    def test_round_trip_with_dictionary(self):
+        encoded = url_codec.encode(URL)
+        self.assertEquals(encoded[0], url_codec.VERSION_DEFLATE_DICTIONARY)
+        self.assertLess(len(encoded), len(URL))
+        self.assertEquals(url_codec.decode(encoded), URL)
+
+    def test_round_trip_without_dictionary(self):
+        url = URL + URL
+        encoded = url_codec.encode(url, None)
+        self.assertEquals(encoded[0], url_codec.VERSION_DEFLATE)
+        self.assertEquals(url_codec.decode(encoded), url)
+
+    def test_incompressible_url_stored_verbatim(self):
+        url = 'http://a.b/'
+        self.assertEquals(url_codec.encode(url, None), url)
+
+    def test_reject_unknown_version(self):
+        self.assertRaises(ValueError, url_codec.decode, '\x1fabc')
+
+
+class TestDecode(TestCase):
+
+    def test_legacy_value_unchanged(self):
+        self.assertEquals(url_codec.decode(URL), URL)
+
+    def test_trained_dictionary(self):
+        urls = [URL + str(n) for n in xrange(10)]
+        url_codec.register_dictionary(200, url_codec.train_dictionary(urls))
+        encoded = url_codec.encode(URL, 200)
+        self.assertEquals(ord(encoded[1]), 200)
+        self.assertEquals(url_codec.decode(encoded), URL)
+
+    def test_dictionary_file(self):
+        f = StringIO()
+        url_codec.write_dictionary(f, 201, url_codec.train_dictionary([URL, URL + '2']))
+        f.seek(0)
+        self.assertEquals(url_codec.load_dictionaries(StringIO('# trained\n\n' + f.getvalue())), [201])
+        self.assertEquals(url_codec.decode(url_codec.encode(URL, 201)), URL)
+
+    def test_dictionary_file_cannot_alter_dictionary(self):
+        f = StringIO()
+        url_codec.write_dictionary(f, url_codec.DEFAULT_DICTIONARY_ID, 'other')
+        f.seek(0)
+        self.assertRaises(ValueError, url_codec.load_dictionaries, f)
+
+    def test_reject_unknown_dictionary(self):
+        self.assertRaises(ValueError, url_codec.decode, url_codec.VERSION_DEFLATE_DICTIONARY + '\xfe' + 'abc')
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+from gapplib import access_log
+
+
+class TestBinaryEncoding(TestCase):
+
+    def test_round_trip(self):
+        records = [
+            access_log.AccessRecord(1.5, 'RedirectUrl', 'F=_g', 2 ** 127 - 1, 302, 0.25),
+            access_log.AccessRecord(2.0, 'ShortenUrl', None, None, 400, 1.0),
+        ]
+        self.assertEquals(access_log.decode_binary(access_log.encode_binary(records)), records)
+
+
+class TestSampleRates(TestCase):
+
+    def test_parse(self):
+        rates = access_log.parse_sample_rates('2xx=0.5, 5xx=0')
+        self.assertEquals(rates[2], 0.5)
+        self.assertEquals(rates[5], 0.0)
+        self.assertEquals(rates[4], access_log.DEFAULT_SAMPLE_RATES[4])
+
+
+class TestAccessLog(TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.log = access_log.AccessLog(
+            sample_rates={2: 1.0, 4: 0.0}, sink=self.batches.append, capacity=2, flush_size=10, flush_interval=3600)
+
+    def test_samples_by_status_class(self):
+        self.assertTrue(self.log.record('QueryUrl', 'a', 10, 200, 1.0))
+        self.assertFalse(self.log.record('QueryUrl', 'a', 10, 404, 1.0))
+        self.assertEquals(len(self.log.drain()), 1)
+
+    def test_overwrites_oldest_when_full(self):
+        for n in xrange(3):
+            self.log.record('QueryUrl', str(n), n, 200, 1.0)
+        self.assertEquals(self.log.dropped, 1)
+        self.assertEquals([r.kid for r in self.log.drain()], [1, 2])
+
+    def test_flush_writes_one_batch(self):
+        self.log.record('QueryUrl', 'a', 10, 200, 1.0)
+        self.log.record('QueryUrl', 'b', 11, 200, 1.0)
+        self.assertEquals(self.log.flush(), 2)
+        self.assertEquals(len(self.batches), 1)
+        self.assertEquals(self.batches[0].count('\n'), 2)
+
+    def test_flusher_stops_request_flushes(self):
+        started = []
+
+        def start_new_background_thread(target, args, kwargs=None):
+            # the signature of google.appengine.api.background_thread's
+            started.append((target, args, kwargs))
+
+        self.log.flush_size = 1
+        self.log.start_flusher(start_new_background_thread)
+        self.log.record('QueryUrl', 'a', 10, 200, 1.0)
+        self.assertEquals(len(started), 1)
+        self.assertEquals(self.batches, [])
+
+    def test_unknown_format_falls_back_to_json(self):
+        self.assertEquals(access_log._format('jsno'), access_log.FORMATS['json'])
@@ -0,0 +1,112 @@
+import random
+from unittest import TestCase
+
+from gapplib import arena
+
+
+class TestCompactTable(TestCase):
+
+    def test_get_put(self):
+        table = arena.CompactTable(8, 1024)
+        table.put(1, 'http://a.com/')
+        table.put(2 ** 127 - 1, 'http://b.com/')
+        self.assertEquals(table.get(1), 'http://a.com/')
+        self.assertEquals(table.get(2 ** 127 - 1), 'http://b.com/')
+        self.assertIsNone(table.get(2))
+        self.assertEquals(len(table), 2)
+
+    def test_replace(self):
+        table = arena.CompactTable(8, 1024)
+        table.put(1, 'http://a.com/long')
+        table.put(1, 'http://a.com/')
+        self.assertEquals(table.get(1), 'http://a.com/')
+        table.put(1, 'http://a.com/longer/still')
+        self.assertEquals(table.get(1), 'http://a.com/longer/still')
+        self.assertEquals(len(table), 1)
+
+    def test_entry_bound_spares_referenced(self):
+        table = arena.CompactTable(3, 1024)
+        for kid in (1, 2, 3):
+            table.put(kid, str(kid))
+        table.put(4, '4')
+        self.assertEquals(len(table), 3)
+        survivors = [kid for kid in (1, 2, 3) if kid in table]
+        # the oldest entries are evicted first, but one which has been read is spared
+        for kid in survivors[1:]:
+            table.get(kid)
+        table.put(5, '5')
+        self.assertNotIn(survivors[0], table)
+        for kid in survivors[1:] + [4, 5]:
+            self.assertIn(kid, table)
+
+    def test_arena_bound_evicts_oldest(self):
+        table = arena.CompactTable(1000, 100)
+        for kid in xrange(50):
+            table.put(kid, '%010d' % kid)
+        self.assertLessEqual(len(table), 100 / (10 + arena.RECORD_OVERHEAD))
+        for kid in xrange(50):
+            value = table.get(kid)
+            self.assertTrue(value is None or value == '%010d' % kid)
+        self.assertEquals(table.get(49), '%010d' % 49)
+
+    def test_arena_bound_spares_referenced(self):
+        size = 10 + arena.RECORD_OVERHEAD
+        table = arena.CompactTable(1000, 4 * size)
+        for kid in xrange(4):
+            table.put(kid, '%010d' % kid)
+        table.get(0)
+        table.put(4, '%010d' % 4)
+        # 0 was read, so it is moved to the head of the log, and 1 is evicted in its stead
+        self.assertEquals(table.get(0), '%010d' % 0)
+        self.assertNotIn(1, table)
+        for kid in (2, 3, 4):
+            self.assertEquals(table.get(kid), '%010d' % kid)
+
+    def test_eviction_work_is_bounded(self):
+        table = arena.CompactTable(1000, 1000 * (10 + arena.RECORD_OVERHEAD))
+        for kid in xrange(1000):
+            table.put(kid, '%010d' % kid)
+            table.get(kid)
+        # every entry has been read, but a put spares at most MAX_SPARED of them
+        table.put(1000, 'x' * 1000)
+        self.assertEquals(table.get(1000), 'x' * 1000)
+        self.assertGreaterEqual(len(table), 1000 - 1000 / (10 + arena.RECORD_OVERHEAD) - 1)
+
+    def test_value_too_large(self):
+        table = arena.CompactTable(8, 16)
+        table.put(1, 'x' * 17)
+        self.assertNotIn(1, table)
+
+    def test_matches_dict(self):
+        rnd = random.Random(34)
+        table = arena.CompactTable(64, 4096)
+        for _ in xrange(5000):
+            kid = rnd.randint(0, 200)
+            if rnd.random() < 0.1:
+                table.discard(kid)
+                self.assertNotIn(kid, table)
+            else:
+                value = 'v%d' % rnd.randint(0, 10 ** rnd.randint(1, 30))
+                table.put(kid, value)
+                self.assertEquals(table.get(kid), value)
+        self.assertLessEqual(len(table), 64)
+
+    def test_matches_dict_under_arena_bound(self):
+        rnd = random.Random(35)
+        table = arena.CompactTable(256, 1024)
+        model = {}
+        for _ in xrange(20000):
+            kid = rnd.randint(0, 300)
+            if rnd.random() < 0.1:
+                table.discard(kid)
+                model.pop(kid, None)
+            elif rnd.random() < 0.3:
+                value = table.get(kid)
+                self.assertTrue(value is None or value == model[kid])
+            else:
+                model[kid] = 'v' * rnd.randint(0, 60)
+                table.put(kid, model[kid])
+                self.assertEquals(table.get(kid), model[kid])
+        for kid, value in model.iteritems():
+            self.assertIn(table.get(kid), (None, value))
+        self.assertLessEqual(len(table), 1024 / arena.RECORD_OVERHEAD)
@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+from gapplib import breaker
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = breaker.CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=self.clock)
+
+    def _trip(self):
+        for _ in xrange(2):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEquals(self.breaker.state, breaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEquals(self.breaker.state, breaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_probe_closes(self):
+        self._trip()
+        self.clock.now = 10.0
+        self.assertEquals(self.breaker.state, breaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        # one probe at a time
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEquals(self.breaker.state, breaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_probe_reopens(self):
+        self._trip()
+        self.clock.now = 10.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEquals(self.breaker.state, breaker.OPEN)
+        self.clock.now = 19.0
+        self.assertFalse(self.breaker.allow())
+        self.assertEquals(self.breaker.stats()['trips'], 2)
+
+    def test_stats(self):
+        self._trip()
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_fallback()
+        stats = self.breaker.stats()
+        self.assertEquals((stats['calls'], stats['refused'], stats['failed'], stats['fallbacks']), (3, 1, 2, 1))
+        self.assertAlmostEquals(stats['fallback_share'], 1 / 3.0)
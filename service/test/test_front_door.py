@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+from gapplib import throttle
+from service import front_door
+
+
+class StubApp(object):
+    """
+    A WSGI application which records the paths it is asked to serve.
+    """
+
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, environ, start_response):
+        self.paths.append(environ['PATH_INFO'])
+        start_response('302 Found', [('Location', 'http://example.com/')])
+        return ['']
+
+
+class TestFrontDoor(TestCase):
+
+    def setUp(self):
+        self.app = StubApp()
+        self.limiter = throttle.LogLimiter(limit=1)
+        self.door = front_door.FrontDoor(self.app, self.limiter)
+
+    def call(self, path):
+        responses = []
+        body = self.door({'PATH_INFO': path}, lambda status, headers: responses.append((status, dict(headers))))
+        status, headers = responses[0]
+        return status, headers, ''.join(body)
+
+    def test_passes_plausible_sid(self):
+        status, _, _ = self.call('/abc')
+        self.assertEquals(status, '302 Found')
+        self.assertEquals(self.app.paths, ['/abc'])
+
+    def test_passes_empty_path(self):
+        self.call('/')
+        self.assertEquals(self.app.paths, ['/'])
+
+    def test_answers_well_known(self):
+        status, headers, body = self.call('/robots.txt')
+        self.assertEquals(status, '200 OK')
+        self.assertEquals(headers['Content-Length'], str(len(body)))
+        self.assertIn('Cache-Control', headers)
+        self.assertEquals(self.call('/favicon.ico')[0], '204 No Content')
+        self.assertEquals(self.app.paths, [])
+
+    def test_rejects_implausible_sid(self):
+        status, _, _ = self.call('/login.php')
+        self.assertEquals(status, '400 Bad Request')
+        self.assertEquals(self.call('/' + 'a' * 64)[0], '400 Bad Request')
+        self.assertEquals(self.app.paths, [])
+
+    def test_rejections_are_rate_limited(self):
+        for _ in xrange(3):
+            self.call('/login.php')
+        self.assertEquals(self.limiter.suppressed, 2)
@@ -0,0 +1,255 @@
+import json
+import logging
+import time
+
+import webapp2
+from google.appengine.api import datastore_errors, taskqueue
+from google.appengine.ext import ndb
+
+from gapplib import breaker, profiler
+from gapplib.handler import Profiled
+from service import handlers, write_behind
+from service.hot_links import HotLinks
+from service.model import short_id
+from service.model.url import ShortUrl
+from service.test.model.test_expiry import ModelTestCase
+from service.url_cache import UrlCache
+
+
+class HandlerTestCase(ModelTestCase):
+
+    def setUp(self):
+        super(HandlerTestCase, self).setUp()
+        self.testbed.setup_env(DEFAULT_VERSION_HOSTNAME='sho.rt', overwrite=True)
+
+
+class PendingUrls(object):
+    """
+    Stands in for write_behind.WriteBehind, holding pending mappings by kid.
+    """
+
+    def __init__(self, *pendings):
+        self.pendings = dict((pending.kid, pending) for pending in pendings)
+
+    def lookup(self, kid):
+        return self.pendings.get(kid)
+
+
+PENDING = write_behind.PendingUrl(7, 'dest', 'http://pending.com/', 2000000000.0, None, 1000.0)
+
+
+class Records(logging.Handler):
+    """
+    Collects the log records emitted while it is installed.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestSchedulePersist(HandlerTestCase):
+
+    def test_scheduling_failure_is_logged(self):
+        queue = write_behind.LocalQueue()
+        wb = write_behind.WriteBehind(
+            queue, write_behind.InstanceTier(), write_behind.KidReserve(lambda size: (1, size)),
+            lambda pendings: None, schedule=handlers._schedule_persist)
+
+        def fail(**kwargs):
+            raise taskqueue.TransientError()
+        records = Records()
+        logging.getLogger().addHandler(records)
+        add, handlers.taskqueue.add = handlers.taskqueue.add, fail
+        try:
+            kid = wb.shorten('dest', 'http://www.example.com/')
+        finally:
+            handlers.taskqueue.add = add
+            logging.getLogger().removeHandler(records)
+
+        self.assertEquals([record.levelno for record in records.records], [logging.WARNING])
+        self.assertIn('failed to schedule persistence', records.records[0].getMessage())
+        # the mapping remains queued, for cron to persist, and resolvable meanwhile
+        self.assertEquals(queue.depth(), 1)
+        self.assertEquals(wb.lookup(kid).url, 'http://www.example.com/')
+
+
+class TestQueryUrl(HandlerTestCase):
+
+    def setUp(self):
+        super(TestQueryUrl, self).setUp()
+        self.patch = handlers.QueryUrl.write_behind
+        handlers.QueryUrl.write_behind = PendingUrls(PENDING)
+        self.app = webapp2.WSGIApplication([webapp2.Route('/shorturl/<sid:.+>', handler=handlers.QueryUrl)])
+
+    def tearDown(self):
+        handlers.QueryUrl.write_behind = self.patch
+        super(TestQueryUrl, self).tearDown()
+
+    def test_pending(self):
+        response = self.app.get_response('/shorturl/' + short_id.encode(7))
+        self.assertEquals(response.status_int, 200)
+        self.assertEquals(json.loads(response.body)['url'], 'http://pending.com/')
+        self.assertEquals(self.app.get_response('/shorturl/' + short_id.encode(8)).status_int, 404)
+
+
+class TestResolveUrls(HandlerTestCase):
+
+    def setUp(self):
+        super(TestResolveUrls, self).setUp()
+        self.patch = handlers.ResolveUrls.url_cache, handlers.ResolveUrls.write_behind
+        handlers.ResolveUrls.url_cache = UrlCache(16, 1024)
+        handlers.ResolveUrls.write_behind = PendingUrls(PENDING)
+        self.app = webapp2.WSGIApplication([('/shorturl/', handlers.ResolveUrls)])
+
+    def tearDown(self):
+        handlers.ResolveUrls.url_cache, handlers.ResolveUrls.write_behind = self.patch
+        super(TestResolveUrls, self).tearDown()
+
+    def test_resolve(self):
+        ShortUrl(id=5, url='http://www.example.com/').put()
+        sid = short_id.encode(5)
+        response = self.app.get_response('/shorturl/?sid=%s&sid=zz&sid=bad.sid&sid=0' % sid)
+        self.assertEquals(response.status_int, 200)
+        entries = json.loads(response.body)
+        self.assertEquals(entries[sid]['status'], 200)
+        self.assertEquals(entries[sid]['url'], 'http://www.example.com/')
+        self.assertEquals(entries['zz'], {'status': 404})
+        self.assertEquals(entries['bad.sid']['status'], 400)
+        self.assertEquals(entries['0']['status'], 400)
+
+    def test_pending(self):
+        sid = short_id.encode(7)
+        entries = json.loads(self.app.get_response('/shorturl/?sid=' + sid).body)
+        self.assertEquals(entries[sid]['url'], 'http://pending.com/')
+        self.assertIn('expires', entries[sid])
+
+    def test_limits(self):
+        self.assertEquals(self.app.get_response('/shorturl/').status_int, 400)
+        sids = '&'.join('sid=%d' % n for n in xrange(handlers.ResolveUrls.max_sids + 1))
+        self.assertEquals(self.app.get_response('/shorturl/?' + sids).status_int, 413)
+
+
+class ProfiledHandler(Profiled, webapp2.RequestHandler):
+
+    def get(self):
+        end = time.time() + 0.05
+        while time.time() < end:
+            pass
+
+
+class TestProfiles(HandlerTestCase):
+
+    def setUp(self):
+        super(TestProfiles, self).setUp()
+        self.testbed.setup_env(INSTANCE_ID='instance-1', REQUEST_LOG_ID='request-1', overwrite=True)
+        self.patch = Profiled.profiler
+        Profiled.profiler = profiler.Profiler(sample_rate=1.0, interval=0.001)
+        self.app = webapp2.WSGIApplication([('/busy', ProfiledHandler), ('/_stats/profile', handlers.Profiles)])
+
+    def tearDown(self):
+        Profiled.profiler = self.patch
+        super(TestProfiles, self).tearDown()
+
+    def test_profile_retrievable_by_request_id(self):
+        response = self.app.get_response('/busy')
+        self.assertEquals(response.headers['X-Profile-Instance'], 'instance-1')
+        self.assertEquals(response.headers['X-Profile-Id'], 'request-1')
+        # the ring of this instance is cleared, as if the retrieval reached another instance
+        Profiled.profiler = profiler.Profiler(sample_rate=1.0)
+
+        response = self.app.get_response('/_stats/profile?id=request-1')
+        self.assertEquals(response.status_int, 200)
+        self.assertIn('get (test_handlers.py:', response.body)
+        self.assertEquals(self.app.get_response('/_stats/profile?id=request-2').status_int, 404)
+
+
+class StubSnapshot(object):
+
+    def __init__(self, urls):
+        self.urls = urls
+
+    def get(self, kid):
+        return self.urls.get(kid)
+
+
+class TestRedirectFallback(HandlerTestCase):
+    """
+    A redirect which the datastore cannot serve, because the breaker is open or the lookup fails, is
+    served from memcache, a pending mapping or the snapshot, in that order; failing all, 503.
+    """
+
+    PATCHED = ('hot_links', 'url_cache', 'write_behind', 'breaker', 'snapshot')
+
+    def setUp(self):
+        super(TestRedirectFallback, self).setUp()
+        self.patch = dict((name, getattr(handlers.RedirectUrl, name)) for name in self.PATCHED)
+        handlers.RedirectUrl.hot_links = HotLinks()
+        handlers.RedirectUrl.url_cache = UrlCache(16, 1024)
+        handlers.RedirectUrl.write_behind = PendingUrls(PENDING)
+        handlers.RedirectUrl.breaker = breaker.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        handlers.RedirectUrl.snapshot = StubSnapshot({9: 'http://snapshot.com/'})
+        self.app = webapp2.WSGIApplication([webapp2.Route('/<sid:.*>', handler=handlers.RedirectUrl)])
+
+    def tearDown(self):
+        if 'get_by_id' in ShortUrl.__dict__:
+            del ShortUrl.get_by_id
+        for name, value in self.patch.iteritems():
+            setattr(handlers.RedirectUrl, name, value)
+        super(TestRedirectFallback, self).tearDown()
+
+    def fail_datastore(self):
+        """
+        Fails every lookup which would reach the datastore; memcache still answers.
+        """
+        get_by_id = ShortUrl.get_by_id
+
+        def failing(kid, **kwargs):
+            if kwargs.get('use_datastore', True):
+                raise datastore_errors.Timeout()
+            return get_by_id(kid, **kwargs)
+        ShortUrl.get_by_id = staticmethod(failing)
+
+    def redirect(self, kid):
+        return self.app.get_response('/' + short_id.encode(kid))
+
+    def assertRedirect(self, kid, url):
+        response = self.redirect(kid)
+        self.assertEquals(response.status_int, 302)
+        self.assertEquals(response.headers['Location'], url)
+
+    def test_lookup_failure_falls_back_to_memcache(self):
+        ShortUrl(id=5, url='http://memcache.com/').put()
+        # a get which misses the in-context cache fills memcache
+        ndb.get_context().clear_cache()
+        ShortUrl.get_by_id(5)
+        ndb.get_context().clear_cache()
+        self.fail_datastore()
+        self.assertRedirect(5, 'http://memcache.com/')
+        self.assertEquals(handlers.RedirectUrl.breaker.state, breaker.OPEN)
+        self.assertEquals(handlers.RedirectUrl.breaker.fallbacks, 1)
+
+    def test_open_breaker_falls_back_to_pending_then_snapshot(self):
+        handlers.RedirectUrl.breaker.record_failure()
+        self.assertRedirect(7, 'http://pending.com/')
+        self.assertRedirect(9, 'http://snapshot.com/')
+        self.assertEquals(handlers.RedirectUrl.breaker.refused, 2)
+
+    def test_expired_pending_is_not_served(self):
+        handlers.RedirectUrl.write_behind = PendingUrls(PENDING._replace(expires=1000.0))
+        self.assertEquals(self.redirect(7).status_int, 404)
+        handlers.RedirectUrl.breaker.record_failure()
+        self.assertEquals(self.redirect(7).status_int, 503)
+
+    def test_unavailable(self):
+        self.fail_datastore()
+        response = self.redirect(11)
+        self.assertEquals(response.status_int, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_not_found_while_datastore_answers(self):
+        self.assertEquals(self.redirect(11).status_int, 404)
+        self.assertEquals(handlers.RedirectUrl.breaker.state, breaker.CLOSED)
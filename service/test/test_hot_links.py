@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from service import hot_links
+
+
+class TestHotLinks(TestCase):
+
+    def setUp(self):
+        self.links = hot_links.HotLinks(k=2, decay_interval=1000)
+
+    def test_pins_heavy_hitter(self):
+        self.assertIsNone(self.links.get(1))
+        self.links.offer(1, 'short url 1')
+        self.assertTrue(self.links.is_pinned(1))
+        self.assertEquals(self.links.get(1), 'short url 1')
+
+    def test_ignores_offer_of_cold_link(self):
+        self.links.offer(1, 'short url 1')
+        self.assertFalse(self.links.is_pinned(1))
+
+    def test_one_off_requests_do_not_displace(self):
+        for _ in xrange(10):
+            self.links.get(1)
+        self.links.offer(1, 'short url 1')
+        for kid in xrange(100, 200):
+            self.links.get(kid)
+        self.assertEquals(self.links.get(1), 'short url 1')
+
+    def test_unpins_displaced(self):
+        self.links.get(1)
+        self.links.offer(1, 'short url 1')
+        self.links.get(2)
+        for _ in xrange(3):
+            self.links.get(3)
+        self.assertFalse(self.links.is_pinned(1))
+
+    def test_decay_ages_out_former_heavy_hitter(self):
+        links = hot_links.HotLinks(k=1, width=64, depth=1, decay_interval=8, decay_factor=0.0)
+        for _ in xrange(4):
+            links.get(1)
+        links.offer(1, 'short url 1')
+        for _ in xrange(4):
+            links.get(2)
+        self.assertTrue(links.is_pinned(1))
+        # the decay has reset the counts, so the current link displaces the former
+        links.get(2)
+        self.assertFalse(links.is_pinned(1))
@@ -0,0 +1,50 @@
+import time
+from unittest import TestCase
+
+from gapplib import profiler
+
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class TestSignature(TestCase):
+
+    def test_verify(self):
+        header = profiler.sign('secret', 2000)
+        self.assertTrue(profiler.verify('secret', header, now=1000))
+        self.assertFalse(profiler.verify('other', header, now=1000))
+        self.assertFalse(profiler.verify('secret', header, now=2000))
+        self.assertFalse(profiler.verify('secret', '2000:' + '0' * 64, now=1000))
+        self.assertFalse(profiler.verify('secret', 'junk', now=1000))
+
+
+class TestProfiler(TestCase):
+
+    def test_disabled(self):
+        p = profiler.Profiler()
+        self.assertFalse(p.enabled)
+        self.assertIsNone(p.begin(profiler.sign('secret', time.time() + 60)))
+
+    def test_signed_request(self):
+        p = profiler.Profiler(secret='secret', interval=0.001)
+        self.assertIsNone(p.begin(None))
+        sampler = p.begin(profiler.sign('secret', time.time() + 60))
+        busy_wait(0.05)
+        profile = p.end(sampler, 'Busy', 50.0)
+
+        self.assertEquals(p.profiles(), [profile])
+        self.assertEquals(profiler.aggregate([profile]), p.folded())
+        self.assertIn('busy_wait (test_profiler.py:', p.folded('Busy'))
+        self.assertEquals(p.folded('Other'), '')
+
+    def test_bounds(self):
+        p = profiler.Profiler(sample_rate=1.0, interval=0.001, capacity=2, max_active=1)
+        sampler = p.begin()
+        self.assertIsNone(p.begin())
+        p.end(sampler, 'A', 0.0)
+        for route in ('B', 'C'):
+            p.end(p.begin(), route, 0.0)
+        self.assertEquals([profile.route for profile in p.profiles()], ['B', 'C'])
@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from service.standalone import shards
+from service.standalone.server import Loop
+from service.standalone.storage import MemoryStore
+
+
+class TestRangeShardMap(TestCase):
+
+    def test_shard_for(self):
+        m = shards.RangeShardMap([(101, 'b'), (1, 'a')])
+        self.assertEquals(m.shard_for(1), 'a')
+        self.assertEquals(m.shard_for(100), 'a')
+        self.assertEquals(m.shard_for(101), 'b')
+        self.assertEquals(m.shard_for(10 ** 30), 'b')
+        self.assertRaises(KeyError, m.shard_for, 0)
+
+    def test_split(self):
+        m = shards.RangeShardMap([(1, 'a'), (101, 'b')])
+        m.split(51, 'c')
+        self.assertEquals(m.ranges(), [(1, 50, 'a'), (51, 100, 'c'), (101, None, 'b')])
+
+
+class TestHashRing(TestCase):
+
+    def test_adding_shard_moves_few_keys(self):
+        ring = shards.HashRing(['a', 'b', 'c'])
+        keys = ['http://example.com/%d' % n for n in xrange(1000)]
+        before = dict((k, ring.shard_for(k)) for k in keys)
+        ring.add('d')
+        moved = [k for k in keys if ring.shard_for(k) != before[k]]
+        self.assertTrue(all(ring.shard_for(k) == 'd' for k in moved))
+        self.assertLess(len(moved), 400)
+
+
+class TestShardedBackend(TestCase):
+
+    def setUp(self):
+        self.loop = Loop()
+        self.backend = shards.ShardedBackend.create(self.loop, 3, 100)
+
+    def _run(self, operation, *args):
+        results = []
+        operation(*(args + (results.append,)))
+        while not results:
+            self.loop.run_once()
+        return results[0]
+
+    def _shorten(self, url):
+        return self._run(self.backend.shorten, url, url)
+
+    def test_shorten_spreads_and_deduplicates(self):
+        kids = [self._shorten('http://example.com/%d' % n) for n in xrange(9)]
+        self.assertEquals(len(set(self.backend.kid_map.shard_for(kid) for kid in kids)), 3)
+        self.assertEquals(self._shorten('http://example.com/4'), kids[4])
+
+    def test_get_urls_fans_out(self):
+        urls = ['http://example.com/%d' % n for n in xrange(6)]
+        kids = [self._shorten(url) for url in urls]
+        self.assertEquals(self._run(self.backend.get_urls, kids + [99]), dict(zip(kids, urls)))
+
+    def test_get_urls_below_every_range(self):
+        url = 'http://example.com/'
+        kid = self._shorten(url)
+        self.assertEquals(self._run(self.backend.get_urls, [0, kid]), {kid: url})
+        self.assertIsNone(self._run(self.backend.get_url, 0))
+
+    def test_exhausted(self):
+        backend = shards.ShardedBackend.create(self.loop, 2, 1)
+        self.assertIsNotNone(self._run(backend.shorten, 'http://a.com/', 'http://a.com/'))
+        self.assertIsNotNone(self._run(backend.shorten, 'http://b.com/', 'http://b.com/'))
+        self.assertIsNone(self._run(backend.shorten, 'http://c.com/', 'http://c.com/'))
+
+    def test_split_online(self):
+        urls = ['http://example.com/%d' % n for n in xrange(30)]
+        kids = dict((self._shorten(url), url) for url in urls)
+
+        done = []
+        self.backend.split('shard0', 5, 'shard3', MemoryStore(self.loop), lambda: done.append(True))
+        # reads are served while the range is copied
+        self.assertEquals(self._run(self.backend.get_urls, kids.keys()), kids)
+        while not done:
+            self.loop.run_once()
+
+        self.assertEquals(self.backend.kid_map.shard_for(5), 'shard3')
+        self.assertEquals(self._run(self.backend.get_urls, kids.keys()), kids)
+        self.assertEquals(self._run(self.backend.shards['shard0'].get_urls, range(5, 101)), {})
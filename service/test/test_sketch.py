@@ -0,0 +1,72 @@
+from unittest import TestCase
+
+from gapplib import sketch
+
+
+class TestCountMinSketch(TestCase):
+
+    def test_never_undercounts(self):
+        cms = sketch.CountMinSketch(width=16, depth=2)
+        for n in xrange(200):
+            cms.add(n % 50)
+        for n in xrange(50):
+            self.assertGreaterEqual(cms.estimate(n), 4)
+
+    def test_decay(self):
+        cms = sketch.CountMinSketch()
+        cms.add('a', 10)
+        cms.decay(0.5)
+        self.assertEquals(cms.estimate('a'), 5)
+
+
+class TestHeavyHitters(TestCase):
+
+    def test_tracks_most_frequent(self):
+        hh = sketch.HeavyHitters(k=3)
+        for n in xrange(1000):
+            hh.add(n % 5 if n % 2 else 1000 + n)
+        self.assertEquals(len(hh.top()), 3)
+        for item, count in hh.top():
+            self.assertIn(item, (1, 3, 0, 2, 4))
+
+    def test_reports_displaced(self):
+        hh = sketch.HeavyHitters(k=1)
+        self.assertIsNone(hh.add('a'))
+        self.assertIsNone(hh.add('b'))
+        self.assertEquals(hh.add('b'), 'a')
+        self.assertIn('b', hh)
+        self.assertNotIn('a', hh)
+
+    def test_decay_interval(self):
+        hh = sketch.HeavyHitters(k=2, decay_interval=4)
+        for _ in xrange(4):
+            hh.add('a')
+        self.assertEquals(hh.top(), [('a', 2)])
+
+    def test_decay_is_spread_over_observations(self):
+        hh = sketch.HeavyHitters(k=2, width=sketch.DECAY_STEP, depth=2, decay_interval=4)
+        for _ in xrange(4):
+            hh.add('a')
+        self.assertTrue(hh._sketch.decaying)
+        hh.add('b')
+        hh.add('b')
+        self.assertFalse(hh._sketch.decaying)
+
+    def test_incremental_decay(self):
+        cms = sketch.CountMinSketch(width=8, depth=2)
+        cms.add('a', 10)
+        cms.begin_decay(0.5)
+        self.assertTrue(cms.decaying)
+        cms.continue_decay(8)
+        self.assertTrue(cms.decaying)
+        cms.continue_decay(8)
+        self.assertFalse(cms.decaying)
+        self.assertEquals(cms.estimate('a'), 5)
+
+    def test_decay_under_way_is_completed_first(self):
+        cms = sketch.CountMinSketch(width=8, depth=2)
+        cms.add('a', 12)
+        cms.begin_decay(0.5)
+        cms.begin_decay(0.5)
+        cms.continue_decay(16)
+        self.assertEquals(cms.estimate('a'), 3)
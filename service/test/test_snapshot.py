@@ -0,0 +1,62 @@
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+
+from service import snapshot
+
+
+class TestSnapshot(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'snapshot.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        items = [(1, 0, 'http://a.com/'), (2 ** 100, 2000000000, 'http://b.com/x\ty')]
+        with open(self.path, 'w') as f:
+            snapshot.write(items, f)
+        with open(self.path) as f:
+            self.assertEquals(list(snapshot.read(f)), items)
+
+    def test_get(self):
+        with open(self.path, 'w') as f:
+            snapshot.write([(1, 0, 'http://a.com/'), (2, 1, 'http://expired.com/')], f)
+        s = snapshot.Snapshot(self.path)
+        self.assertIsNone(s.size)
+        self.assertEquals(s.get(1), 'http://a.com/')
+        self.assertIsNone(s.get(2))
+        self.assertIsNone(s.get(3))
+        self.assertEquals(s.size, os.path.getsize(self.path))
+
+    def test_search(self):
+        rnd = random.Random(38)
+        items = [(kid, 0, 'http://%d.com/%s' % (kid, 'x' * rnd.randint(0, 200))) for kid in xrange(1, 3000, 3)]
+        with open(self.path, 'w') as f:
+            snapshot.write(items, f)
+        s = snapshot.Snapshot(self.path)
+        for kid, _, url in items:
+            self.assertEquals(s.get(kid), url)
+            self.assertIsNone(s.get(kid + 1))
+        self.assertIsNone(s.get(0))
+        self.assertIsNone(s.get(2 ** 100))
+
+    def test_write_requires_ascending_kids(self):
+        with open(self.path, 'w') as f:
+            self.assertRaises(ValueError, snapshot.write, [(2, 0, 'http://b.com/'), (1, 0, 'http://a.com/')], f)
+
+    def test_missing(self):
+        self.assertIsNone(snapshot.Snapshot(None).get(1))
+        self.assertIsNone(snapshot.Snapshot(os.path.join(self.directory, 'none')).get(1))
+
+    def test_unreadable(self):
+        with open(self.path, 'w') as f:
+            f.write('1\t0\thttp://a.com/\njunk\n')
+        s = snapshot.Snapshot(self.path)
+        self.assertIsNone(s.get(2))
+        self.assertIsNone(s.path)
+        self.assertIsNone(s.get(1))
@@ -0,0 +1,139 @@
+import json
+import socket
+import time
+from unittest import TestCase
+
+from service.standalone.server import IDLE_TIMEOUT, HttpConnection, Loop, Request, ShortUrlService
+from service.standalone.shards import ShardedBackend
+from service.standalone.storage import MemoryBackend
+
+
+class TestShortUrlService(TestCase):
+
+    def setUp(self):
+        self.loop = Loop()
+        self.service = ShortUrlService(MemoryBackend(self.loop), 'http://sho.rt')
+
+    def _request(self, method, path, body=''):
+        responses = []
+        self.service.handle(Request(method, path, {}, body), lambda *response: responses.append(response))
+        for _ in xrange(10):
+            self.loop.run_once()
+        self.assertEquals(len(responses), 1)
+        return responses[0]
+
+    def _shorten(self, url):
+        code, headers, body = self._request('POST', '/shorturl', json.dumps({'url': url}))
+        self.assertEquals(code, 201)
+        return json.loads(body)['short_id']
+
+    def test_shorten_redirect_query(self):
+        sid = self._shorten('https://www.example.com/a?b=c')
+        code, headers, body = self._request('GET', '/' + sid)
+        self.assertEquals(code, 302)
+        self.assertIn(('Location', 'https://www.example.com/a?b=c'), headers)
+
+        code, headers, body = self._request('GET', '/shorturl/' + sid)
+        self.assertEquals(json.loads(body), {'url': 'https://www.example.com/a?b=c', 'short_url': 'http://sho.rt/' + sid})
+
+    def test_shorten_deduplicates(self):
+        self.assertEquals(self._shorten('http://www.example.com/'), self._shorten('http://www.example.com/#x'))
+
+    def test_reject_recursive_redirection(self):
+        code, headers, body = self._request('POST', '/shorturl', json.dumps({'url': 'http://sho.rt/1'}))
+        self.assertEquals(code, 400)
+
+    def test_not_found(self):
+        self.assertEquals(self._request('GET', '/zz')[0], 404)
+
+    def test_reject_malformed_sid(self):
+        self.assertEquals(self._request('GET', '/wp-login.php')[0], 400)
+
+    def test_well_known(self):
+        self.assertEquals(self._request('GET', '/robots.txt')[0], 200)
+
+    def test_resolve_many(self):
+        a = self._shorten('http://www.example.com/a')
+        b = self._shorten('http://www.example.com/b')
+        code, headers, body = self._request('GET', '/shorturl/?sid=%s&sid=zz&sid=bad.sid&sid=%s&sid=%s' % (b, a, b))
+        self.assertEquals(code, 200)
+        self.assertEquals([sid for sid, _ in json.loads(body, object_pairs_hook=list)], [b, 'zz', 'bad.sid', a])
+        entries = json.loads(body)
+        self.assertEquals(entries[a], {'status': 200, 'url': 'http://www.example.com/a', 'short_url': 'http://sho.rt/' + a})
+        self.assertEquals(entries['zz'], {'status': 404})
+        self.assertEquals(entries['bad.sid']['status'], 400)
+
+        code, headers, body = self._request('POST', '/shorturl/', json.dumps({'sids': [a]}))
+        self.assertEquals(json.loads(body)[a]['url'], 'http://www.example.com/a')
+
+    def test_sharded_kid_below_every_range(self):
+        self.service = ShortUrlService(ShardedBackend.create(self.loop, 2, 100), 'http://sho.rt')
+        self.assertEquals(self._request('GET', '/0')[0], 404)
+        code, headers, body = self._request('GET', '/shorturl/?sid=0&sid=1')
+        self.assertEquals(json.loads(body), {'0': {'status': 404}, '1': {'status': 404}})
+
+    def test_resolve_none(self):
+        self.assertEquals(self._request('GET', '/shorturl/')[0], 400)
+        self.assertEquals(self._request('POST', '/shorturl/', json.dumps({'sids': 'a'}))[0], 400)
+
+
+class FailingService(ShortUrlService):
+    """
+    Fails upon requests for /fail.
+    """
+
+    def handle(self, request, respond):
+        if request.path == '/fail':
+            raise KeyError(request.path)
+        super(FailingService, self).handle(request, respond)
+
+
+class TestHttpConnection(TestCase):
+
+    def setUp(self):
+        self.loop = Loop(timeout=0.01)
+        self.client, server = socket.socketpair()
+        self.client.settimeout(1.0)
+        self.connection = HttpConnection(server, FailingService(MemoryBackend(self.loop), 'http://sho.rt'))
+
+    def tearDown(self):
+        self.client.close()
+        self.connection.close()
+
+    def _exchange(self, data):
+        self.client.sendall(data)
+        for _ in xrange(20):
+            self.loop.run_once()
+        received = []
+        self.client.setblocking(0)
+        try:
+            while True:
+                chunk = self.client.recv(65536)
+                if not chunk:
+                    break
+                received.append(chunk)
+        except socket.error:
+            pass
+        return ''.join(received)
+
+    def test_pipelined_in_order(self):
+        response = self._exchange('GET /robots.txt HTTP/1.1\r\n\r\nGET /zz HTTP/1.1\r\n\r\n')
+        self.assertTrue(response.startswith('HTTP/1.1 200 OK'))
+        self.assertIn('HTTP/1.1 404 Not Found', response)
+
+    def test_reject_negative_content_length(self):
+        response = self._exchange('GET /robots.txt HTTP/1.1\r\nContent-Length: -5\r\n\r\nGET /zz HTTP/1.1\r\n\r\n')
+        self.assertTrue(response.startswith('HTTP/1.1 400 Bad Request'))
+        self.assertNotIn('404', response)
+
+    def test_failed_request_answered_in_turn(self):
+        response = self._exchange('GET /fail HTTP/1.1\r\n\r\nGET /zz HTTP/1.1\r\n\r\n')
+        self.assertTrue(response.startswith('HTTP/1.1 500 Internal Server Error'))
+        self.assertIn('HTTP/1.1 404 Not Found', response)
+
+    def test_reap_idle(self):
+        self._exchange('GET /robots.txt HTTP/1.1\r\n\r\nGET /zz HTTP/1.1\r\n')
+        self.assertEquals(self.loop.reap_idle(time.time()), 0)
+        self.assertEquals(self.loop.reap_idle(time.time() + IDLE_TIMEOUT + 1), 1)
+        self.assertFalse(self.connection.connected)
+        self.assertEquals(self.client.recv(1), '')
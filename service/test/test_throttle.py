@@ -0,0 +1,81 @@
+import threading
+from unittest import TestCase
+
+from gapplib import throttle
+
+
+class Clock(object):
+    """
+    A clock which advances only when slept upon.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestWriteBudget(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.budget = throttle.WriteBudget(10, burst=20, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_is_free(self):
+        self.assertEquals(self.budget.consume(20), 0.0)
+        self.assertEquals(self.clock.slept, [])
+
+    def test_deficit_sleeps(self):
+        self.budget.consume(20)
+        self.assertAlmostEquals(self.budget.consume(5), 0.5)
+        self.assertAlmostEquals(self.clock.now, 0.5)
+
+    def test_refills_at_rate_up_to_burst(self):
+        self.budget.consume(20)
+        self.clock.now += 100
+        self.assertEquals(self.budget.consume(20), 0.0)
+        self.assertAlmostEquals(self.budget.consume(10), 1.0)
+
+    def test_rejects_nonpositive_rate(self):
+        self.assertRaises(ValueError, throttle.WriteBudget, 0)
+
+
+class TestLogLimiter(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.limiter = throttle.LogLimiter(limit=2, interval=60, clock=self.clock)
+
+    def test_suppresses_beyond_limit(self):
+        self.assertEquals([self.limiter.admit() for _ in xrange(4)], [0, 0, None, None])
+        self.assertEquals(self.limiter.suppressed, 2)
+
+    def test_reports_suppressed_in_next_window(self):
+        for _ in xrange(4):
+            self.limiter.admit()
+        self.clock.now += 60
+        self.assertEquals(self.limiter.admit(), 2)
+        self.assertEquals(self.limiter.suppressed, 0)
+
+    def test_threads_admit_no_more_than_limit(self):
+        limiter = throttle.LogLimiter(limit=100, interval=3600)
+        admitted = []
+
+        def admit():
+            for _ in xrange(1000):
+                if limiter.admit() is not None:
+                    admitted.append(1)
+
+        threads = [threading.Thread(target=admit) for _ in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(admitted), 100)
+        self.assertEquals(limiter.suppressed, 8 * 1000 - 100)
@@ -0,0 +1,52 @@
+import calendar
+from collections import namedtuple
+from datetime import datetime
+from unittest import TestCase
+
+from service import url_cache
+
+Stored = namedtuple('Stored', ['url', 'expires', 'idle_ttl'])
+
+
+class StoredShortUrl(Stored):
+    """
+    Stands in for a ShortUrl read from the datastore.
+    """
+
+    def is_expired(self):
+        return self.expires is not None and self.expires <= datetime.utcnow()
+
+
+class TestUrlCache(TestCase):
+
+    def setUp(self):
+        self.cache = url_cache.UrlCache(16, 1024)
+
+    def test_allocates_on_first_put(self):
+        self.assertIsNone(self.cache.get(1))
+        self.assertEquals(len(self.cache), 0)
+        self.assertIsNone(self.cache._table)
+        self.cache.put_url(1, 'http://a.com/')
+        self.assertEquals(self.cache.get(1), 'http://a.com/')
+
+    def test_expiry(self):
+        self.cache.put_url(1, 'http://a.com/', 1000)
+        self.assertEquals(self.cache.lookup(1, now=999), ('http://a.com/', datetime.utcfromtimestamp(1000)))
+        self.assertIsNone(self.cache.lookup(1, now=1000))
+
+    def test_far_future_expiry(self):
+        far = datetime(9999, 12, 31)
+        self.cache.put(1, StoredShortUrl('http://a.com/', far, None))
+        self.assertEquals(self.cache.lookup(1), ('http://a.com/', far))
+        self.cache.put_url(2, 'http://b.com/', url_cache.MAX_EXPIRES)
+        self.assertEquals(self.cache.get(2), 'http://b.com/')
+
+    def test_rejects_unrepresentable_expiry(self):
+        self.assertRaises(ValueError, self.cache.put_url, 1, 'http://a.com/', url_cache.MAX_EXPIRES + 1)
+        self.assertRaises(ValueError, self.cache.put_url, 1, 'http://a.com/', -1)
+
+    def test_skips_idle_and_expired(self):
+        self.cache.put(1, StoredShortUrl('http://a.com/', datetime(2100, 1, 1), 60))
+        self.cache.put(2, StoredShortUrl('http://b.com/', datetime(1960, 1, 1), None))
+        self.assertIsNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get(2))
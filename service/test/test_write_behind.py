@@ -0,0 +1,91 @@
+from unittest import TestCase
+
+from service import write_behind
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWriteBehind(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.persisted = []
+        self.failing = set()
+        self.queue = write_behind.LocalQueue(clock=self.clock)
+        self.ranges = []
+        self.wb = write_behind.WriteBehind(
+            self.queue, write_behind.InstanceTier(), write_behind.KidReserve(self._allocate, size=2),
+            self._persist, batch_size=10, max_retries=2, clock=self.clock)
+
+    def _allocate(self, size):
+        first = 100 * (len(self.ranges) + 1)
+        self.ranges.append((first, first + size - 1))
+        return self.ranges[-1]
+
+    def _persist(self, pendings):
+        if self.failing.intersection(p.kid for p in pendings):
+            raise IOError('datastore unavailable')
+        self.persisted.extend(pendings)
+
+    def test_shorten_then_flush(self):
+        a = self.wb.shorten('dest-a', 'http://a.com/')
+        b = self.wb.shorten('dest-b', 'http://b.com/', expires=2000.0)
+        c = self.wb.shorten('dest-c', 'http://c.com/')
+        self.assertEquals((a, b, c), (100, 101, 200))
+        self.assertEquals(self.wb.shorten('dest-a', 'http://a.com/'), a)
+        self.assertEquals(self.wb.lookup(b).url, 'http://b.com/')
+        self.assertIsNone(self.wb.lookup(b, now=2000.0))
+        self.assertEquals(self.wb.stats()['depth'], 3)
+
+        self.clock.now += 1.5
+        self.assertEquals(self.wb.flush(), (3, 0, 0, False))
+        self.assertEquals([p.kid for p in self.persisted], [a, b, c])
+        self.assertIsNone(self.wb.lookup(a))
+        stats = self.wb.stats()
+        self.assertEquals((stats['depth'], stats['persisted'], stats['max_lag']), (0, 3, 1.5))
+
+    def test_failed_item_is_retried_then_abandoned(self):
+        good = self.wb.shorten('dest-good', 'http://good.com/')
+        bad = self.wb.shorten('dest-bad', 'http://bad.com/')
+        self.failing.add(bad)
+
+        self.assertEquals(self.wb.flush(), (1, 1, 0, False))
+        self.assertEquals([p.kid for p in self.persisted], [good])
+        # still leased
+        self.assertEquals(self.wb.flush(), (0, 0, 0, False))
+        self.assertEquals(self.wb.lookup(bad).url, 'http://bad.com/')
+
+        self.clock.now += write_behind.LEASE_SECONDS
+        self.assertEquals(self.wb.flush(), (0, 1, 0, False))
+        self.clock.now += write_behind.LEASE_SECONDS
+        self.assertEquals(self.wb.flush(), (0, 0, 1, False))
+        self.assertEquals(self.queue.depth(), 0)
+
+    def test_deadline(self):
+        for n in xrange(25):
+            self.wb.shorten('dest-%d' % n, 'http://x.com/%d' % n)
+        self.assertTrue(self.wb.flush(deadline=self.clock.now + 1).more is False)
+        self.assertEquals(len(self.persisted), 25)
+
+        self.wb.shorten('dest-late', 'http://late.com/')
+        self.assertEquals(self.wb.flush(deadline=self.clock.now), (0, 0, 0, True))
+
+    def test_schedule_once_per_interval(self):
+        scheduled = []
+        self.wb.schedule = scheduled.append
+        self.wb.shorten('dest-a', 'http://a.com/')
+        self.wb.shorten('dest-b', 'http://b.com/')
+        self.clock.now += self.wb.schedule_interval
+        self.wb.shorten('dest-c', 'http://c.com/')
+        self.assertEquals(len(scheduled), 2)
+
+    def test_payload_round_trip(self):
+        pending = write_behind.PendingUrl(2 ** 70, 'dest', 'http://a.com/', None, 60, 1000.5)
+        self.assertEquals(write_behind.decode(write_behind.encode(pending)), pending)
@@ -0,0 +1,101 @@
+"""
+Per-instance cache of resolved destination urls, keyed by kid.  Urls are held in a compact table
+(see gapplib.arena), so that an instance of limited memory may cache far more of them than it could
+hold as entities or strings.  The table is allocated when the first url is cached, so that the
+applications which never cache a url do not hold its memory.
+"""
+
+import calendar
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+from gapplib import arena
+
+URL_CACHE_ENTRIES = int(os.getenv('URL_CACHE_ENTRIES', '50000'))
+"""int: maximum number of destination urls cached per instance"""
+
+URL_CACHE_BYTES = int(os.getenv('URL_CACHE_BYTES', str(8 * 1024 * 1024)))
+"""int: maximum bytes of cached entries per instance"""
+
+_EXPIRES = struct.Struct('!Q')
+
+ENTRY_OVERHEAD = _EXPIRES.size + arena.RECORD_OVERHEAD
+"""int: bytes of the arena taken by a cached entry beyond those of its url"""
+
+MAX_EXPIRES = calendar.timegm(datetime.max.utctimetuple())
+"""int: the latest expiry which may be cached, in seconds since the epoch"""
+
+
+class UrlCache(object):
+    """
+    Caches the destination urls of short urls, with their expiry.  Short urls with an idle expiry are
+    not cached: each of their redirects must be recorded with ShortUrl.touch, which needs the entity.
+    """
+
+    def __init__(self, max_entries=URL_CACHE_ENTRIES, arena_bytes=URL_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.arena_bytes = arena_bytes
+        self._table = None
+        self._lock = threading.Lock()
+
+    def get(self, kid, now=None):
+        """
+        Returns:
+            str: the destination url of the short url, unless it is not cached or has expired
+        """
+        entry = self.lookup(kid, now)
+        return entry[0] if entry else None
+
+    def lookup(self, kid, now=None):
+        """
+        Returns:
+            (str, datetime): the destination url and expiry (None if none) of the short url, unless
+                it is not cached or has expired
+        """
+        with self._lock:
+            value = self._table.get(kid) if self._table is not None else None
+        if value is None:
+            return None
+        expires, = _EXPIRES.unpack_from(value)
+        if expires and expires <= (now or time.time()):
+            return None
+        return value[_EXPIRES.size:], datetime.utcfromtimestamp(expires) if expires else None
+
+    def put(self, kid, short_url):
+        """
+        Caches the destination url of a short url which was resolved from the datastore.
+        """
+        if short_url.idle_ttl or short_url.is_expired():
+            return
+        expires = calendar.timegm(short_url.expires.utctimetuple()) if short_url.expires else 0
+        self.put_url(kid, short_url.url, expires)
+
+    def put_url(self, kid, url, expires=0):
+        """
+        Args:
+            kid (int): key id of the short url
+            url (str): destination url
+            expires (int): seconds since the epoch after which the short url expires. 0 for never.
+
+        Raises:
+            ValueError: if expires is not between 0 and MAX_EXPIRES
+        """
+        if not 0 <= expires <= MAX_EXPIRES:
+            raise ValueError("expiry out of range (%r)" % expires)
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        value = _EXPIRES.pack(expires) + url
+        with self._lock:
+            if self._table is None:
+                self._table = arena.CompactTable(self.max_entries, self.arena_bytes)
+            self._table.put(kid, value)
+
+    def __len__(self):
+        return len(self._table) if self._table is not None else 0
+
+
+URL_CACHE = UrlCache()
+"""UrlCache: the cache of the current instance"""
@@ -0,0 +1,422 @@
+"""
+Write-behind creation of short urls.  A short url is assigned a kid from a range reserved in advance,
+its pending mapping is recorded in a fast tier (so that redirects to it work at once) and queued, and
+the request completes without waiting upon the datastore.  Queued mappings are persisted in batches
+by a background worker.
+
+Guarantees:
+
+    - a mapping is queued durably before the short url is returned; once returned, the short url is
+      eventually persisted (or dead-lettered, below) whatever becomes of the instance or fast tier.
+    - until it is persisted, a short url resolves (by redirect or by query) only while its mapping
+      survives in the fast tier.  memcache may evict it, so a request which precedes persistence
+      may fail (404).
+    - a worker is scheduled to persist mappings as they are queued; if it cannot be, the mapping
+      waits for the next run of cron.
+    - a batch which fails to persist is retried item by item, so that one bad mapping does not
+      hold back the rest.  an item which still fails is leased again once its lease lapses, up to
+      max_retries times; it is then logged at error level, with its payload, and removed.
+    - deduplication is best effort: two instances may assign different short urls to one destination
+      before either is persisted.  both short urls resolve; the first persisted is the one which
+      later requests for the destination receive.
+
+The queue and fast tier are interfaces; LocalQueue and InstanceTier implement them in-process (e.g.
+for tests), PullQueue and MemcacheTier with the services of App Engine.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', 'off') == 'on'
+"""bool: True if short urls are created write-behind"""
+
+WRITE_BEHIND_QUEUE = os.getenv('WRITE_BEHIND_QUEUE', 'write-behind')
+"""str: name of the pull queue of pending mappings (see queue.yaml)"""
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '100'))
+"""int: pending mappings persisted per batch"""
+
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', '5'))
+"""int: failed attempts to persist a pending mapping after which it is abandoned"""
+
+PENDING_TTL = 24 * 60 * 60
+"""int: seconds for which a pending mapping is held in the fast tier"""
+
+LEASE_SECONDS = 60
+"""int: seconds for which a batch is leased to a worker before it may be leased again"""
+
+PendingUrl = namedtuple('PendingUrl', ['kid', 'dest_id', 'url', 'expires', 'idle_ttl', 'created'])
+"""
+kid (int): key id assigned to the short url
+dest_id (str): identifies the destination url for deduplication (e.g. its urlsafe key)
+url (str): the normalized destination url
+expires (float): seconds since the epoch after which the short url expires. None for none.
+idle_ttl (int): seconds without access after which the short url expires. None for none.
+created (float): seconds since the epoch at which the mapping was queued
+"""
+
+LeasedTask = namedtuple('LeasedTask', ['handle', 'payload', 'retry_count'])
+"""
+handle: identifies the task to the queue which leased it
+payload (str): the encoded PendingUrl
+retry_count (int): number of times the task has been leased before
+"""
+
+FlushResult = namedtuple('FlushResult', ['persisted', 'failed', 'abandoned', 'more'])
+"""
+persisted (int): number of mappings persisted
+failed (int): number of mappings which failed, and remain queued to be retried
+abandoned (int): number of mappings which failed max_retries times, and were removed
+more (bool): True if the flush stopped at its deadline with mappings still queued
+"""
+
+
+def encode(pending):
+    return json.dumps(pending._asdict(), separators=(',', ':'))
+
+
+def decode(payload):
+    fields = json.loads(payload)
+    fields['dest_id'] = fields['dest_id'].encode('utf-8')
+    fields['url'] = fields['url'].encode('utf-8')
+    return PendingUrl(**fields)
+
+
+class LocalQueue(object):
+    """
+    An in-process stand-in for a pull queue.  A leased task is hidden until its lease lapses.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._tasks = OrderedDict()
+        self._next_handle = 0
+        self._lock = threading.Lock()
+
+    def add(self, payload):
+        with self._lock:
+            self._next_handle += 1
+            self._tasks[self._next_handle] = [payload, 0.0, 0]
+
+    def lease(self, max_tasks, lease_seconds):
+        """
+        Returns:
+            list: LeasedTask, oldest first
+        """
+        now = self._clock()
+        leased = []
+        with self._lock:
+            for handle, task in self._tasks.iteritems():
+                if len(leased) >= max_tasks:
+                    break
+                payload, available, leases = task
+                if available <= now:
+                    task[1] = now + lease_seconds
+                    task[2] = leases + 1
+                    leased.append(LeasedTask(handle, payload, leases))
+        return leased
+
+    def delete(self, handles):
+        with self._lock:
+            for handle in handles:
+                self._tasks.pop(handle, None)
+
+    def depth(self):
+        return len(self._tasks)
+
+    def oldest(self):
+        """
+        Returns:
+            float: seconds since the epoch at which the oldest queued task was added. None if none.
+        """
+        with self._lock:
+            for payload, _, _ in self._tasks.itervalues():
+                return decode(payload).created
+        return None
+
+
+class PullQueue(object):
+    """
+    A pull queue of the App Engine task queue service (see queue.yaml).
+    """
+
+    def __init__(self, name):
+        # imported here so that the rest of the module may be used without the sdk
+        from google.appengine.api import taskqueue
+        self._taskqueue = taskqueue
+        self.name = name
+        self._queue = taskqueue.Queue(name)
+
+    def add(self, payload):
+        self._queue.add(self._taskqueue.Task(payload=payload, method='PULL'))
+
+    def lease(self, max_tasks, lease_seconds):
+        return [LeasedTask(task, task.payload, task.retry_count)
+                for task in self._queue.lease_tasks(lease_seconds, max_tasks)]
+
+    def delete(self, handles):
+        if handles:
+            self._queue.delete_tasks(handles)
+
+    def depth(self):
+        return self._queue.fetch_statistics().tasks
+
+    def oldest(self):
+        oldest_eta_usec = self._queue.fetch_statistics().oldest_eta_usec
+        return oldest_eta_usec / 1e6 if oldest_eta_usec else None
+
+
+class InstanceTier(object):
+    """
+    Pending mappings held in the memory of the current instance.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._kids = {}
+        self._lock = threading.Lock()
+
+    def put(self, pending):
+        with self._lock:
+            self._pending[pending.kid] = pending
+            self._kids[pending.dest_id] = pending.kid
+
+    def get(self, kid):
+        return self._pending.get(kid)
+
+    def get_kid(self, dest_id):
+        return self._kids.get(dest_id)
+
+    def delete(self, pendings):
+        with self._lock:
+            for pending in pendings:
+                self._pending.pop(pending.kid, None)
+                if self._kids.get(pending.dest_id) == pending.kid:
+                    del self._kids[pending.dest_id]
+
+
+class MemcacheTier(object):
+    """
+    Pending mappings held in memcache, where they are visible to every instance.
+    """
+
+    def __init__(self, ttl=PENDING_TTL):
+        from google.appengine.api import memcache
+        self._memcache = memcache
+        self.ttl = ttl
+
+    @staticmethod
+    def _kid_key(kid):
+        return 'write-behind:kid:%d' % kid
+
+    @staticmethod
+    def _dest_key(dest_id):
+        # keys are limited to 250 bytes
+        return 'write-behind:dest:%s' % hashlib.sha1(dest_id).hexdigest()
+
+    def put(self, pending):
+        self._memcache.set_multi({
+            self._kid_key(pending.kid): encode(pending),
+            self._dest_key(pending.dest_id): pending.kid,
+        }, time=self.ttl)
+
+    def get(self, kid):
+        payload = self._memcache.get(self._kid_key(kid))
+        return decode(payload) if payload else None
+
+    def get_kid(self, dest_id):
+        return self._memcache.get(self._dest_key(dest_id))
+
+    def delete(self, pendings):
+        # the dest entry is left to expire: it still names the kid, now persisted
+        self._memcache.delete_multi([self._kid_key(p.kid) for p in pendings])
+
+
+class KidReserve(object):
+    """
+    Hands out kids from ranges reserved in advance, so that a short url is assigned its kid without
+    a datastore call (except once per range).
+    """
+
+    def __init__(self, allocate, size=1000):
+        """
+        Args:
+            allocate (callable): reserves a number of kids, returning the first and last of the range
+            size (int): kids reserved at a time
+        """
+        self._allocate = allocate
+        self.size = size
+        self._next = 1
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._next > self._last:
+                self._next, self._last = self._allocate(self.size)
+            kid = self._next
+            self._next += 1
+            return kid
+
+
+class WriteBehind(object):
+    """
+    Queues the creation of short urls, and persists them in batches.
+    """
+
+    def __init__(self, queue, tier, reserve, persist, schedule=None, batch_size=100, max_retries=5,
+                 schedule_interval=2.0, clock=time.time):
+        """
+        Args:
+            queue: durable queue of pending mappings (e.g. PullQueue)
+            tier: fast tier of pending mappings (e.g. MemcacheTier)
+            reserve (KidReserve): source of kids
+            persist (callable): writes a list of PendingUrl to the datastore
+            schedule (callable): arranges for flush to be invoked soon, e.g. by queueing a task.
+                None if flush is invoked otherwise.
+            batch_size (int): mappings persisted per batch
+            max_retries (int): failures of a mapping after which it is abandoned
+            schedule_interval (float): seconds within which schedule is invoked at most once
+            clock (callable): returns the current time in seconds
+        """
+        self.queue = queue
+        self.tier = tier
+        self.reserve = reserve
+        self.persist = persist
+        self.schedule = schedule
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.schedule_interval = schedule_interval
+        self._clock = clock
+        self._scheduled = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.persisted = 0
+        self.abandoned = 0
+        self.last_lag = None
+        self.max_lag = None
+
+    def shorten(self, dest_id, url, expires=None, idle_ttl=None):
+        """
+        Assigns a kid to a destination url, unless a pending mapping exists for it already.
+
+        Returns:
+            int: the kid of the short url
+        """
+        kid = self.tier.get_kid(dest_id)
+        if kid is not None:
+            return kid
+
+        pending = PendingUrl(self.reserve.next(), dest_id, url, expires, idle_ttl, self._clock())
+        self.queue.add(encode(pending))
+        self.tier.put(pending)
+        with self._lock:
+            self.enqueued += 1
+        self._schedule(pending.created)
+        return pending.kid
+
+    def _schedule(self, now):
+        if self.schedule is None:
+            return
+        bucket = int(now / self.schedule_interval)
+        if bucket != self._scheduled:
+            self._scheduled = bucket
+            self.schedule(bucket)
+
+    def lookup(self, kid, now=None):
+        """
+        Returns:
+            PendingUrl: the pending mapping of a short url which has not yet been persisted, unless
+                it has expired
+        """
+        pending = self.tier.get(kid)
+        if pending and pending.expires and pending.expires <= (now or self._clock()):
+            return None
+        return pending
+
+    def flush(self, deadline=None):
+        """
+        Persists queued mappings, a batch at a time, until the queue is empty or the deadline passes.
+
+        Args:
+            deadline (float): time (per clock) after which no further batch is begun
+
+        Returns:
+            FlushResult
+        """
+        persisted = failed = abandoned = 0
+        while deadline is None or self._clock() < deadline:
+            tasks = self.queue.lease(self.batch_size, LEASE_SECONDS)
+            if not tasks:
+                return FlushResult(persisted, failed, abandoned, False)
+
+            batch = []
+            for task in tasks:
+                if task.retry_count >= self.max_retries:
+                    logging.error("abandoned pending short url after %d attempts: %s", task.retry_count, task.payload)
+                    self.queue.delete([task.handle])
+                    abandoned += 1
+                else:
+                    batch.append((task, decode(task.payload)))
+
+            done = self._persist(batch)
+            self.queue.delete([task.handle for task, _ in done])
+            self.tier.delete([pending for _, pending in done])
+            persisted += len(done)
+            failed += len(batch) - len(done)
+            self._record(done, abandoned)
+        return FlushResult(persisted, failed, abandoned, True)
+
+    def _persist(self, batch):
+        """
+        Returns:
+            list: the (task, pending) of batch which were persisted
+        """
+        if not batch:
+            return []
+        try:
+            self.persist([pending for _, pending in batch])
+            return batch
+        except StandardError:
+            logging.exception("failed to persist a batch of %d pending short urls; retrying singly", len(batch))
+
+        done = []
+        for task, pending in batch:
+            try:
+                self.persist([pending])
+                done.append((task, pending))
+            except StandardError:
+                logging.exception("failed to persist pending short url (kid %d)", pending.kid)
+        return done
+
+    def _record(self, done, abandoned):
+        now = self._clock()
+        with self._lock:
+            self.persisted += len(done)
+            self.abandoned += abandoned
+            for _, pending in done:
+                lag = now - pending.created
+                self.last_lag = lag
+                self.max_lag = lag if self.max_lag is None else max(self.max_lag, lag)
+
+    def stats(self):
+        """
+        Returns:
+            dict: queue depth and age of its oldest mapping (as seen by the queue), and the counts and
+                persistence lag (seconds from queueing to persistence) observed by this instance
+        """
+        oldest = self.queue.oldest()
+        return {
+            'depth': self.queue.depth(),
+            'oldest_age': self._clock() - oldest if oldest is not None else None,
+            'enqueued': self.enqueued,
+            'persisted': self.persisted,
+            'abandoned': self.abandoned,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+        }